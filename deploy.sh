@@ -64,6 +64,18 @@ declare -A CONFIGMAPS=(
 		["authentik-token"]="default:secrets/authentik/token:/secrets/authentik/token:management-plane-api"
 )
 
+# Alloy pipeline variant: follows the auth-log-generator's OUTPUT_FORMAT in config/local-k8s-env.yml.
+# With ztac the generator writes ZTAC-native bodies and Alloy skips the JSON transform.
+AUTH_LOG_FORMAT=$(yq eval '.["auth-log-generator"].OUTPUT_FORMAT // "json"' config/local-k8s-env.yml)
+case "$AUTH_LOG_FORMAT" in
+    json) ;;
+    ztac) CONFIGMAPS["alloy-config"]="default:config/alloy/config-ztac-native.alloy:/etc/alloy/config.alloy:alloy" ;;
+    *)
+        echo "Error: unknown auth-log-generator OUTPUT_FORMAT '$AUTH_LOG_FORMAT' in config/local-k8s-env.yml (expected json or ztac)"
+        exit 1
+        ;;
+esac
+
 
 # Function to print colored messages
 print_info() {
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Auth Log Generator Benchmark
+Measures single-core throughput of each stage of generate_auth_logs.py in
+process: sampling (generate_event_batch(), generate_log_batch() and the
+vectorized sampler), event construction (generate_auth_event()), encoding
+(the original dict + json.dumps against the precompiled templates and the
+ZTAC-native body) and the emit path through a LineSink into a null stream.
+Reports events/s, ns/event and memory allocated and kept per event, and
+compares throughput against a stored baseline, exiting non-zero on a
+regression (or, with BENCH_REQUIRE_BASELINE, when there is no baseline).
+The comparison uses each case's speed relative to a calibration loop timed
+right next to it, so a baseline from a faster or slower machine, or a
+run slowed down by a busy host, still compares like for like.
+"""
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+
+os.environ.setdefault('TENANTS', 'patmon,perimara,demo-tenant')
+
+import generate_auth_logs as gen
+
+EVENTS = int(os.getenv('BENCH_EVENTS', '200000'))
+REPEAT = int(os.getenv('BENCH_REPEAT', '3'))  # timed runs per case; the fastest counts
+CHUNK = 10000  # events per call, so cases that return their output stay small in memory
+BASELINE_FILE = os.getenv('BENCH_BASELINE', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                         'benchmark-baseline.json'))
+THRESHOLD = float(os.getenv('BENCH_THRESHOLD', '0.2'))  # allowed drop in relative speed against the baseline
+UPDATE_BASELINE = os.getenv('BENCH_UPDATE', 'false').lower() == 'true'
+REQUIRE_BASELINE = os.getenv('BENCH_REQUIRE_BASELINE', os.getenv('CI', 'false')).lower() == 'true'
+
+def sample_events(count, seed=42):
+    """Draw a fixed list of event tuples with the generator's traffic mix."""
+    random.seed(seed)
+    events = []
+    while len(events) < count:
+        events.extend(gen.generate_event_batch())
+    return events[:count]
+
+class NullStream:
+    """Binary stream that discards everything: the emit path without I/O."""
+
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+vector_sampler = None
+
+# Each case processes a chunk of events and returns what it produced
+
+def generate_batches(events):
+    batches = []
+    produced = 0
+    while produced < len(events):
+        batch = gen.generate_event_batch()
+        batches.append(batch)
+        produced += len(batch)
+    return batches
+
+def generate_log_batches(events):
+    batches = []
+    produced = 0
+    while produced < len(events):
+        batch = gen.generate_log_batch()
+        batches.append(batch)
+        produced += len(batch)
+    return batches
+
+def generate_vectorized(events):
+    global vector_sampler
+    if vector_sampler is None:
+        vector_sampler = gen.VectorSampler()
+    return vector_sampler.events(len(events))[0]
+
+def build_auth_events(events):
+    build = gen.generate_auth_event
+    return [build(tenant, ip, username, success, reason) for tenant, ip, username, success, reason in events]
+
+def encode_json_dumps(events):
+    build = gen.generate_auth_event
+    return [(json.dumps(build(tenant, ip, username, success, reason)) + '\n').encode('ascii')
+            for tenant, ip, username, success, reason in events]
+
+def encode_templates(events):
+    encode = gen.encode_auth_event
+    return [encode(tenant, ip, username, success, reason) for tenant, ip, username, success, reason in events]
+
+def encode_ztac_native(events):
+    encode = gen.encode_ztac_line
+    return [encode(tenant, ip, username, success, reason) for tenant, ip, username, success, reason in events]
+
+def emit_null(output_format):
+    def emit(events):
+        writer = gen.BatchWriter(NullStream())
+        gen.LineSink(writer, output_format).emit(events)
+        writer.flush()
+    return emit
+
+def calibration(events):
+    """Plain interpreter work independent of the generator: the yardstick for the host's speed.
+
+    Tuple unpacking, string formatting, encoding and list appends, the
+    operations the cases spend their time in, so whatever speeds up or
+    slows down the host shifts the calibration and the cases alike.
+    """
+    lines = []
+    for tenant, ip, username, success, reason in events:
+        lines.append(('%s %s %s %d %s\n' % (tenant, ip, username, success, reason)).encode())
+    return lines
+
+CASES = [
+    ('generate_event_batch', generate_batches),
+    ('generate_log_batch', generate_log_batches),
+    ('vector_sampler', generate_vectorized),
+    ('generate_auth_event', build_auth_events),
+    ('json.dumps', encode_json_dumps),
+    ('templates', encode_templates),
+    ('ztac-native', encode_ztac_native),
+    ('emit json', emit_null('json')),
+    ('emit ztac', emit_null('ztac')),
+]
+
+def verify(events):
+    """Check the template encoder is byte-identical to json.dumps()."""
+    for index, (tenant, ip, username, success, reason) in enumerate(events):
+        random.seed(index)
+        event = gen.generate_auth_event(tenant, ip, username, success, reason)
+        expected = (json.dumps(event) + '\n').encode('ascii')
+        random.seed(index)
+        actual = gen.encode_auth_event(tenant, ip, username, success, reason, event['timestamp'])
+        if actual != expected:
+            raise SystemExit(f'Encoder mismatch:\n  expected {expected!r}\n  actual   {actual!r}')
+
+def allocations(func, events):
+    """Bytes per event that one call allocates (its peak traced memory) and keeps (its output).
+
+    The peak counts everything the call had allocated at once, temporary
+    objects included, so the emit cases, which return nothing, show their
+    encoding buffers. Traced separately from the timed runs, since
+    tracemalloc slows every allocation, and with the garbage collector off
+    so a collection mid-call does not hide allocations.
+    """
+    gc.collect()
+    gc.disable()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        result = func(events)
+        kept, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    del result
+    return (peak - start) / len(events), (kept - start) / len(events)
+
+def measure(func, events):
+    """Time `func` over `events` CHUNK events per call, the fastest of REPEAT runs.
+
+    Each call is also paired with a calibration() call on the same chunk;
+    the median of calibration time / call time is the case's relative
+    speed, which the baseline comparison uses. Pairing calls keeps the
+    ratio steady when the host's speed drifts during the run.
+    """
+    random.seed(42)
+    best = float('inf')
+    ratios = []
+    for _ in range(REPEAT):
+        elapsed = 0.0
+        for offset in range(0, len(events), CHUNK):
+            chunk = events[offset:offset + CHUNK]
+            start = time.perf_counter()
+            calibration(chunk)
+            middle = time.perf_counter()
+            func(chunk)
+            end = time.perf_counter()
+            elapsed += end - middle
+            ratios.append((middle - start) / (end - middle))
+        best = min(best, elapsed)
+    allocated, kept = allocations(func, events[:CHUNK])
+    return {
+        'events_per_second': round(len(events) / best),
+        'relative_speed': round(statistics.median(ratios), 4),
+        'ns_per_event': round(best / len(events) * 1e9),
+        'allocated_bytes_per_event': round(allocated),
+        'kept_bytes_per_event': round(kept),
+    }
+
+def load_baseline(path=BASELINE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def main():
+    events = sample_events(EVENTS)
+    verify(events[:10000])
+
+    baseline = None if UPDATE_BASELINE else load_baseline()
+    if baseline is not None and any('relative_speed' not in case for case in baseline.get('cases', {}).values()):
+        print(f"Baseline {BASELINE_FILE} predates calibration; ignoring it (record it again with BENCH_UPDATE=true)")
+        baseline = None
+    print("=" * 98)
+    print("Auth Log Generator Benchmark (single core)")
+    print("=" * 98)
+    print(f"{'case':<22}{'events/s':>14}{'ns/event':>11}{'alloc B/event':>15}{'kept B/event':>14}{'vs baseline':>14}")
+    results = {}
+    regressions = []
+    for name, func in CASES:
+        if func is generate_vectorized and gen.np is None:
+            continue
+        result = results[name] = measure(func, events)
+        change = ''
+        reference = (baseline or {}).get('cases', {}).get(name)
+        if reference:
+            ratio = result['relative_speed'] / reference['relative_speed']
+            change = f"{(ratio - 1) * 100:+.1f}%"
+            if ratio < 1 - THRESHOLD:
+                regressions.append(f"{name}: {result['relative_speed']:g}x the calibration loop, "
+                                   f"baseline {reference['relative_speed']:g}x ({change})")
+        print(f"{name:<22}{result['events_per_second']:>14,}{result['ns_per_event']:>11,}"
+              f"{result['allocated_bytes_per_event']:>15,}{result['kept_bytes_per_event']:>14,}{change:>14}")
+    print("=" * 98)
+    print(f"Template speedup over json.dumps: "
+          f"{results['templates']['events_per_second'] / results['json.dumps']['events_per_second']:.1f}x")
+
+    if UPDATE_BASELINE:
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'events': EVENTS,
+                       'cases': results}, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {BASELINE_FILE}")
+    elif baseline is None:
+        if REQUIRE_BASELINE:
+            raise SystemExit(f"No baseline at {BASELINE_FILE}; record one with BENCH_UPDATE=true and commit it")
+        print(f"No baseline at {BASELINE_FILE}; run with BENCH_UPDATE=true to record one")
+    else:
+        if (baseline.get('python'), baseline.get('machine')) != (platform.python_version(), platform.machine()):
+            print(f"Note: baseline recorded with Python {baseline.get('python')} on {baseline.get('machine')}, "
+                  f"running Python {platform.python_version()} on {platform.machine()}")
+        if regressions:
+            raise SystemExit(f"Relative speed regressed more than {THRESHOLD:.0%} against {BASELINE_FILE}:\n  "
+                             + '\n  '.join(regressions))
+        print(f"No case regressed more than {THRESHOLD:.0%} against {BASELINE_FILE}")
+
+if __name__ == '__main__':
+    main()
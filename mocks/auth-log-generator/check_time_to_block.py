@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+ZTAC Time-to-Block Checker
+Follows the oracle file written by generate_auth_logs.py (ORACLE_FILE) and
+polls ZTAC's gRPC API, or a local stand-in, until every IP the oracle
+expects to be blocked is blocked. Reports time-to-block percentiles, false
+negatives (expected blocks that did not happen in time) and false positives
+(blocked IPs the oracle never expected to block).
+"""
+import json
+import math
+import os
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+
+os.environ.setdefault('TENANTS', 'checker')  # generate_auth_logs reads TENANTS on import
+
+import generate_auth_logs as gen
+
+ORACLE_FILE = os.getenv('ORACLE_FILE', 'oracle.jsonl')
+PROBE = os.getenv('PROBE', 'grpc')  # 'grpc' (ZTAC API via PROBE_COMMAND) or 'stand-in'
+ZTAC_GRPC_URL = os.getenv('ZTAC_GRPC_URL', 'ztac-ip-reputation-engine-service:9090')
+PROBE_COMMAND = os.getenv('PROBE_COMMAND')  # command template with $ip, $tenant and $endpoint
+BLOCKED_PATTERN = os.getenv('BLOCKED_PATTERN', r'"(blocked|isBlocked|is_blocked)"\s*:\s*true')
+PROBE_TIMEOUT = float(os.getenv('PROBE_TIMEOUT', '5'))  # seconds per probe command
+PROBE_CONCURRENCY = int(os.getenv('PROBE_CONCURRENCY', '16'))  # probes in flight
+POLL_INTERVAL = float(os.getenv('POLL_INTERVAL', '1'))  # seconds between polls (time-to-block resolution)
+BLOCK_DEADLINE = float(os.getenv('BLOCK_DEADLINE', '120'))  # seconds after crossing before a miss is counted
+DURATION = float(os.getenv('DURATION', '0'))  # seconds to run (0 = until interrupted)
+REPORT_INTERVAL = float(os.getenv('REPORT_INTERVAL', '10'))  # seconds between progress reports
+STANDIN_THRESHOLD = int(os.getenv('STANDIN_THRESHOLD', str(gen.ORACLE_THRESHOLD)))
+STANDIN_WINDOW = float(os.getenv('STANDIN_WINDOW', str(gen.ORACLE_WINDOW)))
+STANDIN_DELAY = float(os.getenv('STANDIN_DELAY', '0'))  # seconds the stand-in waits before blocking
+
+def report(level, message, **fields):
+    """Print a checker status record as a JSON line."""
+    record = {'timestamp': gen.timestamps.now(), 'level': level, 'service': 'time-to-block-checker',
+              'message': message}
+    record.update(fields)
+    print(json.dumps(record), flush=True)
+
+class CommandProbe:
+    """Asks ZTAC whether IPs are blocked by running PROBE_COMMAND (e.g. grpcurl) per IP.
+
+    A probe counts as blocked when the command's output matches
+    BLOCKED_PATTERN; a failing command is an error, not a verdict.
+    """
+
+    def __init__(self, command, pattern=BLOCKED_PATTERN, endpoint=ZTAC_GRPC_URL):
+        self.command = Template(command)
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.endpoint = endpoint
+        self.pool = ThreadPoolExecutor(PROBE_CONCURRENCY)
+
+    def _probe(self, ip, tenant):
+        args = shlex.split(self.command.substitute(ip=ip, tenant=tenant, endpoint=self.endpoint))
+        try:
+            result = subprocess.run(args, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+        return bool(self.pattern.search(result.stdout))
+
+    def blocked(self, ips, tenant):
+        """Return {ip: True/False, or None when the probe failed}."""
+        return dict(zip(ips, self.pool.map(lambda ip: self._probe(ip, tenant), ips)))
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+class StandInProbe:
+    """Local stand-in for ZTAC, fed with the generator's output on a stream.
+
+    Applies the same threshold model as the oracle (optionally with a
+    different threshold or window) to events as they arrive, and reports an
+    IP blocked STANDIN_DELAY seconds after it crosses. Run as
+    `python generate_auth_logs.py | PROBE=stand-in python check_time_to_block.py`
+    to exercise the checker end to end without a cluster.
+    """
+
+    def __init__(self, fd, threshold=STANDIN_THRESHOLD, window=STANDIN_WINDOW, delay=STANDIN_DELAY):
+        self.model = gen.BlockOracle(threshold=threshold, window=window)
+        self.delay_ns = int(delay * 1_000_000_000)
+        self.lock = threading.Lock()
+        threading.Thread(target=self._consume, args=(fd,), daemon=True).start()
+
+    def _consume(self, fd):
+        # Raw reads: a daemon thread blocked in a buffered stdin read aborts interpreter shutdown
+        partial = b''
+        while True:
+            chunk = os.read(fd, 1 << 16)
+            if not chunk:
+                return
+            lines = (partial + chunk).split(b'\n')
+            partial = lines.pop()
+            events = []
+            for line in lines:
+                if not line.startswith(b'{'):
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if 'auth' in record:
+                    events.append((None, record['auth']['ip_address'], None, record['auth']['success'], None))
+                elif 'SourceIP' in record:
+                    events.append((None, record['SourceIP'], None, record['Status'] == 'SUCCESS', None))
+            with self.lock:
+                self.model.observe(events, time.time_ns())
+
+    def blocked(self, ips, tenant):
+        cutoff = time.time_ns() - self.delay_ns
+        with self.lock:
+            crossed = self.model.crossed
+            return {ip: crossed.get(ip, math.inf) <= cutoff for ip in ips}
+
+    def close(self):
+        pass
+
+class OracleFollower:
+    """Reads complete JSON lines appended to the oracle file since the last call."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.partial = ''
+
+    def read(self):
+        if self.file is None:
+            if not os.path.exists(self.path):
+                return []
+            self.file = open(self.path, 'r')
+        data = self.partial + self.file.read()
+        lines = data.split('\n')
+        self.partial = lines.pop()
+        return [json.loads(line) for line in lines if line]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def make_probe():
+    if PROBE == 'stand-in':
+        return StandInProbe(sys.stdin.fileno())
+    if PROBE == 'grpc':
+        if not PROBE_COMMAND:
+            raise SystemExit('PROBE_COMMAND is required with PROBE=grpc (see README.md)')
+        return CommandProbe(PROBE_COMMAND)
+    raise SystemExit(f"Unknown PROBE '{PROBE}' (expected 'grpc' or 'stand-in')")
+
+def summarize(expected, blocked_at, missed, false_positives, probed_clean, errors):
+    """Report the final time-to-block distribution and misclassifications."""
+    times = sorted((blocked_at[ip] - expected[ip]) / 1_000_000_000 for ip in blocked_at)
+    fields = {
+        'expected_blocks': len(expected),
+        'blocked': len(blocked_at),
+        'false_negatives': len(missed),
+        'pending': len(expected) - len(blocked_at) - len(missed),
+        'false_positives': len(false_positives),
+        'clean_ips_probed': probed_clean,
+        'probe_errors': errors,
+        'poll_interval_seconds': POLL_INTERVAL,
+    }
+    if times:
+        fields.update({
+            'time_to_block_p50_s': round(percentile(times, 0.5), 3),
+            'time_to_block_p90_s': round(percentile(times, 0.9), 3),
+            'time_to_block_p99_s': round(percentile(times, 0.99), 3),
+            'time_to_block_max_s': round(times[-1], 3),
+        })
+        message = (f"Time to block: p50 {fields['time_to_block_p50_s']:g}s, p90 {fields['time_to_block_p90_s']:g}s, "
+                   f"p99 {fields['time_to_block_p99_s']:g}s over {len(times)} IPs")
+    else:
+        message = 'Time to block: no expected blocks were observed'
+    message += f'; {len(missed)} false negatives, {len(false_positives)} false positives'
+    if false_positives:
+        fields['false_positive_ips'] = sorted(false_positives)[:20]
+    if missed:
+        fields['false_negative_ips'] = sorted(missed)[:20]
+    report('INFO', message, **fields)
+
+def main():
+    print("=" * 80)
+    print("ZTAC Time-to-Block Checker")
+    print("=" * 80)
+    print(f"Oracle file: {ORACLE_FILE}")
+    if PROBE == 'stand-in':
+        print(f"Probe: local stand-in ({STANDIN_THRESHOLD} failures in {STANDIN_WINDOW:g}s, "
+              f"delay {STANDIN_DELAY:g}s) fed from stdin")
+    else:
+        print(f"Probe: {PROBE_COMMAND} against {ZTAC_GRPC_URL}")
+    print(f"Poll interval: {POLL_INTERVAL:g}s, block deadline: {BLOCK_DEADLINE:g}s")
+    print("=" * 80)
+    print(flush=True)
+
+    probe = make_probe()
+    oracle = OracleFollower(ORACLE_FILE)
+    tenant = ''
+    expected = {}  # ip -> oracle crossing time (ns)
+    seen = set()  # IPs observed by the oracle (first ORACLE_SEEN_LIMIT)
+    blocked_at = {}  # ip -> first poll that found it blocked (ns)
+    missed = set()
+    errors = 0
+
+    def follow():
+        nonlocal tenant
+        for record in oracle.read():
+            if record['event'] == 'crossed':
+                # An IP crosses again once the oracle's retention has expired; measure the first block
+                expected.setdefault(record['ip'], record['crossed_ns'])
+            elif record['event'] == 'seen':
+                seen.add(record['ip'])
+            elif record['event'] == 'start':
+                tenant = record['tenant']
+    deadline_ns = int(BLOCK_DEADLINE * 1_000_000_000)
+    start = time.monotonic()
+    last_report = start
+
+    try:
+        while not DURATION or time.monotonic() - start < DURATION:
+            follow()
+            pending = [ip for ip in expected if ip not in blocked_at and ip not in missed]
+            now_ns = time.time_ns()
+            for ip, blocked in probe.blocked(pending, tenant).items():
+                if blocked is None:
+                    errors += 1
+                elif blocked:
+                    blocked_at[ip] = now_ns
+                elif now_ns - expected[ip] > deadline_ns:
+                    missed.add(ip)
+
+            now = time.monotonic()
+            if now - last_report >= REPORT_INTERVAL:
+                report('INFO', f'{len(blocked_at)}/{len(expected)} expected blocks observed, '
+                               f'{len(missed)} missed', expected_blocks=len(expected), blocked=len(blocked_at),
+                       false_negatives=len(missed), probe_errors=errors)
+                last_report = now
+            time.sleep(POLL_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+
+    # False positives: IPs the oracle saw but never expected to block
+    follow()
+    clean = sorted(seen - expected.keys())
+    verdicts = probe.blocked(clean, tenant)
+    false_positives = {ip for ip, blocked in verdicts.items() if blocked}
+    errors += sum(1 for blocked in verdicts.values() if blocked is None)
+    summarize(expected, blocked_at, missed, false_positives, len(clean), errors)
+    probe.close()
+    oracle.close()
+
+if __name__ == '__main__':
+    main()
@@ -8,13 +8,126 @@ import json
 import time
 import random
 import os
-from datetime import datetime
+import sys
+import signal
+import itertools
+import math
+import bisect
+import collections
+import gzip
+import mmap
+import queue
+import stat
+import struct
+import socket
+import threading
+import tracemalloc
+import ast
+import asyncio
+import ipaddress
+import multiprocessing
+import multiprocessing.connection
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from operator import itemgetter
+from array import array
+from datetime import datetime, timezone
+from json.encoder import encode_basestring_ascii
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; populations fall back to array('I')
+    np = None
+
+try:
+    import grpc
+except ImportError:  # grpcio is only needed for OUTPUT=otlp
+    grpc = None
 
 # Configuration
-LOG_INTERVAL = 2  # seconds between log batches
+TARGET_RATE = float(os.getenv('TARGET_RATE', '7'))  # events per second
+RATE_REPORT_INTERVAL = float(os.getenv('RATE_REPORT_INTERVAL', '10'))  # seconds between rate reports
+BURST_SECONDS = float(os.getenv('BURST_SECONDS', '0.5'))  # max catch-up after a stall, in seconds of traffic
+FLUSH_BYTES = int(os.getenv('FLUSH_BYTES', '262144'))  # flush output once this many bytes are buffered
+FLUSH_INTERVAL = float(os.getenv('FLUSH_INTERVAL', '0.05'))  # max seconds a line may sit in the buffer
+CLOCK = os.getenv('CLOCK', 'wall')  # 'wall' or 'simulated'
+SIM_START = os.getenv('SIM_START')  # ISO-8601 start of the simulated clock (default: now)
+SIM_SPEED = float(os.getenv('SIM_SPEED', '1'))  # simulated seconds per real second
+JSON_CACHE_SIZE = 65536  # max cached JSON string literals before the cache is reset
+WORKERS = int(os.getenv('WORKERS', '1'))  # generator processes, each owning one shard of the IP space
+ATTACKER_POPULATION = int(os.getenv('ATTACKER_POPULATION', '0'))  # synthetic attacker IPs (0 = ATTACKER_IPS)
+LEGITIMATE_POPULATION = int(os.getenv('LEGITIMATE_POPULATION', '0'))  # synthetic legitimate IPs (0 = LEGITIMATE_IPS)
+CORPORATE_POPULATION = int(os.getenv('CORPORATE_POPULATION', '0'))  # synthetic corporate IPs (0 = CORPORATE_IPS)
+ATTACKER_NETWORKS = os.getenv('ATTACKER_NETWORKS', '100.64.0.0/10')
+LEGITIMATE_NETWORKS = os.getenv('LEGITIMATE_NETWORKS', '172.16.0.0/12,192.168.0.0/16')
+CORPORATE_NETWORKS = os.getenv('CORPORATE_NETWORKS', '10.0.0.0/24')
+ATTACKER_DENSITY = float(os.getenv('ATTACKER_DENSITY', '0'))  # fraction of ATTACKER_NETWORKS in use (overrides size)
+LEGITIMATE_DENSITY = float(os.getenv('LEGITIMATE_DENSITY', '0'))  # ... of LEGITIMATE_NETWORKS
+CORPORATE_DENSITY = float(os.getenv('CORPORATE_DENSITY', '0'))  # ... of CORPORATE_NETWORKS
+IP_SKEW = float(os.getenv('IP_SKEW', '1.0'))  # Zipf exponent for synthetic populations (0 = uniform)
+POPULATION_SEED = int(os.getenv('POPULATION_SEED', '0'))  # seed for synthetic population layout
+SCENARIO_FILE = os.getenv('SCENARIO_FILE')  # JSON timeline of traffic phases (default: fixed batch mix)
+ARRIVALS = os.getenv('ARRIVALS', 'uniform')  # 'uniform' (evenly paced) or 'poisson' (random arrivals)
+SAMPLER = os.getenv('SAMPLER', 'auto')  # default mix: 'numpy' (vectorized), 'python' or 'auto' (numpy if installed)
+ATTACKER_PROFILE = os.getenv('ATTACKER_PROFILE')  # JSON rate profile(s) for the default mix's attacker traffic
+LEGITIMATE_PROFILE = os.getenv('LEGITIMATE_PROFILE')  # ... legitimate traffic
+CORPORATE_PROFILE = os.getenv('CORPORATE_PROFILE')  # ... corporate traffic
+OUTPUT = os.getenv('OUTPUT', 'stdout')  # 'stdout' (JSON lines for Alloy), 'otlp' (direct to ZTAC) or 'loki'
+SINKS = os.getenv('SINKS')  # comma-separated sink URIs, e.g. 'stdout,file:auth.log.gz' (default: OUTPUT)
+SINK_QUEUE = int(os.getenv('SINK_QUEUE', '64'))  # batches (ticks) queued per sink before its policy applies
+SINK_POLICY = os.getenv('SINK_POLICY', 'block')  # full sink queue: 'block' (backpressure) or 'drop'
+SHED_POLICY = os.getenv('SHED_POLICY', 'block')  # when behind schedule: 'block' (fall behind), 'drop_legit' or 'sample'
+SHED_LAG = float(os.getenv('SHED_LAG', '0.1'))  # schedule lag in seconds at which SHED_POLICY starts shedding
+OUTPUT_FORMAT = os.getenv('OUTPUT_FORMAT', 'json')  # stdout lines: 'json' (full schema) or 'ztac' (native body)
+OTLP_ENDPOINT = os.getenv('OTLP_ENDPOINT', 'ztac-ip-reputation-engine-service:4317')
+OTLP_BATCH_SIZE = int(os.getenv('OTLP_BATCH_SIZE', '1000'))  # log records per export request
+OTLP_FLUSH_INTERVAL = float(os.getenv('OTLP_FLUSH_INTERVAL', '1'))  # max seconds a record waits for its batch
+OTLP_CONCURRENCY = int(os.getenv('OTLP_CONCURRENCY', '4'))  # export requests in flight per process
+OTLP_COMPRESSION = os.getenv('OTLP_COMPRESSION', 'gzip')  # 'gzip', 'deflate' or 'none'
+OTLP_TIMEOUT = float(os.getenv('OTLP_TIMEOUT', '10'))  # seconds per export request
+OTLP_REAL_IP = os.getenv('OTLP_REAL_IP', '10.1.0.100')  # X-Real-IP header, as set by Alloy
+OTLP_SERVICE_NAME = os.getenv('OTLP_SERVICE_NAME', 'alloy-auth-collector')  # service.name resource attribute
+PRIMARY_TENANT = os.getenv('PRIMARY_TENANT', '')  # X-Scope-OrgId header, as set by Alloy
+LOKI_URL = os.getenv('LOKI_URL', 'http://loki:3100/loki/api/v1/push')
+LOKI_BATCH_SIZE = int(os.getenv('LOKI_BATCH_SIZE', '1000'))  # log lines per push request
+LOKI_FLUSH_INTERVAL = float(os.getenv('LOKI_FLUSH_INTERVAL', '1'))  # max seconds a line waits for its batch
+LOKI_CONCURRENCY = int(os.getenv('LOKI_CONCURRENCY', '2'))  # push requests in flight per process
+LOKI_COMPRESSION = os.getenv('LOKI_COMPRESSION', 'gzip')  # 'gzip' or 'none'
+LOKI_TIMEOUT = float(os.getenv('LOKI_TIMEOUT', '10'))  # seconds per push request
+LOKI_TENANT_ID = os.getenv('LOKI_TENANT_ID', '')  # X-Scope-OrgID for multi-tenant Loki (default: none)
+MODE = os.getenv('MODE', 'live')  # 'live', 'backfill' (history at full speed), 'record' or 'replay'
+SEED = int(os.environ['SEED']) if os.getenv('SEED') else None  # fixed seed for reproducible traffic
+CORPUS_FILE = os.getenv('CORPUS_FILE', 'auth-corpus.bin')  # corpus written by record, read by replay
+RECORD_DURATION = float(os.getenv('RECORD_DURATION', '3600'))  # seconds of traffic to record
+REPLAY_SPEED = float(os.getenv('REPLAY_SPEED', '1'))  # 1 = original speed, 10 = 10x, 0 = full speed
+REPLAY_TIMESTAMPS = os.getenv('REPLAY_TIMESTAMPS', 'now')  # 'now' (rewrite) or 'original'
+REPLAY_LOOP = os.getenv('REPLAY_LOOP', 'false').lower() == 'true'  # restart the corpus when it ends
+METRICS_PORT = int(os.getenv('METRICS_PORT', '12346'))  # Prometheus /metrics listener (0 = disabled)
+BACKFILL_DAYS = float(os.getenv('BACKFILL_DAYS', '1'))  # days of history to generate
+BACKFILL_FILE = os.getenv('BACKFILL_FILE')  # write backfilled lines here instead of stdout
+BACKFILL_TICK = float(os.getenv('BACKFILL_TICK', '1'))  # simulated seconds per backfill step
+ORACLE_FILE = os.getenv('ORACLE_FILE')  # JSON lines of expected blocks for check_time_to_block.py (default: off)
+ORACLE_THRESHOLD = int(os.getenv('ORACLE_THRESHOLD', '5'))  # failures within the window that should block an IP
+ORACLE_WINDOW = float(os.getenv('ORACLE_WINDOW', '300'))  # sliding window for counting failures, in seconds
+ORACLE_RESET_ON_SUCCESS = os.getenv('ORACLE_RESET_ON_SUCCESS', 'false').lower() == 'true'
+ORACLE_SEEN_LIMIT = int(os.getenv('ORACLE_SEEN_LIMIT', '10000'))  # distinct IPs recorded for false-positive checks
+ORACLE_RETENTION = float(os.getenv('ORACLE_RETENTION', '3600'))  # seconds a crossed IP stays blocked in the model
+SOAK_INTERVAL = float(os.getenv('SOAK_INTERVAL', '0'))  # seconds between memory snapshots (0 = soak mode off)
+SOAK_WARMUP = float(os.getenv('SOAK_WARMUP', '300'))  # seconds before the baseline snapshot growth is measured from
+SOAK_BUDGET_MB = float(os.getenv('SOAK_BUDGET_MB', '0'))  # RSS growth per process that fails the run (0 = report only)
+SOAK_DURATION = float(os.getenv('SOAK_DURATION', '0'))  # seconds to soak before a final verdict (0 = until stopped)
+SOAK_TRACE_FRAMES = 4  # frames kept per traced allocation, enough to reach the generator code behind stdlib calls
+SCHEDULER_TICK = 0.01  # minimum sleep between scheduler ticks, in seconds
+ERROR_BACKOFF = 2  # seconds to wait after an unexpected error
 
-# Read tenants from environment variable (comma-separated)
-TENANTS_ENV = os.getenv('TENANTS')
+# Read tenants from environment variable (comma-separated), or with weights from TENANTS_FILE
+TENANTS_ENV = os.getenv('TENANTS', '')
+TENANTS_FILE = os.getenv('TENANTS_FILE')  # CSV of tenant[,volume_weight[,attack_weight]] lines (overrides TENANTS)
+ATTACKER_USERNAMES_FILE = os.getenv('ATTACKER_USERNAMES_FILE')  # one username per line (default: USERNAMES_ATTACKER)
+LEGITIMATE_USERNAMES_FILE = os.getenv('LEGITIMATE_USERNAMES_FILE')  # ... for legitimate and corporate logins
 TENANTS = [t.strip() for t in TENANTS_ENV.split(',') if t.strip()]
 
 # IP addresses that will be "attackers" (repeated failures)
@@ -54,10 +167,523 @@ USERNAMES_ATTACKER = [
     'admin@admin.com',
 ]
 
+ATTACKER_FAILURE_REASONS = [
+    'invalid_credentials',
+    'user_not_found',
+    'password_mismatch',
+    'account_locked'
+]
+
+LEGITIMATE_FAILURE_REASONS = [
+    'invalid_credentials',
+    'session_expired',
+]
+
+class WallClock:
+    """Real UTC time."""
+
+    def now_ns(self):
+        return time.time_ns()
+
+class SimulatedClock:
+    """Clock starting at a fixed instant and running at `speed` times real time.
+
+    Selected with CLOCK=simulated; backfill steps through history
+    with a SteppedClock instead.
+    """
+
+    def __init__(self, start_ns, speed=1.0, clock=time.monotonic_ns):
+        self.start_ns = start_ns
+        self.speed = speed
+        self.clock = clock
+        self.origin = clock()
+
+    def now_ns(self):
+        return self.start_ns + int((self.clock() - self.origin) * self.speed)
+
+class SteppedClock:
+    """Backfill clock: every reading moves time forward by `step_ns`.
+
+    run_backfill() positions it at the start of each tick with the step that
+    spreads the tick's events evenly, so sinks reading the clock once per
+    event get strictly increasing, realistic timestamps.
+    """
+
+    def __init__(self, start_ns):
+        self.ns = self.start_ns = start_ns
+        self.step_ns = 0
+
+    def set(self, ns, step_ns):
+        self.ns = self.start_ns = ns
+        self.step_ns = step_ns
+
+    def rewind(self):
+        """Restart the current tick, for another sink reading the same events."""
+        self.ns = self.start_ns
+
+    def now_ns(self):
+        ns = self.ns
+        self.ns = ns + self.step_ns
+        return ns
+
+# Pre-rendered microsecond-within-millisecond suffixes ('000Z' .. '999Z')
+_MICRO_SUFFIXES = tuple(f'{micros:03d}Z' for micros in range(1000))
+
+class TimestampProvider:
+    """Formats clock readings like datetime.isoformat() + 'Z'.
+
+    The second-level prefix is rendered once per second and the millisecond
+    prefix once per millisecond; each call only looks up the microsecond
+    suffix.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self._second = None
+        self._prefix = ''
+        self._millis = None
+        self._millis_prefix = ''
+        self._on_second = False
+
+    def format(self, ns):
+        millis, remainder = divmod(ns, 1_000_000)
+        if millis != self._millis:
+            self._millis = millis
+            second, ms = divmod(millis, 1000)
+            if second != self._second:
+                self._second = second
+                self._prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+            self._millis_prefix = f'{self._prefix}.{ms:03d}'
+            self._on_second = ms == 0
+        micros = remainder // 1000
+        if micros or not self._on_second:
+            return self._millis_prefix + _MICRO_SUFFIXES[micros]
+        # isoformat() omits the fraction entirely on whole seconds
+        return self._prefix + 'Z'
+
+    def now(self):
+        return self.format(self.clock.now_ns())
+
+def make_clock(kind=CLOCK, start=SIM_START, speed=SIM_SPEED):
+    """Build the clock selected by the CLOCK environment variable."""
+    if kind == 'wall':
+        return WallClock()
+    if kind == 'simulated':
+        if start:
+            start_dt = datetime.fromisoformat(start.replace('Z', '+00:00'))
+            if start_dt.tzinfo is None:
+                start_dt = start_dt.replace(tzinfo=timezone.utc)
+            start_ns = int(start_dt.timestamp()) * 1_000_000_000 + start_dt.microsecond * 1000
+        else:
+            start_ns = time.time_ns()
+        return SimulatedClock(start_ns, speed)
+    raise ValueError(f"Unknown CLOCK '{kind}' (expected 'wall' or 'simulated')")
+
+timestamps = TimestampProvider(make_clock())
+
+def _pack_ipv4(ip):
+    return int.from_bytes(socket.inet_aton(ip), 'big')
+
+def render_ipv4(value):
+    """Render a packed 32-bit IPv4 address as a dotted quad."""
+    return socket.inet_ntoa(int(value).to_bytes(4, 'big'))
+
+def render_ipv6(value):
+    """Render a 128-bit IPv6 address in its compressed text form."""
+    return socket.inet_ntop(socket.AF_INET6, value.to_bytes(16, 'big'))
+
+POPULATION_CHUNK = 1 << 16  # addresses computed per step while building a synthetic population
+
+def _shard_key(value):
+    # Multiplicative hash so consecutive addresses spread evenly across shards
+    return ((value * 0x9E3779B1) & 0xFFFFFFFF) >> 16
+
+class IPPopulation:
+    """Source IPs packed as 32-bit integers, sampled with a Zipf-like skew.
+
+    The rank of the sampled IP is drawn with probability roughly
+    proportional to 1 / (rank + 1) ** skew by inverting the continuous
+    power-law CDF, so sampling is O(1) and needs no probability table.
+    Addresses are stored in a NumPy uint32 array when NumPy is installed,
+    otherwise in array('I'); dotted quads are only rendered for sampled IPs.
+    """
+
+    def __init__(self, addresses, skew=0.0, description=''):
+        self.addresses = addresses
+        self.skew = skew
+        self.description = description
+        self._size = len(addresses)
+        self.unsharded = self  # the full population a shard was taken from
+
+    @classmethod
+    def from_strings(cls, ips, skew=0.0):
+        """Wrap a short explicit list of IPs (sampled uniformly by default)."""
+        addresses = array('I', (_pack_ipv4(ip) for ip in ips))
+        return cls(addresses, skew, ', '.join(ips))
+
+    @classmethod
+    def synthetic(cls, size, networks, skew=IP_SKEW, seed=POPULATION_SEED):
+        """Build `size` distinct addresses spread across comma-separated CIDR networks.
+
+        Offsets are an affine permutation of the combined address span, so
+        addresses are distinct without materializing the span. The result is
+        shuffled in place so popularity rank is unrelated to address order.
+        """
+        nets = [ipaddress.IPv4Network(net.strip()) for net in networks.split(',') if net.strip()]
+        starts = array('Q')
+        span = 0
+        for net in nets:
+            starts.append(span)
+            span += net.num_addresses
+        if size > span:
+            raise ValueError(f'Population of {size} does not fit in {networks} ({span} addresses)')
+
+        rng = random.Random(seed)
+        stride = rng.randrange(1, span) | 1
+        while math.gcd(stride, span) != 1:
+            stride += 2
+        offset = rng.randrange(span)
+        bases = [int(net.network_address) for net in nets]
+
+        if np is not None:
+            # Chunked into the final uint32 array, so building millions of IPs only needs
+            # POPULATION_CHUNK-sized 64-bit temporaries on top of it
+            addresses = np.empty(size, dtype=np.uint32)
+            starts64 = np.frombuffer(starts, dtype=np.uint64)
+            deltas = np.asarray(bases, dtype=np.uint64) - starts64  # modulo 2**64; adding an offset is exact
+            steps = np.arange(POPULATION_CHUNK, dtype=np.uint64) * np.uint64(stride)
+            for lo in range(0, size, POPULATION_CHUNK):
+                hi = min(size, lo + POPULATION_CHUNK)
+                offsets = (steps[:hi - lo] + np.uint64((lo * stride + offset) % span)) % np.uint64(span)
+                index = np.searchsorted(starts64, offsets, side='right') - 1
+                addresses[lo:hi] = deltas[index] + offsets
+            np.random.default_rng(seed).shuffle(addresses)
+        else:
+            addresses = array('I', [0]) * size
+            for i in range(size):
+                position = (i * stride + offset) % span
+                net_index = bisect.bisect_right(starts, position) - 1
+                addresses[i] = bases[net_index] + position - starts[net_index]
+            rng.shuffle(addresses)
+
+        return cls(addresses, skew, f'{size:,} synthetic from {networks} (skew {skew:g})')
+
+    def __len__(self):
+        return self._size
+
+    def rank(self, limit=None):
+        """Draw a popularity rank in [0, limit or len) with the configured skew."""
+        n = limit or self._size
+        u = random.random()
+        s = self.skew
+        if s == 0:
+            r = int(u * n)
+        elif s == 1:
+            r = int((n + 1) ** u) - 1
+        else:
+            exponent = 1 - s
+            r = int((((n + 1) ** exponent - 1) * u + 1) ** (1 / exponent)) - 1
+        return r if r < n else n - 1
+
+    def sample(self, limit=None):
+        """Return one dotted-quad IP drawn from the `limit` most popular (default: all)."""
+        return render_ipv4(self.addresses[self.rank(limit)])
+
+    def ip(self, rank):
+        """The dotted-quad IP at popularity `rank`."""
+        return render_ipv4(self.addresses[rank])
+
+    def render(self, ranks):
+        """Object array of dotted quads for a NumPy array of ranks, rendering each distinct IP once."""
+        distinct, inverse = np.unique(np.asarray(self.addresses)[ranks], return_inverse=True)
+        packed = distinct.astype('>u4').tobytes()
+        inet_ntoa = socket.inet_ntoa
+        rendered = np.array([inet_ntoa(packed[i:i + 4]) for i in range(0, 4 * len(distinct), 4)], dtype=object)
+        return rendered[inverse.ravel()]
+
+    def ranks(self, u, limit=None):
+        """Vectorized rank(): map a NumPy array of uniforms in [0, 1) to popularity ranks."""
+        n = limit or self._size
+        s = self.skew
+        if s == 0:
+            r = u * n
+        elif s == 1:
+            r = (n + 1) ** u - 1
+        else:
+            exponent = 1 - s
+            r = (((n + 1) ** exponent - 1) * u + 1) ** (1 / exponent) - 1
+        return np.minimum(r.astype(np.int64), n - 1)
+
+    def shard(self, index, shards):
+        """Return the sub-population of the IPs whose _shard_key() falls to shard `index`."""
+        full = self.unsharded.addresses
+        if np is not None and isinstance(full, np.ndarray):
+            keys = (full * np.uint32(0x9E3779B1)) >> np.uint32(16)  # uint32 multiplication wraps like _shard_key()
+            addresses = full[keys % np.uint64(shards) == index]
+        else:
+            addresses = array('I', (a for a in full if _shard_key(a) % shards == index))
+        sub = IPPopulation(addresses, self.skew, self.description)
+        sub.unsharded = self.unsharded
+        return sub
+
+class CidrPopulation:
+    """IPv4 or IPv6 population spread across CIDR blocks, never materialized.
+
+    Popularity rank r maps to the address at (r * stride + offset) mod span
+    of the blocks' combined address span, with Python's arbitrary-precision
+    integers covering 128-bit IPv6 arithmetic. The affine map is a
+    permutation, so addresses are distinct and scattered across the blocks
+    (and their prefixes) while nothing but the block table is stored; an
+    address is only computed and rendered when sampled. `density` sizes the
+    population as a fraction of the span instead of an absolute `size`.
+    The blocks must share one address family: IPv4 blocks next to an IPv6
+    one would hold a negligible part of the span and get no traffic.
+
+    Shards take every `shards`-th rank rather than hashing addresses, since
+    hashing would need the full list; a population remembers its shard so
+    sharding it the same way again is a no-op.
+    """
+
+    MAX_SIZE = 2 ** 53  # ranks are drawn with float arithmetic
+
+    def __init__(self, networks, size=0, density=0.0, skew=IP_SKEW, seed=POPULATION_SEED):
+        nets = [ipaddress.ip_network(net.strip()) for net in networks.split(',') if net.strip()]
+        if not nets:
+            raise ValueError('CIDR population needs at least one network')
+        if len({net.version for net in nets}) > 1:
+            raise ValueError(f'{networks} mixes IPv4 and IPv6 networks; a population takes one address family')
+        self.starts = [0]
+        for net in nets:
+            self.starts.append(self.starts[-1] + net.num_addresses)
+        self.span = self.starts.pop()
+        if density:
+            if not 0 < density <= 1:
+                raise ValueError(f'Density must be in (0, 1], got {density:g}')
+            size = max(1, round(self.span * density))
+        if not 0 < size <= min(self.span, self.MAX_SIZE):
+            raise ValueError(f'Population of {size} does not fit in {networks} ({self.span} addresses, '
+                             f'at most {self.MAX_SIZE})')
+        self.bases = [int(net.network_address) for net in nets]
+        self.render_ip = render_ipv6 if nets[0].version == 6 else render_ipv4
+        rng = random.Random(seed)
+        self.stride = rng.randrange(1, self.span) | 1 if self.span > 1 else 1
+        while math.gcd(self.stride, self.span) != 1:
+            self.stride += 2
+        self.offset = rng.randrange(self.span)
+        self.skew = skew
+        self.step = 1  # population rank r is global rank first + r * step
+        self.first = 0
+        self.shard_id = None
+        self.unsharded = self
+        self._size = size
+        detail = f'density {size / self.span:.3g}, ' if density else ''
+        self.description = f'{size:,} computed from {networks} ({detail}skew {skew:g})'
+
+    def __len__(self):
+        return self._size
+
+    # Same skewed rank draws as IPPopulation
+    rank = IPPopulation.rank
+    ranks = IPPopulation.ranks
+
+    def ip(self, rank):
+        """The IP at popularity `rank`, computed from its position in the span."""
+        position = ((self.first + rank * self.step) * self.stride + self.offset) % self.span
+        index = bisect.bisect_right(self.starts, position) - 1
+        return self.render_ip(self.bases[index] + position - self.starts[index])
+
+    def sample(self, limit=None):
+        """Return one IP drawn from the `limit` most popular (default: all)."""
+        return self.ip(self.rank(limit))
+
+    def render(self, ranks):
+        """Object array of IPs for a NumPy array of ranks, computing each distinct IP once."""
+        distinct, inverse = np.unique(ranks, return_inverse=True)
+        rendered = np.array([self.ip(rank) for rank in distinct.tolist()], dtype=object)
+        return rendered[inverse.ravel()]
+
+    def shard(self, index, shards):
+        """Return the sub-population of every `shards`-th rank of the full population, starting at `index`."""
+        if self.shard_id == (index, shards):
+            return self
+        full = self.unsharded
+        sub = object.__new__(CidrPopulation)
+        sub.__dict__.update(full.__dict__)
+        sub.first = full.first + index * full.step
+        sub.step = full.step * shards
+        sub._size = max(0, (full._size - index + shards - 1) // shards)
+        sub.shard_id = (index, shards)
+        return sub
+
+def build_population(size, networks, ips, density=0.0):
+    """Synthetic population of `size` IPs (or `density` of the networks), else the explicit `ips` list.
+
+    IPv4-only populations of a given size are materialized (IPPopulation);
+    a density or any IPv6 network gives a computed CidrPopulation.
+    """
+    ipv6 = ':' in networks
+    if density or (size and ipv6):
+        return CidrPopulation(networks, size, density)
+    if size:
+        return IPPopulation.synthetic(size, networks)
+    return IPPopulation.from_strings(ips)
+
+ATTACKER_POOL = build_population(ATTACKER_POPULATION, ATTACKER_NETWORKS, ATTACKER_IPS, ATTACKER_DENSITY)
+LEGITIMATE_POOL = build_population(LEGITIMATE_POPULATION, LEGITIMATE_NETWORKS, LEGITIMATE_IPS, LEGITIMATE_DENSITY)
+CORPORATE_POOL = build_population(CORPORATE_POPULATION, CORPORATE_NETWORKS, CORPORATE_IPS, CORPORATE_DENSITY)
+SHARD_CLASS_KEEP = (1.0, 1.0, 1.0)  # share of attacker/legitimate/corporate batches kept (see restrict_to_shard())
+
+class UsernameList:
+    """Read-only sequence of usernames packed into one byte blob plus an offsets array.
+
+    Username i is blob[offsets[i]:offsets[i + 1]], decoded only when it is
+    sampled, so a million-entry dictionary costs its UTF-8 bytes plus four
+    bytes per entry instead of a Python string object each. Supports len()
+    and indexing, so random.choice() samples it in O(1). Forked workers
+    share the blob copy-on-write.
+    """
+
+    def __init__(self, blob, offsets, description=''):
+        self.blob = blob
+        self.offsets = offsets
+        self.description = description
+        self._count = len(offsets) - 1
+
+    @classmethod
+    def load(cls, path):
+        """Read one username per line; blank lines and trailing whitespace are dropped.
+
+        Raises ValueError naming the line of a username that is not valid
+        UTF-8, since sampling decodes it on every draw.
+        """
+        blob = bytearray()
+        offsets = array('I', [0])
+        with open(path, 'rb') as f:
+            for number, line in enumerate(f, 1):
+                name = line.rstrip()
+                if name:
+                    try:
+                        name.decode('utf-8')
+                    except UnicodeDecodeError as e:
+                        raise ValueError(f'{path}:{number}: username is not valid UTF-8 ({e.reason})') from None
+                    blob += name
+                    offsets.append(len(blob))  # OverflowError past 4 GiB of usernames
+        if len(offsets) == 1:
+            raise ValueError(f'{path}: no usernames')
+        return cls(blob, offsets, f'{len(offsets) - 1:,} from {path}')  # no bytes() copy of a large blob
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].decode('utf-8')
+
+if ATTACKER_USERNAMES_FILE:
+    USERNAMES_ATTACKER = UsernameList.load(ATTACKER_USERNAMES_FILE)
+if LEGITIMATE_USERNAMES_FILE:
+    USERNAMES_LEGITIMATE = UsernameList.load(LEGITIMATE_USERNAMES_FILE)
+
+class AliasTable:
+    """Weighted random choice in O(1) per draw (Vose's alias method).
+
+    Building the table is O(n). Each draw then splits one random() into a
+    column and a coin flip, so picking among thousands of tenants costs the
+    same as picking among three.
+    """
+
+    def __init__(self, items, weights):
+        n = len(items)
+        total = float(sum(weights))
+        if not n or total <= 0:
+            raise ValueError('Alias table needs at least one item with a positive weight')
+        scaled = [weight * n / total for weight in weights]
+        prob = array('d', [1.0]) * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left over is 1.0 up to rounding and keeps its own column
+        self.items = list(items)
+        self.prob = prob
+        self.alias = [self.items[i] for i in alias]
+        self.alias_index = array('q', alias)
+        self._n = n
+
+    def __len__(self):
+        return self._n
+
+    def sample(self):
+        u = random.random() * self._n
+        column = int(u)
+        return self.items[column] if u - column < self.prob[column] else self.alias[column]
+
+    def indices(self, u):
+        """Vectorized sample(): map a NumPy array of uniforms in [0, 1) to indices into `items`."""
+        u = u * self._n
+        column = u.astype(np.int64)
+        return np.where(u - column < np.frombuffer(self.prob)[column], column,
+                        np.frombuffer(self.alias_index, dtype=np.int64)[column])
+
+def load_tenants(path):
+    """Read a tenants file: one `tenant[,volume_weight[,attack_weight]]` per line.
+
+    Volume weight scales a tenant's share of legitimate and corporate
+    traffic and defaults to 1; attack weight scales its share of attacker
+    traffic and defaults to the volume weight. Blank lines and lines
+    starting with # are skipped. Returns (tenants, volume_weights, attack_weights).
+    """
+    tenants, volume, attack = [], [], []
+    seen = set()
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = [field.strip() for field in line.split(',')]
+            try:
+                weights = [float(field) for field in fields[1:3]]
+            except ValueError:
+                raise ValueError(f'{path}:{number}: weights must be numbers') from None
+            if len(fields) > 3 or any(weight < 0 or not math.isfinite(weight) for weight in weights):
+                raise ValueError(f'{path}:{number}: expected tenant[,volume_weight[,attack_weight]] '
+                                 f'with non-negative weights')
+            if fields[0] in seen:
+                raise ValueError(f'{path}:{number}: duplicate tenant {fields[0]!r}')
+            seen.add(fields[0])
+            tenants.append(fields[0])
+            volume.append(weights[0] if weights else 1.0)
+            attack.append(weights[1] if len(weights) > 1 else volume[-1])
+    return tenants, volume, attack
+
+if TENANTS_FILE:
+    TENANTS, TENANT_VOLUME_WEIGHTS, TENANT_ATTACK_WEIGHTS = load_tenants(TENANTS_FILE)
+else:
+    TENANT_VOLUME_WEIGHTS = TENANT_ATTACK_WEIGHTS = [1.0] * len(TENANTS)
+if not TENANTS:
+    raise SystemExit('No tenants: set TENANTS (comma-separated) or TENANTS_FILE')
+
+def tenant_samplers(volume, attack):
+    """Tenant of each event by traffic class: attacks follow attack weights, everything else volume weights."""
+    volume_tenants = AliasTable(TENANTS, volume)
+    return {'attacker': AliasTable(TENANTS, attack), 'legitimate': volume_tenants, 'corporate': volume_tenants}
+
+TENANT_SAMPLERS = tenant_samplers(TENANT_VOLUME_WEIGHTS, TENANT_ATTACK_WEIGHTS)
+
 def generate_auth_event(tenant, ip, username, success, reason=None):
-    """Generate a single authentication log event in JSON format."""
+    """Generate a single authentication log event in JSON format.
+
+    This is the reference schema; the emit path uses encode_auth_event(), which
+    produces the same bytes as json.dumps() of this dict.
+    """
     event = {
-        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'timestamp': timestamps.now(),
         'level': 'INFO' if success else 'WARN',
         'service': 'auth-service',
         'tenant': tenant,
@@ -76,94 +702,3144 @@ def generate_auth_event(tenant, ip, username, success, reason=None):
 
     return event
 
-def generate_log_batch():
-    """Generate a batch of authentication log events."""
+# Placeholders used to carve variable fields out of json.dumps() output
+_SLOT = '\x00slot\x00'
+_TIMESTAMP_SLOT = '\x00timestamp\x00'
+USER_AGENTS = ('Mozilla/5.0', 'curl/7.68.0')
+
+def _compile_template(success, user_agent, with_reason):
+    """Precompile one event shape into a bytes %-template.
+
+    The template is rendered through json.dumps() itself so the fixed parts are
+    byte-identical to generate_auth_event() output. Slots are, in order:
+    timestamp, tenant, ip, username and (if with_reason) failure reason.
+    """
+    auth = {
+        'ip_address': _SLOT,
+        'username': _SLOT,
+        'success': success,
+        'method': 'password',
+        'user_agent': user_agent,
+    }
+    if with_reason:
+        auth['failure_reason'] = _SLOT
+    event = {
+        'timestamp': _TIMESTAMP_SLOT,
+        'level': 'INFO' if success else 'WARN',
+        'service': 'auth-service',
+        'tenant': _SLOT,
+        'event_type': 'authentication',
+        'auth': auth,
+    }
+    text = json.dumps(event).replace('%', '%%')
+    text = text.replace(json.dumps(_TIMESTAMP_SLOT), '"%s"').replace(json.dumps(_SLOT), '%s')
+    return (text + '\n').encode('ascii')
+
+EVENT_TEMPLATES = {
+    (success, user_agent, with_reason): _compile_template(success, user_agent, with_reason)
+    for success in (True, False)
+    for user_agent in USER_AGENTS
+    for with_reason in (True, False)
+}
+
+class _JsonLiteralCache(dict):
+    """Memoizes string -> JSON string literal bytes, as json.dumps() renders them."""
+
+    def __missing__(self, value):
+        if len(self) >= JSON_CACHE_SIZE:
+            self.clear()
+        literal = self[value] = encode_basestring_ascii(value).encode('ascii')
+        return literal
+
+_json_literal = _JsonLiteralCache()
+
+def encode_auth_event(tenant, ip, username, success, reason=None, timestamp=None, rng=random):
+    """Encode a single authentication event as a newline-terminated JSON line.
+
+    Byte-identical to json.dumps(generate_auth_event(...)) plus a newline, but
+    only the variable fields are rendered per event. `rng` draws the user
+    agent; sinks encoding off the generator thread pass their own.
+    """
+    if timestamp is None:
+        timestamp = timestamps.now()
+    user_agent = USER_AGENTS[0] if rng.random() > 0.3 else USER_AGENTS[1]
+    literal = _json_literal
+    if not success and reason:
+        return EVENT_TEMPLATES[False, user_agent, True] % (
+            timestamp.encode('ascii'), literal[tenant], literal[ip], literal[username], literal[reason])
+    return EVENT_TEMPLATES[success, user_agent, False] % (
+        timestamp.encode('ascii'), literal[tenant], literal[ip], literal[username])
+
+# ZTAC-native body, as produced by Alloy's extract_auth_fields transform
+ZTAC_BODY_TEMPLATES = {
+    True: b'{"UserName":%s,"Status":"SUCCESS","SourceIP":%s}',
+    False: b'{"UserName":%s,"Status":"FAILURE","SourceIP":%s}',
+}
+
+def encode_ztac_body(ip, username, success):
+    """Encode the {"UserName","Status","SourceIP"} body ZTAC ingests over OTLP."""
+    return ZTAC_BODY_TEMPLATES[bool(success)] % (_json_literal[username], _json_literal[ip])
+
+def encode_ztac_line(tenant, ip, username, success, reason=None, timestamp=None, rng=None):
+    """Encode an event as a newline-terminated ZTAC-native body for stdout (no timestamp)."""
+    return encode_ztac_body(ip, username, success) + b'\n'
+
+LINE_ENCODERS = {
+    'json': encode_auth_event,
+    'ztac': encode_ztac_line,
+}
+
+def generate_event_batch(classes=None):
+    """Generate a batch of authentication events as (tenant, ip, username, success, reason) tuples.
+
+    When a `classes` list is given, the traffic class of each event is
+    appended to it in the same order.
+    """
     events = []
+    attack_tenants = TENANT_SAMPLERS['attacker']
+    volume_tenants = TENANT_SAMPLERS['legitimate']
+    keep_attacker, keep_legitimate, keep_corporate = SHARD_CLASS_KEEP
 
     # Generate attacker attempts (mostly failures)
-    for _ in range(random.randint(3, 8)):
-        ip = random.choice(ATTACKER_IPS)
-        tenant = random.choice(TENANTS)
+    attacking = ATTACKER_POOL and (keep_attacker >= 1 or random.random() < keep_attacker)
+    for _ in range(random.randint(3, 8) if attacking else 0):
+        ip = ATTACKER_POOL.sample()
+        tenant = attack_tenants.sample()
         username = random.choice(USERNAMES_ATTACKER)
 
         # Attackers fail 95% of the time
         success = random.random() < 0.05
-        reason = random.choice([
-            'invalid_credentials',
-            'user_not_found',
-            'password_mismatch',
-            'account_locked'
-        ]) if not success else None
+        reason = random.choice(ATTACKER_FAILURE_REASONS) if not success else None
 
-        events.append(generate_auth_event(tenant, ip, username, success, reason))
+        events.append((tenant, ip, username, success, reason))
+    attackers = len(events)
 
     # Generate legitimate user attempts (mostly successes)
-    for _ in range(random.randint(5, 10)):
-        ip = random.choice(LEGITIMATE_IPS)
-        tenant = random.choice(TENANTS)
+    active = LEGITIMATE_POOL and (keep_legitimate >= 1 or random.random() < keep_legitimate)
+    for _ in range(random.randint(5, 10) if active else 0):
+        ip = LEGITIMATE_POOL.sample()
+        tenant = volume_tenants.sample()
         username = random.choice(USERNAMES_LEGITIMATE)
 
         # Legitimate users succeed 90% of the time
         success = random.random() < 0.90
-        reason = random.choice([
-            'invalid_credentials',
-            'session_expired',
-        ]) if not success else None
+        reason = random.choice(LEGITIMATE_FAILURE_REASONS) if not success else None
 
-        events.append(generate_auth_event(tenant, ip, username, success, reason))
+        events.append((tenant, ip, username, success, reason))
+    legitimate = len(events) - attackers
 
     # Generate corporate network access (always successful)
-    if random.random() < 0.3:  # 30% chance per batch
-        ip = random.choice(CORPORATE_IPS)
-        tenant = random.choice(TENANTS)
+    if CORPORATE_POOL and random.random() < 0.3 * keep_corporate:  # 30% chance per batch
+        ip = CORPORATE_POOL.sample()
+        tenant = volume_tenants.sample()
         username = random.choice(USERNAMES_LEGITIMATE)
 
-        events.append(generate_auth_event(tenant, ip, username, True))
+        events.append((tenant, ip, username, True, None))
 
+    if classes is not None:
+        classes += ['attacker'] * attackers + ['legitimate'] * legitimate
+        classes += ['corporate'] * (len(events) - attackers - legitimate)
     return events
 
-def main():
-    print("=" * 80)
-    print("Mock Authentication Log Generator")
-    print("=" * 80)
-    print(f"Generating authentication logs every {LOG_INTERVAL} seconds")
-    print(f"Tenants: {', '.join(TENANTS)}")
-    print(f"Attacker IPs (high failure rate): {', '.join(ATTACKER_IPS)}")
-    print(f"Legitimate IPs (high success rate): {', '.join(LEGITIMATE_IPS)}")
-    print(f"Corporate IPs (always allowed): {', '.join(CORPORATE_IPS)}")
-    print("=" * 80)
-    print()
+def generate_log_batch():
+    """Generate a batch of authentication log events as generate_auth_event() dicts.
+
+    The emit path samples tuples with generate_event_batch() and encodes
+    them directly; this keeps the original dict-returning interface.
+    """
+    return [generate_auth_event(*event) for event in generate_event_batch()]
 
-    iteration = 0
+def shard_share(pool):
+    """Fraction of its full population that a (possibly sharded) pool holds."""
+    return len(pool) / len(pool.unsharded) if pool else 0.0
+
+def restrict_to_shard(index, shards):
+    """Limit this process's IP pools to the IPs owned by shard `index`; returns the shard's share of the mix.
+
+    Only called inside worker processes. Sharding by IP keeps every
+    (tenant, IP) sequence within one worker, so ZTAC's per-IP thresholds
+    still see coherent sequences. A few explicit IPs do not split evenly,
+    so each class keeps its batches in proportion to the share of its IPs
+    this shard owns (SHARD_CLASS_KEEP), and the returned share of the
+    default mix's events, by which the worker scales its rate, keeps the
+    rate of every class across all workers as configured.
+    """
+    global ATTACKER_POOL, LEGITIMATE_POOL, CORPORATE_POOL, SHARD_CLASS_KEEP
+    full = [pool.unsharded for pool in (ATTACKER_POOL, LEGITIMATE_POOL, CORPORATE_POOL)]
+    ATTACKER_POOL, LEGITIMATE_POOL, CORPORATE_POOL = (pool.shard(index, shards) for pool in full)
+    shares = [shard_share(pool) for pool in (ATTACKER_POOL, LEGITIMATE_POOL, CORPORATE_POOL)]
+    SHARD_CLASS_KEEP = tuple(share / max(shares) if max(shares) else 0.0 for share in shares)
+    means = [mean if pool else 0.0 for mean, pool in zip(DEFAULT_MIX_SHARES.values(), full)]
+    return sum(mean * share for mean, share in zip(means, shares)) / (sum(means) or 1.0)
+
+def event_stream():
+    """Yield (traffic_class, event) pairs indefinitely, preserving the traffic mix of generate_event_batch()."""
+    if not (ATTACKER_POOL or LEGITIMATE_POOL or CORPORATE_POOL):
+        raise ValueError('Every IP pool is empty: no events to generate')
     while True:
+        classes = []
+        events = generate_event_batch(classes)
+        yield from zip(classes, events)
+
+class VectorSampler:
+    """Vectorized generate_event_batch(): the same traffic mix drawn a block at a time with NumPy.
+
+    Batch sizes, then the IP rank, tenant, username, outcome and reason of
+    every event in the block come from a handful of array operations; Python
+    only renders the final tuples. Per-batch class runs (attackers, then
+    legitimate users, then maybe one corporate login) carry over between
+    calls, so small blocks keep the mix of the pure-Python path. Seeded from
+    `random`, so SEED keeps runs reproducible (though not identical to the
+    pure-Python path).
+    """
+
+    CLASSES = ('attacker', 'legitimate', 'corporate')
+    SUCCESS_RATES = (0.05, 0.90, 1.0)
+
+    def __init__(self):
+        self.rng = np.random.default_rng(random.getrandbits(64))
+        self._pending = np.empty(0, dtype=np.int64)
+        self.usernames = (USERNAMES_ATTACKER, USERNAMES_LEGITIMATE, USERNAMES_LEGITIMATE)  # lists or UsernameLists
+        self.reasons = ATTACKER_FAILURE_REASONS + LEGITIMATE_FAILURE_REASONS + [None]
+        self.reason_offset = np.array([0, len(ATTACKER_FAILURE_REASONS), len(ATTACKER_FAILURE_REASONS)])
+        self.reason_count = np.array([len(ATTACKER_FAILURE_REASONS)] + [len(LEGITIMATE_FAILURE_REASONS)] * 2)
+        self.success_rate = np.array(self.SUCCESS_RATES)
+
+    def _classes(self, count):
+        """Next `count` class codes (indices into CLASSES) of the batch sequence."""
+        pools = (ATTACKER_POOL, LEGITIMATE_POOL, CORPORATE_POOL)
+        if not any(pools):
+            return self._pending[:0]
+        while len(self._pending) < count:
+            batches = max(64, (count - len(self._pending)) // 13 + 1)
+            sizes = np.zeros((batches, 3), dtype=np.int64)
+            keep_attacker, keep_legitimate, keep_corporate = SHARD_CLASS_KEEP
+            if ATTACKER_POOL:
+                sizes[:, 0] = self.rng.integers(3, 9, batches)
+                if keep_attacker < 1:
+                    sizes[:, 0] *= self.rng.random(batches) < keep_attacker
+            if LEGITIMATE_POOL:
+                sizes[:, 1] = self.rng.integers(5, 11, batches)
+                if keep_legitimate < 1:
+                    sizes[:, 1] *= self.rng.random(batches) < keep_legitimate
+            if CORPORATE_POOL:
+                sizes[:, 2] = self.rng.random(batches) < 0.3 * keep_corporate  # 30% chance per batch
+            block = np.repeat(np.tile(np.arange(3), batches), sizes.ravel())
+            self._pending = np.concatenate((self._pending, block))
+        codes, self._pending = self._pending[:count], self._pending[count:]
+        return codes
+
+    def events(self, count):
+        """Return (events, classes) for the next `count` events of the mix."""
+        codes = self._classes(count)
+        n = len(codes)
+        u = self.rng.random((5, n))  # IP rank, tenant, username, outcome, reason
+
+        # Pools render each distinct address once; skewed populations repeat the popular ones a lot
+        ips = np.empty(n, dtype=object)
+        usernames = np.empty(n, dtype=object)
+        for code, pool in enumerate((ATTACKER_POOL, LEGITIMATE_POOL, CORPORATE_POOL)):
+            mask = codes == code
+            if pool and mask.any():
+                ips[mask] = pool.render(pool.ranks(u[0][mask]))
+                names = self.usernames[code]
+                usernames[mask] = list(map(names.__getitem__, (u[2][mask] * len(names)).astype(np.int64).tolist()))
+        ips = ips.tolist()
+
+        volume_tenants, attack_tenants = TENANT_SAMPLERS['legitimate'], TENANT_SAMPLERS['attacker']
+        tenant_index = volume_tenants.indices(u[1])
+        if attack_tenants is not volume_tenants:
+            attacks = codes == 0
+            tenant_index[attacks] = attack_tenants.indices(u[1][attacks])
+        tenants = list(map(volume_tenants.items.__getitem__, tenant_index.tolist()))
+
+        success = u[3] < self.success_rate[codes]
+        reason_index = np.where(success, len(self.reasons) - 1,
+                                self.reason_offset[codes] + (u[4] * self.reason_count[codes]).astype(np.int64))
+
+        events = list(zip(tenants, ips, usernames.tolist(), success.tolist(),
+                          map(self.reasons.__getitem__, reason_index.tolist())))
+        return events, list(map(self.CLASSES.__getitem__, codes.tolist()))
+
+def use_vector_sampler(sampler=SAMPLER):
+    """Whether the default mix uses VectorSampler (SAMPLER=numpy, or auto with NumPy installed)."""
+    if sampler not in ('auto', 'numpy', 'python'):
+        raise ValueError(f"Unknown SAMPLER '{sampler}' (expected 'auto', 'numpy' or 'python')")
+    if sampler == 'numpy' and np is None:
+        raise SystemExit('SAMPLER=numpy needs NumPy (pip install numpy)')
+    return sampler != 'python' and np is not None
+
+class BatchSource:
+    """Default traffic: generate_event_batch()'s fixed mix at a constant rate.
+
+    Like Scenario, `classes` holds the traffic class of each event returned
+    by the last events() call. Events come from VectorSampler when NumPy is
+    available (see use_vector_sampler()), otherwise from generate_event_batch().
+    """
+
+    def __init__(self, rate, arrivals=ARRIVALS, vectorized=None):
+        if arrivals not in ARRIVAL_PROCESSES:
+            raise ValueError(f"Unknown ARRIVALS '{arrivals}' (expected one of {ARRIVAL_PROCESSES})")
+        self.target_rate = rate
+        self.arrivals = arrivals
+        self.origin = 0.0
+        self.phase = None
+        self.classes = []
+        self.vectorized = use_vector_sampler() if vectorized is None else vectorized
+        self._sampler = VectorSampler() if self.vectorized else None
+        self._stream = event_stream()
+
+    def rate(self, elapsed):
+        return self.target_rate
+
+    def events(self, count):
+        if self._sampler is not None:
+            events, self.classes = self._sampler.events(count)
+            return events
+        pairs = list(itertools.islice(self._stream, count))
+        self.classes = [pair[0] for pair in pairs]
+        return [pair[1] for pair in pairs]
+
+    def shard(self, index, shards):
+        share = restrict_to_shard(index, shards)
+        return BatchSource(self.target_rate * share, self.arrivals, self.vectorized)
+
+class DiurnalProfile:
+    """Daily sinusoid between `trough` and `peak`, peaking at `peak_hour` UTC."""
+
+    def __init__(self, peak=1.0, trough=0.2, peak_hour=14.0, period=86400.0):
+        self.mid = (peak + trough) / 2
+        self.amplitude = (peak - trough) / 2
+        self.peak_at = peak_hour * 3600
+        self.angular = 2 * math.pi / period
+
+    def multiplier(self, elapsed, epoch):
+        return self.mid + self.amplitude * math.cos((epoch - self.peak_at) * self.angular)
+
+class BurstProfile:
+    """Step bursts: `factor` times the rate for `duration` seconds every `every` seconds from `start`."""
+
+    def __init__(self, factor=50.0, every=600.0, duration=30.0, start=0.0):
+        self.factor = factor
+        self.every = every
+        self.duration = duration
+        self.start = start
+
+    def multiplier(self, elapsed, epoch):
+        since = elapsed - self.start
+        if since >= 0 and since % self.every < self.duration:
+            return self.factor
+        return 1.0
+
+class CsvProfile:
+    """Multiplier curve from a CSV of `seconds,multiplier` rows, linearly interpolated.
+
+    Times are relative to the start of the run. With `loop` the curve
+    repeats after its last row; otherwise the last value is held.
+    """
+
+    def __init__(self, file, loop=True):
+        self.times = []
+        self.values = []
+        with open(file) as f:
+            for row in f:
+                fields = row.split(',')
+                try:
+                    point = float(fields[0]), float(fields[1])
+                except (ValueError, IndexError):
+                    continue  # header, comment or blank line
+                self.times.append(point[0])
+                self.values.append(point[1])
+        if not self.times:
+            raise ValueError(f"Rate profile CSV {file} has no 'seconds,multiplier' rows")
+        self.period = self.times[-1] if loop else 0.0
+
+    def multiplier(self, elapsed, epoch):
+        if self.period > 0:
+            elapsed %= self.period
+        i = bisect.bisect_right(self.times, elapsed)
+        if i == 0:
+            return self.values[0]
+        if i == len(self.times):
+            return self.values[-1]
+        t0, t1 = self.times[i - 1], self.times[i]
+        v0, v1 = self.values[i - 1], self.values[i]
+        return v0 + (v1 - v0) * (elapsed - t0) / (t1 - t0)
+
+class CompositeProfile:
+    """Product of several profiles, e.g. a diurnal curve with bursts on top."""
+
+    def __init__(self, profiles):
+        self.profiles = profiles
+
+    def multiplier(self, elapsed, epoch):
+        result = 1.0
+        for profile in self.profiles:
+            result *= profile.multiplier(elapsed, epoch)
+        return result
+
+RATE_PROFILES = {'diurnal': DiurnalProfile, 'burst': BurstProfile, 'csv': CsvProfile}
+
+def build_profile(spec, base_dir=''):
+    """Build a rate profile from its JSON spec (an object or a list of objects to multiply)."""
+    if isinstance(spec, list):
+        return CompositeProfile([build_profile(item, base_dir) for item in spec])
+    params = dict(spec)
+    kind = params.pop('type', None)
+    if kind not in RATE_PROFILES:
+        raise ValueError(f"Rate profile: unknown type {kind!r} (expected one of {sorted(RATE_PROFILES)})")
+    if kind == 'csv':
+        params['file'] = os.path.join(base_dir, params['file'])
+    return RATE_PROFILES[kind](**params)
+
+def _ramp(value):
+    """Normalize a scenario value (number or [start, end]) to a (start, end) pair."""
+    if isinstance(value, (list, tuple)):
+        start, end = value
+        return float(start), float(end)
+    return float(value), float(value)
+
+class TrafficStream:
+    """One class of traffic within a scenario phase.
+
+    Rate and active population fraction ramp linearly from their start to
+    end values over the phase. Only the `active` most popular IPs of the
+    population are used, so a ramp grows the active set (e.g. a botnet).
+    An optional rate profile multiplies the rate over the whole run.
+    """
+
+    def __init__(self, traffic_class, rate, pool, usernames, success_rate, reasons,
+                 active=(1.0, 1.0), ip_order='random', profile=None):
+        self.traffic_class = traffic_class
+        self.rate_range = rate
+        self.pool = pool
+        self.usernames = usernames
+        self.success_rate = success_rate
+        self.reasons = reasons
+        self.active_range = active
+        self.ip_order = ip_order
+        self.profile = profile
+        self._limit = len(pool)
+        self._cursor = 0
+
+    def prepare(self, progress, elapsed=0.0, epoch=0.0):
+        """Update the active population for `progress` in [0, 1] and return the current rate.
+
+        `elapsed` (seconds since the run started) and `epoch` (UTC seconds)
+        drive the rate profile.
+        """
+        if not self.pool:
+            return 0.0  # this shard owns none of the stream's IPs
+        start, end = self.active_range
+        self._limit = max(1, min(len(self.pool), int(len(self.pool) * (start + (end - start) * progress))))
+        start, end = self.rate_range
+        rate = start + (end - start) * progress
+        if self.profile is not None:
+            rate *= self.profile.multiplier(elapsed, epoch)
+        return rate
+
+    def event(self):
+        if self.ip_order == 'round_robin':
+            # Even spacing per IP, e.g. for low-and-slow attacks under a threshold
+            ip = self.pool.ip(self._cursor % self._limit)
+            self._cursor += 1
+        else:
+            ip = self.pool.sample(self._limit)
+        success = random.random() < self.success_rate
+        reason = random.choice(self.reasons) if not success and self.reasons else None
+        return (TENANT_SAMPLERS[self.traffic_class].sample(), ip, random.choice(self.usernames), success, reason)
+
+    def shard(self, index, shards):
+        # Rate in proportion to the IPs owned, not 1 / shards: a few explicit IPs do not split evenly
+        pool = self.pool.shard(index, shards)
+        share = shard_share(pool)
+        start, end = self.rate_range
+        return TrafficStream(
+            self.traffic_class, (start * share, end * share), pool,
+            self.usernames, self.success_rate, self.reasons, self.active_range, self.ip_order, self.profile)
+
+TRAFFIC_CLASSES = {
+    'attacker': {'usernames': USERNAMES_ATTACKER, 'success_rate': 0.05, 'reasons': ATTACKER_FAILURE_REASONS},
+    'legitimate': {'usernames': USERNAMES_LEGITIMATE, 'success_rate': 0.90, 'reasons': LEGITIMATE_FAILURE_REASONS},
+    'corporate': {'usernames': USERNAMES_LEGITIMATE, 'success_rate': 1.0, 'reasons': LEGITIMATE_FAILURE_REASONS},
+}
+
+STREAM_KEYS = {'class', 'rate', 'population', 'active', 'success_rate', 'usernames', 'reasons', 'ip_order',
+               'profile'}
+ARRIVAL_PROCESSES = ('uniform', 'poisson')
+
+# Mean events per generate_event_batch() call by class, for the default mix as streams
+DEFAULT_MIX_SHARES = {'attacker': 5.5, 'legitimate': 7.5, 'corporate': 0.3}
+PHASE_KEYS = {'name', 'duration', 'streams'}
+
+class Scenario:
+    """Timeline of traffic phases loaded from a SCENARIO_FILE.
+
+    The scheduler asks for the current rate every tick, so phases switch on
+    schedule with no pause in output. After the last phase the timeline
+    restarts when `loop` is set, otherwise the last phase keeps running.
+    `origin` is the UTC time of elapsed 0, for time-of-day rate profiles.
+    """
+
+    def __init__(self, name, phases, loop=False, arrivals=ARRIVALS):
+        if arrivals not in ARRIVAL_PROCESSES:
+            raise ValueError(f"Unknown arrivals '{arrivals}' (expected one of {ARRIVAL_PROCESSES})")
+        self.name = name
+        self.phases = phases
+        self.loop = loop
+        self.arrivals = arrivals
+        self.origin = timestamps.clock.now_ns() / 1_000_000_000
+        self.total_duration = sum(phase['duration'] for phase in phases)
+        self.phase = None
+        self.classes = []
+        self._streams = []
+        self._cum_weights = []
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            spec = json.load(f)
+        return cls.from_spec(spec, os.path.dirname(path), os.path.basename(path))
+
+    @classmethod
+    def from_spec(cls, spec, base_dir='', default_name='scenario'):
+        """Build a scenario from its parsed JSON; relative CSV profile paths resolve against base_dir."""
+        populations = {}
+        phases = []
+        for number, phase_spec in enumerate(spec['phases']):
+            unknown = set(phase_spec) - PHASE_KEYS
+            if unknown:
+                raise ValueError(f"Phase {number}: unknown keys {sorted(unknown)}")
+            streams = [cls._build_stream(stream, populations, base_dir) for stream in phase_spec['streams']]
+            phases.append({
+                'name': phase_spec.get('name', f'phase-{number}'),
+                'duration': float(phase_spec['duration']),
+                'streams': streams,
+            })
+        return cls(spec.get('name', default_name), phases, spec.get('loop', False),
+                   spec.get('arrivals', ARRIVALS))
+
+    @classmethod
+    def default_mix(cls, rate, profiles, shares=None):
+        """generate_event_batch()'s traffic mix as one endless phase, so each class can follow a rate profile.
+
+        `shares` overrides the relative weight of each class (default: DEFAULT_MIX_SHARES).
+        """
+        # Full pools: in a shard worker the streams are sharded again from them (TrafficStream.shard())
+        pools = {'attacker': ATTACKER_POOL.unsharded, 'legitimate': LEGITIMATE_POOL.unsharded,
+                 'corporate': CORPORATE_POOL.unsharded}
+        shares = shares or DEFAULT_MIX_SHARES
+        total = sum(share for traffic_class, share in shares.items() if pools[traffic_class])
+        streams = []
+        for traffic_class, share in shares.items():
+            if not pools[traffic_class] or not share:
+                continue
+            defaults = TRAFFIC_CLASSES[traffic_class]
+            streams.append(TrafficStream(
+                traffic_class, _ramp(rate * share / total), pools[traffic_class], defaults['usernames'],
+                defaults['success_rate'], defaults['reasons'], profile=profiles.get(traffic_class)))
+        return cls('default-mix', [{'name': None, 'duration': math.inf, 'streams': streams}])
+
+    @staticmethod
+    def _build_stream(spec, populations, base_dir=''):
+        unknown = set(spec) - STREAM_KEYS
+        if unknown:
+            raise ValueError(f"Stream: unknown keys {sorted(unknown)}")
+        traffic_class = spec['class']
+        if traffic_class not in TRAFFIC_CLASSES:
+            raise ValueError(f"Stream: unknown class '{traffic_class}' (expected one of {sorted(TRAFFIC_CLASSES)})")
+        defaults = TRAFFIC_CLASSES[traffic_class]
+
+        population = spec.get('population')
+        if population is None:
+            pool = {'attacker': ATTACKER_POOL, 'legitimate': LEGITIMATE_POOL, 'corporate': CORPORATE_POOL}[traffic_class]
+        else:
+            # Identical population specs share one table, e.g. across phases
+            key = json.dumps(population, sort_keys=True)
+            if key not in populations:
+                if 'ips' in population:
+                    populations[key] = IPPopulation.from_strings(population['ips'], population.get('skew', 0.0))
+                elif 'density' in population or ':' in population['networks']:
+                    populations[key] = CidrPopulation(
+                        population['networks'], population.get('size', 0), population.get('density', 0.0),
+                        population.get('skew', IP_SKEW), population.get('seed', POPULATION_SEED))
+                else:
+                    populations[key] = IPPopulation.synthetic(
+                        population['size'], population['networks'],
+                        population.get('skew', IP_SKEW), population.get('seed', POPULATION_SEED))
+            pool = populations[key]
+
+        usernames = spec.get('usernames', defaults['usernames'])
+        if isinstance(usernames, str):  # a username file, shared between streams like populations
+            path = os.path.join(base_dir, usernames)
+            if path not in populations:
+                populations[path] = UsernameList.load(path)
+            usernames = populations[path]
+
+        ip_order = spec.get('ip_order', 'random')
+        if ip_order not in ('random', 'round_robin'):
+            raise ValueError(f"Stream: unknown ip_order '{ip_order}' (expected 'random' or 'round_robin')")
+        return TrafficStream(
+            traffic_class, _ramp(spec['rate']), pool,
+            usernames,
+            float(spec.get('success_rate', defaults['success_rate'])),
+            spec.get('reasons', defaults['reasons']),
+            _ramp(spec.get('active', 1.0)), ip_order,
+            build_profile(spec['profile'], base_dir) if 'profile' in spec else None)
+
+    def _locate(self, elapsed):
+        """Return (phase, progress within phase) for `elapsed` seconds since start."""
+        if self.loop and self.total_duration > 0:
+            elapsed %= self.total_duration
+        for phase in self.phases:
+            if elapsed < phase['duration']:
+                return phase, elapsed / phase['duration']
+            elapsed -= phase['duration']
+        return self.phases[-1], 1.0
+
+    def rate(self, elapsed):
+        """Total rate at `elapsed` seconds; also selects the streams for events()."""
+        phase, progress = self._locate(elapsed)
+        self.phase = phase['name']
+        self._streams = phase['streams']
+        epoch = self.origin + elapsed
+        total = 0.0
+        self._cum_weights = []
+        for stream in self._streams:
+            total += max(0.0, stream.prepare(progress, elapsed, epoch))
+            self._cum_weights.append(total)
+        return total
+
+    def events(self, count):
+        if not count or not self._cum_weights or self._cum_weights[-1] <= 0:
+            self.classes = []
+            return []
+        chosen = random.choices(self._streams, cum_weights=self._cum_weights, k=count)
+        self.classes = [stream.traffic_class for stream in chosen]
+        return [stream.event() for stream in chosen]
+
+    def shard(self, index, shards):
+        phases = [dict(phase, streams=[stream.shard(index, shards) for stream in phase['streams']])
+                  for phase in self.phases]
+        scenario = Scenario(self.name, phases, self.loop, self.arrivals)
+        scenario.origin = self.origin
+        return scenario
+
+def class_profiles():
+    """Rate profiles for the default mix from ATTACKER_PROFILE, LEGITIMATE_PROFILE and CORPORATE_PROFILE."""
+    specs = {'attacker': ATTACKER_PROFILE, 'legitimate': LEGITIMATE_PROFILE, 'corporate': CORPORATE_PROFILE}
+    return {traffic_class: build_profile(json.loads(spec)) for traffic_class, spec in specs.items() if spec}
+
+def make_source(settings=None):
+    """Traffic source for control `settings` (default: SCENARIO_FILE, else the fixed batch mix at TARGET_RATE)."""
+    settings = settings or initial_settings()
+    scenario = settings['scenario']
+    if isinstance(scenario, str):
+        return Scenario.load(scenario)
+    if scenario is not None:
+        return Scenario.from_spec(scenario, default_name='inline')
+    profiles = class_profiles()
+    if profiles or settings['mix']:
+        return Scenario.default_mix(settings['rate'], profiles, settings['mix'])
+    return BatchSource(settings['rate'])
+
+def initial_settings():
+    """Traffic settings from the environment, as changed at runtime through /control."""
+    return {'rate': TARGET_RATE, 'mix': None, 'scenario': SCENARIO_FILE, 'tenants': None}
+
+class TokenBucket:
+    """Drift-free token bucket scheduler.
+
+    Tokens accrue from absolute monotonic clock readings rather than from
+    sleep durations, so oversleeping never loses events. The capacity only
+    bounds how far the generator may catch up after a stall.
+
+    With 'poisson' arrivals each event costs an exponentially distributed
+    number of tokens (mean 1) instead of exactly one, which turns the
+    evenly paced stream into a Poisson process at the current rate.
+
+    `lag` is how late the oldest event of the last take() is against its
+    intended emit time; `missed` counts events given up on because the
+    generator fell more than the capacity behind. Tokens are never clipped
+    below the pending event's cost, so a draw larger than the capacity (at
+    low rates) delays that event instead of stalling the stream.
+    """
+
+    def __init__(self, rate, burst_seconds=BURST_SECONDS, clock=time.monotonic, arrivals='uniform'):
+        self.clock = clock
+        self.burst_seconds = burst_seconds
+        self.rate = rate
+        self.capacity = self._capacity(rate)
+        self.tokens = 0.0
+        self.last = clock()
+        self.poisson = arrivals == 'poisson'
+        self.cost = random.expovariate(1.0) if self.poisson else 1.0
+        self.lag = 0.0
+        self.missed = 0.0
+
+    def _capacity(self, rate):
+        # Always hold at least one tick's worth so high rates are not clipped
+        return max(1.0, rate * self.burst_seconds, rate * SCHEDULER_TICK)
+
+    def _refill(self):
+        now = self.clock()
+        tokens = self.tokens + (now - self.last) * self.rate
+        limit = max(self.capacity, self.cost)
+        if tokens > limit:
+            self.missed += tokens - limit
+            tokens = limit
+        self.tokens = tokens
+        self.last = now
+
+    def set_rate(self, rate):
+        """Change the refill rate, keeping the tokens already earned."""
+        self._refill()
+        self.rate = rate
+        self.capacity = self._capacity(rate)
+
+    def take(self):
+        """Return the number of whole events due now and consume them."""
+        self._refill()
+        # The oldest due event became due when the tokens reached its cost
+        self.lag = (self.tokens - self.cost) / self.rate if self.tokens >= self.cost and self.rate > 0 else 0.0
+        if not self.poisson:
+            due = int(self.tokens)
+            self.tokens -= due
+            return due
+        due = 0
+        while self.tokens >= self.cost:
+            self.tokens -= self.cost
+            self.cost = random.expovariate(1.0)
+            due += 1
+        return due
+
+    def time_until_next(self):
+        """Seconds until the next event is due."""
+        if self.tokens >= self.cost:
+            return 0.0
+        if self.rate <= 0:
+            return SCHEDULER_TICK
+        return (self.cost - self.tokens) / self.rate
+
+SHED_POLICIES = ('block', 'drop_legit', 'sample')
+
+class LoadShedder:
+    """Sheds load by SHED_POLICY once the generator is more than `max_lag` seconds behind schedule.
+
+    'block' never sheds: emission waits on slow sinks and the delay shows up
+    as schedule lag and, past BURST_SECONDS, missed events. 'drop_legit'
+    drops legitimate and corporate events while behind, so attack traffic
+    keeps its timing. 'sample' keeps a random fraction of all events that
+    halves every tick the lag persists and recovers by 10% a tick after.
+    """
+
+    def __init__(self, policy=SHED_POLICY, max_lag=SHED_LAG):
+        if policy not in SHED_POLICIES:
+            raise ValueError(f"Unknown SHED_POLICY '{policy}' (expected one of {SHED_POLICIES})")
+        self.policy = policy
+        self.max_lag = max_lag
+        self.keep = 1.0
+        self.shed = 0
+
+    def apply(self, events, classes, lag):
+        """Return (events, classes) to emit out of those due, given the current schedule lag."""
+        if self.policy == 'block':
+            return events, classes
+        behind = lag > self.max_lag
+        if self.policy == 'drop_legit':
+            if not behind:
+                return events, classes
+            kept = [(event, traffic_class) for event, traffic_class in zip(events, classes)
+                    if traffic_class == 'attacker']
+        else:
+            self.keep = max(0.01, self.keep / 2) if behind else min(1.0, self.keep * 1.1)
+            if self.keep >= 1.0:
+                return events, classes
+            keep, rand = self.keep, random.random
+            kept = [pair for pair in zip(events, classes) if rand() < keep]
+        self.shed += len(events) - len(kept)
+        return [event for event, _ in kept], [traffic_class for _, traffic_class in kept]
+
+class BatchWriter:
+    """Batches output lines into large writes on a binary stream.
+
+    Lines are flushed once FLUSH_BYTES are buffered or the oldest buffered
+    line is FLUSH_INTERVAL seconds old, whichever comes first. A writer
+    flushed off the generation loop's thread collects its write sizes in
+    `sizes` instead of `metrics`, for the loop to record (see AsyncFanout).
+    """
+
+    def __init__(self, stream, flush_bytes=FLUSH_BYTES, flush_interval=FLUSH_INTERVAL, clock=time.monotonic,
+                 metrics=None, sizes=None):
+        self.stream = stream
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.chunks = []
+        self.size = 0
+        self.deadline = None
+        self.writes = 0
+        self.blocked_seconds = 0.0  # time spent in the stream's write() and flush()
+        self.metrics = metrics  # records write sizes and time blocked in write()
+        self.sizes = sizes  # deque of write sizes
+
+    def write(self, line):
+        if not self.chunks:
+            self.deadline = self.clock() + self.flush_interval
+        self.chunks.append(line)
+        self.size += len(line)
+        if self.size >= self.flush_bytes:
+            self.flush()
+
+    def time_until_due(self):
+        """Seconds until the buffered lines must be flushed (inf when empty)."""
+        if not self.chunks:
+            return float('inf')
+        return max(0.0, self.deadline - self.clock())
+
+    def flush_if_due(self):
+        if self.chunks and self.clock() >= self.deadline:
+            self.flush()
+
+    def flush(self):
+        if not self.chunks:
+            return
+        data = memoryview(b''.join(self.chunks))
+        size = self.size
+        self.chunks = []
+        self.size = 0
+        self.deadline = None
+        started = time.perf_counter()
+        # Unbuffered streams (python -u) may accept only part of a large write
+        while data:
+            written = self.stream.write(data)
+            data = data[written:]
+        self.stream.flush()
+        self.writes += 1
+        blocked = time.perf_counter() - started
+        self.blocked_seconds += blocked
+        if self.metrics is not None:
+            self.metrics.add('write_blocked_seconds', blocked)
+            self.metrics.observe('write_bytes', size)
+        if self.sizes is not None:
+            self.sizes.append(size)
+
+    def close(self):
+        self.flush()
+
+def log_record(writer, level, message, **fields):
+    """Write a generator status record as a JSON line."""
+    record = {
+        'timestamp': timestamps.now(),
+        'level': level,
+        'service': 'auth-log-generator',
+        'message': message,
+    }
+    record.update(fields)
+    writer.write((json.dumps(record) + '\n').encode('ascii'))
+
+def _handle_sigterm(signum, frame):
+    # Unwind through main()'s finally block so buffered events are flushed
+    raise SystemExit(0)
+
+SINK_POLICIES = ('block', 'drop')
+
+class StreamTarget:
+    """An already open binary stream, e.g. stdout.
+
+    Writes are serialized, so status records and the stdout sink's delivery
+    thread can share stdout without interleaving partial writes.
+    """
+
+    def __init__(self, stream, description='stdout'):
+        self.stream = stream
+        self.description = description
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        # Unbuffered streams (python -u) may accept only part of a large write
+        data = memoryview(data)
+        size = len(data)
+        with self.lock:
+            while data:
+                written = self.stream.write(data)
+                data = data[written:]
+            self.stream.flush()
+        return size
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class RotatingFileTarget:
+    """Local file rotated at `max_bytes`, keeping `backups` old files, optionally gzip-compressed.
+
+    Compression is streaming: each write goes through one gzip member per
+    file, so a compressed file is valid once it has been closed. Rotated
+    files are renamed to <name>.1, <name>.2, ... (<stem>.1.gz, ... when the
+    name ends in .gz). `max_bytes` counts uncompressed bytes; 0 disables
+    rotation.
+    """
+
+    def __init__(self, path, max_bytes=0, backups=5, compress='none', level=1):
+        if compress not in ('gzip', 'none'):
+            raise ValueError(f"Unknown file compression '{compress}' (expected 'gzip' or 'none')")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        self.level = level
+        self.description = f'file:{path}'
+        self.file = None
+        self.size = 0
+
+    def _open(self):
+        if self.compress == 'gzip':
+            self.file = gzip.open(self.path, 'ab', compresslevel=self.level)
+        else:
+            self.file = open(self.path, 'ab')
+        self.size = 0
+
+    def _rotated(self, number):
+        if self.path.endswith('.gz'):
+            return f'{self.path[:-3]}.{number}.gz'
+        return f'{self.path}.{number}'
+
+    def _rotate(self):
+        self.file.close()
+        self.file = None
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for number in range(self.backups - 1, 0, -1):
+            if os.path.exists(self._rotated(number)):
+                os.replace(self._rotated(number), self._rotated(number + 1))
+        os.replace(self.path, self._rotated(1))
+
+    def write(self, data):
+        if self.file is None:
+            self._open()
+        self.file.write(data)
+        self.size += len(data)
+        if self.compress == 'none':
+            self.file.flush()
+        if self.max_bytes and self.size >= self.max_bytes:
+            self._rotate()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class FifoTarget:
+    """Named pipe, created if missing; reopened (waiting for a reader) when the reader goes away."""
+
+    def __init__(self, path):
+        self.path = path
+        self.description = f'pipe:{path}'
+        self.fd = None
+
+    def write(self, data):
+        if self.fd is None:
+            if not os.path.exists(self.path):
+                os.mkfifo(self.path)
+            elif not stat.S_ISFIFO(os.stat(self.path).st_mode):
+                raise ValueError(f'{self.path} exists and is not a named pipe')
+            self.fd = os.open(self.path, os.O_WRONLY)  # blocks in the sink thread until a reader opens it
+        data = memoryview(data)
         try:
-            iteration += 1
-            events = generate_log_batch()
+            while data:
+                data = data[os.write(self.fd, data):]
+        except BrokenPipeError:
+            os.close(self.fd)
+            self.fd = None
+            raise
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
 
-            # Output each event as a JSON line
+class SyslogTarget:
+    """Syslog collector over UDP (one message per datagram) or TCP (RFC 6587 octet counting).
+
+    SyslogSink frames the messages; this target only ships them. A TCP
+    connection that fails is re-established on the next write.
+    """
+
+    def __init__(self, host, port, protocol='udp'):
+        if protocol not in ('udp', 'tcp'):
+            raise ValueError(f"Unknown syslog protocol '{protocol}' (expected 'udp' or 'tcp')")
+        self.address = (host, port)
+        self.protocol = protocol
+        self.description = f'syslog+{protocol}://{host}:{port}'
+        self.sock = None
+
+    def write(self, data):
+        if self.protocol == 'udp':
+            if self.sock is None:
+                self.sock = socket.socket(socket.AF_INET6 if ':' in self.address[0] else socket.AF_INET,
+                                          socket.SOCK_DGRAM)
+            sendto, address = self.sock.sendto, self.address
+            for message in bytes(data).split(b'\n')[:-1]:
+                sendto(message, address)
+            return
+        if self.sock is None:
+            self.sock = socket.create_connection(self.address, timeout=10)
+        try:
+            self.sock.sendall(data)
+        except OSError:
+            self.sock.close()
+            self.sock = None
+            raise
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+class LineSink:
+    """Writes events as lines through a BatchWriter (stdout for Alloy, or a file or named pipe).
+
+    `output_format` 'json' writes the full event schema; 'ztac' writes the
+    body ZTAC ingests, for use with the lean config/alloy/config-ztac-native.alloy.
+    An `owned` writer belongs to this sink alone: the sink flushes and
+    closes it together with its stream.
+    """
+
+    def __init__(self, writer, output_format=OUTPUT_FORMAT, provider=None, owned=False):
+        if output_format not in LINE_ENCODERS:
+            raise ValueError(f"Unknown OUTPUT_FORMAT '{output_format}' (expected one of {sorted(LINE_ENCODERS)})")
+        self.writer = writer
+        self.output_format = output_format
+        self.encode = LINE_ENCODERS[output_format]
+        self.provider = provider  # timestamp source other than the shared one, e.g. for backfill
+        self.owned = owned
+
+    def emit(self, events):
+        write = self.writer.write
+        encode = self.encode
+        if self.provider is None:
+            for event in events:
+                write(encode(*event))
+        else:
+            now = self.provider.now
+            for event in events:
+                write(encode(*event, timestamp=now()))
+
+    def encode_lines(self, events):
+        """Return (timestamps, lines) for events, so several sinks can share one encoding."""
+        now = (self.provider or timestamps).now
+        encode = self.encode
+        stamps = []
+        lines = []
+        for event in events:
+            stamp = now()
+            stamps.append(stamp)
+            lines.append(encode(*event, timestamp=stamp))
+        return stamps, lines
+
+    def write_lines(self, events, stamps, lines):
+        write = self.writer.write
+        for line in lines:
+            write(line)
+
+    def close(self):
+        if self.owned:
+            self.writer.close()
+            self.writer.stream.close()
+
+class SyslogSink(LineSink):
+    """Sends events as RFC 5424 syslog messages (facility authpriv) through a SyslogTarget.
+
+    The message is the same line as stdout (`output_format`) and the header
+    carries the event's own timestamp, with severity INFO for successes and
+    WARNING for failures. Over TCP every message is prefixed with its length
+    (octet counting); over UDP messages stay newline-terminated so the
+    target can send one datagram per line.
+    """
+
+    FACILITY = 10  # authpriv
+
+    def __init__(self, writer, protocol, output_format=OUTPUT_FORMAT, provider=None):
+        super().__init__(writer, output_format, provider, owned=True)
+        self.octet_counting = protocol == 'tcp'
+        self.prefixes = {success: b'<%d>1 ' % (self.FACILITY * 8 + (6 if success else 4)) for success in (False, True)}
+        self.suffix = b' %s auth-log-generator - - - ' % (socket.gethostname().encode('ascii', 'replace') or b'-')
+
+    def emit(self, events):
+        stamps, lines = self.encode_lines(events)
+        self.write_lines(events, stamps, lines)
+
+    def write_lines(self, events, stamps, lines):
+        write, prefixes, suffix = self.writer.write, self.prefixes, self.suffix
+        for event, stamp, line in zip(events, stamps, lines):
+            message = prefixes[bool(event[3])] + stamp.encode('ascii') + suffix + line
+            if self.octet_counting:
+                write(b'%d %s' % (len(message) - 1, message[:-1]))
+            else:
+                write(message)
+
+def _pb_varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _pb_field(number, payload):
+    """Length-delimited protobuf field."""
+    return _pb_varint(number << 3 | 2) + _pb_varint(len(payload)) + payload
+
+def _pb_string_attribute(number, key, value):
+    # KeyValue{key, value: AnyValue{string_value}} as repeated field `number`
+    return _pb_field(number, _pb_field(1, key.encode()) + _pb_field(2, _pb_field(1, value.encode())))
+
+# LogRecord severity_number (2) and severity_text (3), matching the JSON level
+_OTLP_SEVERITY = {
+    True: b'\x10\x09' + _pb_field(3, b'INFO'),
+    False: b'\x10\x0d' + _pb_field(3, b'WARN'),
+}
+_pack_fixed64 = struct.Struct('<Q').pack
+
+class AsyncExporter:
+    """Shared plumbing for sinks that ship batches asynchronously (OTLP, Loki).
+
+    At most `concurrency` requests are in flight. Beyond that _track()
+    blocks under the 'block' policy, which is the sink's backpressure, or
+    drops the batch under 'drop'. Per-request latency and errors are
+    collected from completion callbacks and summarised by report().
+    """
+
+    def __init__(self, description, concurrency, policy='block'):
+        if policy not in SINK_POLICIES:
+            raise ValueError(f"Unknown sink policy '{policy}' (expected one of {SINK_POLICIES})")
+        self.description = description
+        self.policy = policy
+        self._inflight = threading.BoundedSemaphore(concurrency)
+        self._concurrency = concurrency
+        self._lock = threading.Lock()
+        self._latencies = []
+        self._errors = 0
+        self._last_error = None
+        self.records_exported = 0
+        self.records_dropped = 0
+        self.records_failed = 0
+        self.blocked_seconds = 0.0  # time spent waiting for a free request slot
+
+    def _track(self, start_request, count):
+        """Start a request for `count` records once a slot is free; start_request() returns a future."""
+        if not self._inflight.acquire(blocking=False):
+            if self.policy == 'drop':
+                self.records_dropped += count
+                return
+            started = time.perf_counter()
+            self._inflight.acquire()
+            self.blocked_seconds += time.perf_counter() - started
+        started = time.perf_counter()
+        future = start_request()
+        future.add_done_callback(lambda f: self._done(f, started, count))
+
+    def _describe_error(self, error):
+        return str(error)
+
+    def _done(self, future, started, count):
+        latency = time.perf_counter() - started
+        error = future.exception()
+        with self._lock:
+            self._latencies.append(latency)
+            if error is not None:
+                self._errors += 1
+                self.records_failed += count
+                self._last_error = self._describe_error(error)
+            else:
+                self.records_exported += count
+        self._inflight.release()
+
+    def report(self):
+        """Summarize per-batch latency since the last report."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            errors, last_error = self._errors, self._last_error
+            self._latencies = []
+            self._errors = 0
+        if not latencies:
+            return None
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        fields = {
+            'batches': len(latencies),
+            'errors': errors,
+            'latency_p50_ms': round(p50, 2),
+            'latency_p99_ms': round(p99, 2),
+            'latency_max_ms': round(latencies[-1] * 1000, 2),
+            'records_exported': self.records_exported,
+        }
+        if self.records_dropped:
+            fields['records_dropped'] = self.records_dropped
+        if self.records_failed:
+            fields['records_failed'] = self.records_failed
+        if last_error:
+            fields['last_error'] = last_error
+        message = (f'{self.description}: {len(latencies)} batches, '
+                   f'p50 {p50:.1f} ms, p99 {p99:.1f} ms, {errors} errors')
+        return message, fields
+
+    def _drain(self):
+        """Wait for in-flight requests by taking every slot."""
+        for _ in range(self._concurrency):
+            self._inflight.acquire()
+
+class OtlpExporter(AsyncExporter):
+    """Sends events straight to ZTAC as batched OTLP/gRPC log records.
+
+    Bypasses stdout, Kubernetes logging and Alloy so generator, Alloy and
+    ZTAC bottlenecks can be told apart. Records carry the ZTAC-native body
+    and the same X-Scope-OrgId / X-Real-IP headers Alloy sets. Requests are
+    protobuf-encoded by hand so only grpcio is required. A request is sent
+    once `batch_size` records are buffered or the oldest is
+    `flush_interval` seconds old. At most `concurrency` exports are in
+    flight; emit() blocks beyond that.
+    """
+
+    EXPORT_METHOD = '/opentelemetry.proto.collector.logs.v1.LogsService/Export'
+    COMPRESSION = {'gzip': 'Gzip', 'deflate': 'Deflate', 'none': 'NoCompression'}
+
+    def __init__(self, endpoint=OTLP_ENDPOINT, batch_size=OTLP_BATCH_SIZE, flush_interval=OTLP_FLUSH_INTERVAL,
+                 concurrency=OTLP_CONCURRENCY, compression=OTLP_COMPRESSION, clock=None, policy='block'):
+        if grpc is None:
+            raise RuntimeError("OUTPUT=otlp requires grpcio (pip install grpcio)")
+        if compression not in self.COMPRESSION:
+            raise ValueError(f"Unknown OTLP_COMPRESSION '{compression}' (expected one of {sorted(self.COMPRESSION)})")
+        super().__init__(f'OTLP export to {endpoint}', concurrency, policy)
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.clock = clock or timestamps.clock
+        self.channel = grpc.insecure_channel(
+            endpoint, compression=getattr(grpc.Compression, self.COMPRESSION[compression]))
+        self._export = self.channel.unary_unary(self.EXPORT_METHOD)  # raw bytes in and out
+        self.metadata = (('x-scope-orgid', PRIMARY_TENANT), ('x-real-ip', OTLP_REAL_IP))
+        self._resource = _pb_field(1, _pb_string_attribute(1, 'service.name', OTLP_SERVICE_NAME)
+                                   + _pb_string_attribute(1, 'service.namespace', 'default'))
+        self._scope = _pb_field(1, _pb_field(1, b'auth-log-generator'))
+        self._records = []
+        self._deadline = None
+
+    def emit(self, events):
+        now_ns = self.clock.now_ns
+        records = self._records
+        if not records and events:
+            self._deadline = time.monotonic() + self.flush_interval
+        for tenant, ip, username, success, reason in events:
+            body = encode_ztac_body(ip, username, success)
+            ns = _pack_fixed64(now_ns())
+            # time_unix_nano (1), severity (2, 3), body (5), observed_time_unix_nano (11)
+            record = (b'\x09' + ns + _OTLP_SEVERITY[bool(success)]
+                      + _pb_field(5, _pb_field(1, body)) + b'\x59' + ns)
+            records.append(_pb_field(2, record))
+            if len(records) >= self.batch_size:
+                self._submit()
+                records = self._records
+
+    def time_until_due(self):
+        if not self._records:
+            return float('inf')
+        return max(0.0, self._deadline - time.monotonic())
+
+    def flush_if_due(self):
+        if self._records and time.monotonic() >= self._deadline:
+            self._submit()
+
+    def _submit(self):
+        records = self._records
+        self._records = []
+        scope_logs = _pb_field(2, self._scope + b''.join(records))
+        request = _pb_field(1, self._resource + scope_logs)
+        self._track(lambda: self._export.future(request, metadata=self.metadata, timeout=OTLP_TIMEOUT), len(records))
+
+    def _describe_error(self, error):
+        return error.details() if isinstance(error, grpc.Call) else str(error)
+
+    def close(self):
+        if self._records:
+            self._submit()
+        self._drain()
+        self.channel.close()
+
+class LokiPusher(AsyncExporter):
+    """Pushes events to Loki's HTTP push API in batched, compressed streams.
+
+    Lines are grouped into one stream per (tenant, level) label pair and
+    carry the same body as stdout (OUTPUT_FORMAT), with a nanosecond
+    timestamp that matches the line's own. Batches are sent once
+    `batch_size` lines are buffered or the oldest is `flush_interval`
+    seconds old. Lets Loki's storage and query paths be load-tested
+    independently of the OTLP path to ZTAC.
+    """
+
+    def __init__(self, url=LOKI_URL, batch_size=LOKI_BATCH_SIZE, flush_interval=LOKI_FLUSH_INTERVAL,
+                 concurrency=LOKI_CONCURRENCY, compression=LOKI_COMPRESSION, output_format=OUTPUT_FORMAT,
+                 clock=None, policy='block'):
+        if compression not in ('gzip', 'none'):
+            raise ValueError(f"Unknown LOKI_COMPRESSION '{compression}' (expected 'gzip' or 'none')")
+        super().__init__(f'Loki push to {url}', concurrency, policy)
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.encode = LINE_ENCODERS[output_format]
+        # Lines are encoded on the sink's delivery thread: drawing from the shared random state
+        # would make seeded traffic depend on thread timing
+        self.rng = random.Random(random.getrandbits(64))
+        self.clock = clock or timestamps.clock
+        self.provider = TimestampProvider(self.clock)
+        self.headers = {'Content-Type': 'application/json'}
+        if compression == 'gzip':
+            self.headers['Content-Encoding'] = 'gzip'
+        if LOKI_TENANT_ID:
+            self.headers['X-Scope-OrgID'] = LOKI_TENANT_ID
+        self.pool = ThreadPoolExecutor(concurrency, thread_name_prefix='loki-push')
+        self._stream_labels = {}  # (tenant, success) -> rendered label set
+        self._streams = {}
+        self._count = 0
+        self._deadline = None
+
+    def _labels(self, tenant, success):
+        key = (tenant, success)
+        labels = self._stream_labels.get(key)
+        if labels is None:
+            labels = self._stream_labels[key] = (
+                b'{"job":"auth-log-generator","tenant":%s,"level":"%s"}'
+                % (_json_literal[tenant], b'INFO' if success else b'WARN'))
+        return labels
+
+    def emit(self, events):
+        if not events:
+            return
+        if not self._count:
+            self._deadline = time.monotonic() + self.flush_interval
+        now_ns, fmt, encode, rng = self.clock.now_ns, self.provider.format, self.encode, self.rng
+        streams = self._streams
+        for event in events:
+            ns = now_ns()
+            # Lines are ASCII JSON, so quoting one as a JSON string only needs \\ and " escaped
+            line = encode(*event, timestamp=fmt(ns), rng=rng)[:-1].replace(b'\\', b'\\\\').replace(b'"', b'\\"')
+            value = b'["%d","%s"]' % (ns, line)
+            labels = self._labels(event[0], event[3])
+            values = streams.get(labels)
+            if values is None:
+                streams[labels] = [value]
+            else:
+                values.append(value)
+            self._count += 1
+            if self._count >= self.batch_size:
+                self._submit()
+                streams = self._streams
+                self._deadline = time.monotonic() + self.flush_interval
+
+    def time_until_due(self):
+        if not self._count:
+            return float('inf')
+        return max(0.0, self._deadline - time.monotonic())
+
+    def flush_if_due(self):
+        if self._count and time.monotonic() >= self._deadline:
+            self._submit()
+
+    def _submit(self):
+        streams, count = self._streams, self._count
+        self._streams = {}
+        self._count = 0
+        body = b'{"streams":[%s]}' % b','.join(
+            b'{"stream":%s,"values":[%s]}' % (labels, b','.join(values)) for labels, values in streams.items())
+        if self.compression == 'gzip':
+            body = gzip.compress(body, compresslevel=1)
+        self._track(lambda: self.pool.submit(self._push, body), count)
+
+    def _push(self, body):
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method='POST')
+        with urllib.request.urlopen(request, timeout=LOKI_TIMEOUT) as response:
+            response.read()
+
+    def _describe_error(self, error):
+        if isinstance(error, urllib.error.HTTPError):
+            return f'HTTP {error.code}: {error.read(200).decode("utf-8", "replace").strip()}'
+        return str(error)
+
+    def close(self):
+        if self._count:
+            self._submit()
+        self._drain()
+        self.pool.shutdown()
+
+class DeliveryStream:
+    """Binary stream that writes straight to a sink's target, counting lines lost to its errors.
+
+    Queueing and the full-queue policy live in the sink's SinkChannel, and
+    writes already run on the sink's delivery thread, so a failing
+    destination only loses the lines of the write that failed.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.lock = threading.Lock()
+        self.failed_lines = 0
+        self.last_error = None
+
+    def write(self, data):
+        try:
+            self.target.write(data)
+        except Exception as e:  # a failing destination loses its lines, not the generator
+            with self.lock:
+                self.failed_lines += bytes(data).count(b'\n')
+                self.last_error = f'{type(e).__name__}: {e}'
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.target.close()
+
+    def failures(self):
+        """Return (lines lost so far, last error since the previous call)."""
+        with self.lock:
+            last_error, self.last_error = self.last_error, None
+            return self.failed_lines, last_error
+
+class _SinkThread:
+    """Daemon thread running one sink's blocking calls in order; the executor for its delivery task.
+
+    Unlike ThreadPoolExecutor's workers it does not hold up interpreter
+    exit when a destination is stuck, e.g. a named pipe without a reader.
+    """
+
+    def __init__(self, name):
+        self.calls = queue.SimpleQueue()
+        threading.Thread(target=self._run, name=name, daemon=True).start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.calls.put((future, fn, args))
+        return future
+
+    def _run(self):
+        while True:
+            future, fn, args = self.calls.get()
+            if future is None:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def shutdown(self):
+        self.calls.put((None, None, None))
+
+class SinkChannel:
+    """One sink's bounded delivery queue, batching and error accounting inside an AsyncFanout.
+
+    The generator offers items: a tick's shared (events, timestamps, lines)
+    encoding for line sinks, (events, tick) for OTLP and Loki, which encode
+    on their own thread. At most `size` items wait. A full queue blocks the
+    generator under the 'block' policy and discards the item under 'drop'.
+    The sink itself is only touched on the channel's thread; with `clock`
+    (backfill) the channel positions the sink's own SteppedClock at each
+    item's tick before the sink reads it.
+    """
+
+    def __init__(self, sink, label, index, size=SINK_QUEUE, policy=SINK_POLICY, clock=None):
+        if policy not in SINK_POLICIES:
+            raise ValueError(f"Unknown sink policy '{policy}' (expected one of {SINK_POLICIES})")
+        self.sink = sink
+        self.label = label
+        self.index = index  # position in GeneratorMetrics' sink series
+        self.policy = policy
+        self.clock = clock
+        self.lines = isinstance(sink, LineSink)
+        self.items = collections.deque()
+        self.slots = threading.BoundedSemaphore(size)
+        self.ready = asyncio.Event()  # set by the generator after each offer; bound to the loop on first use
+        self.closing = False
+        self.thread = _SinkThread(f'sink-{label}')
+        # Line sinks batch in their BatchWriter, exporters in themselves
+        self.batches = sink.writer if self.lines else sink
+        self.stream = getattr(self.batches, 'stream', None)
+        self.lock = threading.Lock()  # guards the failure counters the channel's thread updates
+        self.failed_lines = 0
+        self._last_error = None
+        self.dropped_lines = 0  # generator thread only
+        self.blocked_seconds = 0.0  # generator time spent waiting for queue space
+        self.offered_lines = 0  # generator thread only
+        self.handled_lines = 0  # channel thread only
+        self.finished = False  # set once finish() has closed the sink
+        self._reported = (0, 0)
+
+    def offer(self, item, count):
+        """Queue `item` (`count` events); returns False when the 'drop' policy discarded it."""
+        if not self.slots.acquire(blocking=False):
+            if self.policy == 'drop':
+                self.dropped_lines += count
+                return False
+            started = time.perf_counter()
+            self.slots.acquire()
+            self.blocked_seconds += time.perf_counter() - started
+        self.items.append(item)
+        self.offered_lines += count
+        return True
+
+    def take(self):
+        """Dequeue everything offered so far, freeing its queue slots."""
+        batch = []
+        while self.items:
+            batch.append(self.items.popleft())
+            self.slots.release()
+        return batch
+
+    def _failed(self, error, lines=0):
+        with self.lock:
+            self.failed_lines += lines
+            self._last_error = f'{type(error).__name__}: {error}'
+
+    def deliver(self, batch):
+        """Hand items to the sink and flush what is due; returns seconds until the next flush is due."""
+        sink = self.sink
+        for item in batch:
+            try:
+                if self.lines:
+                    sink.write_lines(*item)
+                else:
+                    events, tick = item
+                    if tick is not None:
+                        self.clock.set(*tick)
+                    sink.emit(events)
+            except Exception as e:
+                self._failed(e, len(item[0]))
+            self.handled_lines += len(item[0])
+        try:
+            self.batches.flush_if_due()
+        except Exception as e:
+            self._failed(e)
+        return self.batches.time_until_due()
+
+    def finish(self):
+        """Flush the sink's last batch and close it."""
+        try:
+            if self.lines and not self.sink.owned:
+                self.sink.writer.flush()  # stdout: the stream is shared and closed by main()
+            self.sink.close()
+        except Exception as e:
+            self._failed(e)
+        self.finished = True
+
+    def report(self):
+        """Summarize lines dropped or lost to errors since the last report."""
+        with self.lock:
+            failed = self.failed_lines
+            last_error, self._last_error = self._last_error, None
+        if isinstance(self.stream, DeliveryStream):
+            stream_failed, stream_error = self.stream.failures()
+            failed += stream_failed
+            last_error = last_error or stream_error
+        new_dropped, new_failed = self.dropped_lines - self._reported[0], failed - self._reported[1]
+        self._reported = (self.dropped_lines, failed)
+        if not new_dropped and not new_failed:
+            return None
+        fields = {'sink': self.label, 'dropped_lines': new_dropped, 'failed_lines': new_failed,
+                  'queue_depth': len(self.items)}
+        if last_error:
+            fields['last_error'] = last_error
+        return f'Sink {self.label}: {new_dropped} lines dropped, {new_failed} lost to errors', fields
+
+    def totals(self):
+        """Return (dropped, failed, abandoned) lines over the whole run.
+
+        Exporters' dropped and failed requests count here too. Abandoned
+        lines were still queued when close() gave up on the sink; what it
+        was writing at that moment may be lost as well.
+        """
+        with self.lock:
+            failed = self.failed_lines
+        if isinstance(self.stream, DeliveryStream):
+            with self.stream.lock:
+                failed += self.stream.failed_lines
+        dropped = self.dropped_lines
+        if not self.lines:
+            dropped += self.sink.records_dropped
+            failed += self.sink.records_failed
+        return dropped, failed, self.offered_lines - self.handled_lines
+
+class AsyncFanout:
+    """The emit stage: fans every batch out to the sinks, each delivered by its own asyncio task.
+
+    Line sinks with the same output format share one encoding (one
+    timestamp and user agent per event), done on the generator, so every
+    destination sees the same stream; with a SteppedClock (backfill) the
+    clock is rewound for each encoding so timestamps stay in step. emit()
+    then only offers the result to every sink's SinkChannel. The tasks run
+    on an event loop thread: each takes what is queued, hands it to its
+    sink on the channel's thread (file, pipe and socket writes block) and
+    flushes the sink's batch on its own FLUSH_BYTES and FLUSH_INTERVAL
+    timer, so generation never waits on delivery and a stalled destination
+    only fills its own queue. Queue depth and dropped lines per sink go to
+    `metrics`, as do the stdout sink's write sizes, which emit() records on
+    the generator's thread (GeneratorMetrics is not locked). `writes` and
+    `blocked_seconds` include the stdout sink's writes, so the rate report
+    shows stdout backpressure.
+    """
+
+    def __init__(self, channels, clock=None, metrics=None):
+        self.channels = channels
+        self.metrics = metrics
+        self.clock = clock
+        self.stdout = next((channel.batches for channel in channels if channel.label == 'stdout'), None)
+        groups = {}
+        for channel in channels:
+            if channel.lines:
+                groups.setdefault(channel.sink.output_format, []).append(channel)
+        self.line_groups = list(groups.values())
+        self.others = [channel for channel in channels if not channel.lines]
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._serve, name='sink-fanout', daemon=True)
+        self._thread.start()
+        self._done = asyncio.run_coroutine_threadsafe(self._run(), self.loop)
+
+    def _serve(self):
+        loop = self.loop
+        loop.run_forever()
+        # close() gave up on stuck sinks: cancel their tasks (their threads stay blocked) and close the loop
+        tasks = asyncio.all_tasks(loop)
+        if tasks:
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
+
+    async def _run(self):
+        await asyncio.gather(*(self._deliver(channel) for channel in self.channels))
+
+    async def _deliver(self, channel):
+        loop = asyncio.get_running_loop()
+        due = math.inf
+        while True:
+            if not channel.items:
+                if channel.closing:
+                    break
+                channel.ready.clear()
+                if not channel.items and not channel.closing:
+                    try:
+                        await asyncio.wait_for(channel.ready.wait(), None if due == math.inf else due)
+                    except asyncio.TimeoutError:
+                        pass  # the sink's batch is due
+            due = await loop.run_in_executor(channel.thread, channel.deliver, channel.take())
+        await loop.run_in_executor(channel.thread, channel.finish)
+
+    def _offer(self, channel, item, count):
+        if channel.offer(item, count):
+            self.loop.call_soon_threadsafe(channel.ready.set)
+        elif self.metrics is not None:
+            self.metrics.add(f'sink_dropped_lines:{channel.index}', count)
+
+    def emit(self, events):
+        if not events:
+            return
+        clock = self.clock
+        tick = (clock.start_ns, clock.step_ns) if clock is not None else None
+        for number, group in enumerate(self.line_groups):
+            if number and clock is not None:
+                clock.rewind()
+            item = (events,) + group[0].sink.encode_lines(events)
+            for channel in group:
+                self._offer(channel, item, len(events))
+        for channel in self.others:
+            self._offer(channel, (events, tick), len(events))
+        if self.metrics is not None:
+            for channel in self.channels:
+                self.metrics.set(f'sink_queue_depth:{channel.index}', len(channel.items))
+            self._record_writes()
+
+    def _record_writes(self):
+        sizes = self.stdout.sizes if self.stdout is not None else None
+        while sizes:
+            self.metrics.observe('write_bytes', sizes.popleft())
+
+    @property
+    def writes(self):
+        """Batches the stdout sink has written."""
+        return self.stdout.writes if self.stdout is not None else 0
+
+    @property
+    def blocked_seconds(self):
+        """Generator time spent waiting for queue space, plus the stdout sink's time blocked in write()."""
+        blocked = sum(channel.blocked_seconds for channel in self.channels)
+        return blocked + self.stdout.blocked_seconds if self.stdout is not None else blocked
+
+    def time_until_due(self):
+        return float('inf')  # every task keeps its own flush timer
+
+    def flush_if_due(self):
+        pass
+
+    def report(self):
+        reports = []
+        for channel in self.channels:
+            reports.append(channel.report())
+            if not channel.lines:
+                reports.append(channel.sink.report())  # export latency and errors
+        reports = [report for report in reports if report]
+        if len(reports) <= 1:
+            return reports[0] if reports else None
+        return '; '.join(message for message, _ in reports), {'sinks': [fields for _, fields in reports]}
+
+    def summary(self):
+        """Return (message, fields) for the sinks that lost lines over the whole run, or None."""
+        lost = []
+        for channel in self.channels:
+            dropped, failed, abandoned = channel.totals()
+            if dropped or failed or not channel.finished:
+                message = f'Sink {channel.label}: {dropped} lines dropped, {failed} lost to errors'
+                if not channel.finished:
+                    message += f', still delivering at shutdown with {abandoned} lines queued'
+                lost.append((message, {'sink': channel.label, 'dropped_lines': dropped, 'failed_lines': failed,
+                                       'closed': channel.finished, 'abandoned_lines': abandoned}))
+        if not lost:
+            return None
+        return '; '.join(message for message, _ in lost), {'sinks': [fields for _, fields in lost]}
+
+    def close(self, timeout=5):
+        """Deliver what is queued and close every sink, waiting at most `timeout` seconds for stuck destinations.
+
+        Lines a stuck sink leaves behind are counted by summary().
+        """
+        for channel in self.channels:
+            channel.closing = True
+            self.loop.call_soon_threadsafe(channel.ready.set)
+        try:
+            self._done.result(timeout)
+        except FutureTimeoutError:
+            pass  # stuck sinks are reported by summary()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        for channel in self.channels:
+            channel.thread.shutdown()
+        if self.metrics is not None:
+            self._record_writes()
+
+SINK_OPTIONS = {
+    'stdout': {'format', 'queue', 'policy'},
+    'file': {'format', 'queue', 'policy', 'max_bytes', 'backups', 'compress', 'level'},
+    'pipe': {'format', 'queue', 'policy'},
+    'syslog': {'format', 'queue', 'policy'},
+    'otlp': {'queue', 'policy', 'batch', 'flush', 'concurrency'},
+    'loki': {'format', 'queue', 'policy', 'batch', 'flush', 'concurrency'},
+}
+
+def parse_sinks(value=None):
+    """Parse a comma-separated list of sink URIs (default: SINKS, else OUTPUT) into (kind, target, options).
+
+    Forms: stdout, file:PATH, pipe:PATH, syslog[+udp|+tcp]://HOST[:PORT],
+    otlp[://HOST:PORT] and loki[+http|+https://HOST[:PORT]/PATH], each with
+    optional ?key=value options (see SINK_OPTIONS and README.md).
+    """
+    specs = []
+    for uri in (value or SINKS or OUTPUT).split(','):
+        uri = uri.strip()
+        if not uri:
+            continue
+        parts = urllib.parse.urlsplit(uri)
+        kind, _, transport = (parts.scheme or parts.path).partition('+')
+        if kind not in SINK_OPTIONS:
+            raise ValueError(f"Unknown sink '{uri}' (expected one of {sorted(SINK_OPTIONS)})")
+        options = dict(urllib.parse.parse_qsl(parts.query))
+        unknown = set(options) - SINK_OPTIONS[kind]
+        if unknown:
+            raise ValueError(f"Sink '{uri}': unknown options {sorted(unknown)}")
+        if options.get('policy', SINK_POLICY) not in SINK_POLICIES:
+            raise ValueError(f"Sink '{uri}': unknown policy (expected one of {SINK_POLICIES})")
+        if kind in ('file', 'pipe'):
+            target = parts.netloc + parts.path
+            if not target:
+                raise ValueError(f"Sink '{uri}': missing path")
+        elif kind == 'syslog':
+            if transport not in ('', 'udp', 'tcp') or not parts.hostname:
+                raise ValueError(f"Sink '{uri}': expected syslog+udp://HOST[:PORT] or syslog+tcp://HOST[:PORT]")
+            target = (transport or 'udp', parts.hostname, parts.port or 514)
+        elif kind == 'otlp':
+            target = parts.netloc or OTLP_ENDPOINT
+        elif kind == 'loki':
+            target = urllib.parse.urlunsplit((transport or 'http', parts.netloc, parts.path, '', '')) \
+                if parts.netloc else LOKI_URL
+        else:
+            target = None
+        specs.append((kind, target, options))
+    if [kind for kind, _, _ in specs].count('stdout') > 1:
+        raise ValueError('Only one stdout sink is supported')
+    return specs
+
+def describe_sink(kind, target, options):
+    """One-line description of a parsed sink for the banner."""
+    output_format = options.get('format', OUTPUT_FORMAT)
+    policy = f"queue {options.get('queue', SINK_QUEUE)}, {options.get('policy', SINK_POLICY)} when full"
+    if kind == 'stdout':
+        return f"stdout ({output_format}, {policy})"
+    if kind == 'file':
+        compress = options.get('compress', 'gzip' if target.endswith('.gz') else 'none')
+        rotation = f"rotate at {int(options['max_bytes']):,} bytes" if int(options.get('max_bytes', 0)) else 'no rotation'
+        return f"file {target} ({output_format}, {rotation}, compression {compress}, {policy})"
+    if kind == 'pipe':
+        return f"named pipe {target} ({output_format}, {policy})"
+    if kind == 'syslog':
+        protocol, host, port = target
+        return f"syslog over {protocol.upper()} to {host}:{port} ({output_format}, {policy})"
+    if kind == 'otlp':
+        return (f"OTLP to {target} (batch {options.get('batch', OTLP_BATCH_SIZE)}, "
+                f"flush {float(options.get('flush', OTLP_FLUSH_INTERVAL)):g}s, "
+                f"concurrency {options.get('concurrency', OTLP_CONCURRENCY)}, compression {OTLP_COMPRESSION}, "
+                f"{policy})")
+    return (f"Loki push to {target} (batch {options.get('batch', LOKI_BATCH_SIZE)}, "
+            f"flush {float(options.get('flush', LOKI_FLUSH_INTERVAL)):g}s, "
+            f"concurrency {options.get('concurrency', LOKI_CONCURRENCY)}, compression {LOKI_COMPRESSION}, {policy})")
+
+def sink_label(kind, target):
+    """Short name of a parsed sink, for metrics labels and reports."""
+    if kind == 'stdout':
+        return 'stdout'
+    if kind in ('file', 'pipe'):
+        return f'{kind}:{target}'
+    if kind == 'syslog':
+        protocol, host, port = target
+        return f'syslog+{protocol}://{host}:{port}'
+    if kind == 'otlp':
+        return f'otlp://{target}'
+    return f'loki+{target}'
+
+def _worker_path(path, worker):
+    """Per-worker variant of a file or pipe path: auth.log.gz -> auth-2.log.gz for worker 2."""
+    if worker is None:
+        return path
+    directory, name = os.path.split(path)
+    stem, dot, extension = name.partition('.')
+    return os.path.join(directory, f'{stem}-{worker}{dot}{extension}')
+
+def make_sink(writer, clock=None, worker=None, specs=None, metrics=None):
+    """AsyncFanout delivering events to every sink of the SINKS list.
+
+    `writer` is the stdout writer, shared with status records. `clock`
+    overrides the shared clock for event timestamps (backfill); exporters
+    then read their own SteppedClock, positioned at each batch's tick on
+    their delivery thread. In shard workers (`worker` set) file and pipe
+    paths get a per-worker suffix, since workers write their own sinks.
+    `metrics` gets the per-sink queue depth and drops.
+    """
+    specs = specs or parse_sinks()
+    provider = TimestampProvider(clock) if clock else None
+    channels = []
+    for index, (kind, target, options) in enumerate(specs):
+        output_format = options.get('format', OUTPUT_FORMAT)
+        exporter_clock = SteppedClock(clock.start_ns) if clock else None
+        if kind == 'stdout':
+            # Batches on the sink's thread into the shared, locked stdout stream; its writes
+            # are recorded like the stdout writer's own
+            sizes = collections.deque() if metrics is not None and writer.metrics is metrics else None
+            sink = LineSink(BatchWriter(writer.stream, sizes=sizes), output_format, provider)
+        elif kind == 'otlp':
+            sink = OtlpExporter(target, int(options.get('batch', OTLP_BATCH_SIZE)),
+                                float(options.get('flush', OTLP_FLUSH_INTERVAL)),
+                                int(options.get('concurrency', OTLP_CONCURRENCY)),
+                                clock=exporter_clock, policy=options.get('policy', SINK_POLICY))
+        elif kind == 'loki':
+            sink = LokiPusher(target, int(options.get('batch', LOKI_BATCH_SIZE)),
+                              float(options.get('flush', LOKI_FLUSH_INTERVAL)),
+                              int(options.get('concurrency', LOKI_CONCURRENCY)),
+                              output_format=output_format, clock=exporter_clock,
+                              policy=options.get('policy', SINK_POLICY))
+        else:
+            if kind == 'file':
+                path = _worker_path(target, worker)
+                stream = RotatingFileTarget(path, int(options.get('max_bytes', 0)), int(options.get('backups', 5)),
+                                            options.get('compress', 'gzip' if path.endswith('.gz') else 'none'),
+                                            int(options.get('level', 1)))
+            elif kind == 'pipe':
+                stream = FifoTarget(_worker_path(target, worker))
+            else:
+                protocol, host, port = target
+                stream = SyslogTarget(host, port, protocol)
+            sink_writer = BatchWriter(DeliveryStream(stream))
+            if kind == 'syslog':
+                sink = SyslogSink(sink_writer, protocol, output_format, provider)
+            else:
+                sink = LineSink(sink_writer, output_format, provider, owned=True)
+        channels.append(SinkChannel(sink, sink_label(kind, target), index, int(options.get('queue', SINK_QUEUE)),
+                                    options.get('policy', SINK_POLICY), exporter_clock))
+    return AsyncFanout(channels, clock, metrics)
+
+def close_sink(writer, sink, **fields):
+    """Close `sink` and log an ERROR for any lines its sinks lost over the run; returns whether none were."""
+    sink.close()
+    lost = sink.summary()
+    if lost:
+        message, details = lost
+        log_record(writer, 'ERROR', message, **details, **fields)
+    return lost is None
+
+def make_stdout_writer(metrics=None):
+    """BatchWriter for stdout, shared by status records and the stdout sink."""
+    return BatchWriter(StreamTarget(sys.stdout.buffer), metrics=metrics)
+
+class BlockOracle:
+    """Reference model of ZTAC's threshold blocking, fed with generated events.
+
+    An IP should be blocked once `threshold` failures fall within `window`
+    seconds. Each IP keeps only the times of its last `threshold` failures in
+    a bounded deque, so a check is O(1) and memory stays proportional to the
+    number of IPs currently failing. A crossed IP stays blocked for
+    `retention` seconds and is then forgotten, so it may cross again. IPs
+    are keyed alone, not per tenant: Alloy forwards every event under
+    PRIMARY_TENANT.
+
+    With `path` set, JSON lines are appended for check_time_to_block.py: one
+    'crossed' record with the exact moment an IP reaches the threshold, and
+    'seen' records for the first `seen_limit` distinct IPs (to probe for
+    false positives). start_oracle_file() writes the file's 'start' record.
+    """
+
+    def __init__(self, path=None, threshold=ORACLE_THRESHOLD, window=ORACLE_WINDOW,
+                 reset_on_success=ORACLE_RESET_ON_SUCCESS, seen_limit=ORACLE_SEEN_LIMIT, retention=ORACLE_RETENTION):
+        self.threshold = threshold
+        self.window_ns = int(window * 1_000_000_000)
+        self.retention_ns = int(retention * 1_000_000_000)
+        self.reset_on_success = reset_on_success
+        self.seen_limit = seen_limit if path else 0
+        self.failures = {}  # ip -> deque of its latest failure times (ns)
+        self.crossed = {}  # ip -> time it reached the threshold (ns), oldest first
+        self.crossed_total = 0
+        self.seen = set()
+        self._next_prune = 0
+        self._window_crossed = 0
+        # O_APPEND keeps records whole when shard workers share the file
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644) if path else None
+
+    def _write(self, records):
+        if self.fd is not None and records:
+            os.write(self.fd, ''.join(json.dumps(record) + '\n' for record in records).encode('ascii'))
+
+    def observe(self, events, now_ns):
+        """Count a batch of events occurring at now_ns; returns the IPs that just crossed."""
+        crossed, failures, seen = self.crossed, self.failures, self.seen
+        newly_crossed = []
+        records = []
+        for event in events:
+            ip = event[1]
+            if ip in crossed:
+                continue
+            if len(seen) < self.seen_limit and ip not in seen:
+                seen.add(ip)
+                records.append({'event': 'seen', 'ip': ip})
+            if event[3]:
+                if self.reset_on_success:
+                    failures.pop(ip, None)
+                continue
+            times = failures.get(ip)
+            if times is None:
+                times = failures[ip] = collections.deque(maxlen=self.threshold)
+            times.append(now_ns)
+            if len(times) == self.threshold and now_ns - times[0] <= self.window_ns:
+                del failures[ip]
+                crossed[ip] = now_ns
+                newly_crossed.append(ip)
+                records.append({'event': 'crossed', 'ip': ip, 'crossed_at': timestamps.format(now_ns),
+                                'crossed_ns': now_ns, 'failures': self.threshold})
+        self._write(records)
+        self._window_crossed += len(newly_crossed)
+        self.crossed_total += len(newly_crossed)
+        if now_ns >= self._next_prune:
+            self.prune(now_ns)
+        return newly_crossed
+
+    def prune(self, now_ns):
+        """Forget IPs whose latest failure has slid out of the window, and blocks older than the retention."""
+        horizon = now_ns - self.window_ns
+        for ip in [ip for ip, times in self.failures.items() if times[-1] < horizon]:
+            del self.failures[ip]
+        # Crossings are inserted in time order, so the expired ones are at the front
+        horizon = now_ns - self.retention_ns
+        expired = list(itertools.takewhile(lambda item: item[1] < horizon, self.crossed.items()))
+        for ip, _ in expired:
+            del self.crossed[ip]
+        self._next_prune = now_ns + min(self.window_ns, self.retention_ns)
+
+    def is_blocked(self, ip):
+        return ip in self.crossed
+
+    def report(self):
+        """Return (message, fields) summarising crossings since the last report."""
+        fields = {'oracle_crossed': self._window_crossed, 'oracle_crossed_total': self.crossed_total,
+                  'oracle_tracked_ips': len(self.failures), 'oracle_blocked_ips': len(self.crossed)}
+        self._window_crossed = 0
+        return (f"Oracle: {fields['oracle_crossed']} IPs crossed {self.threshold} failures/"
+                f"{self.window_ns / 1_000_000_000:g}s ({fields['oracle_crossed_total']} total)", fields)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+def make_oracle():
+    """Build the block oracle when ORACLE_FILE is set."""
+    return BlockOracle(ORACLE_FILE) if ORACLE_FILE else None
+
+def start_oracle_file(path=ORACLE_FILE):
+    """Truncate the oracle file and write the run's 'start' record with the model parameters.
+
+    Called once by the parent process; the oracles of shard workers only
+    append to the file.
+    """
+    with open(path, 'w') as f:
+        f.write(json.dumps({'event': 'start', 'threshold': ORACLE_THRESHOLD, 'window_seconds': ORACLE_WINDOW,
+                            'reset_on_success': ORACLE_RESET_ON_SUCCESS, 'retention_seconds': ORACLE_RETENTION,
+                            'tenant': PRIMARY_TENANT}) + '\n')
+
+def _prometheus_value(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def _prometheus_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class GeneratorMetrics:
+    """Generator self-metrics, served in the Prometheus text format on /metrics.
+
+    Values live in a flat array of doubles with one fixed-size slot per
+    process, so shard workers update their own slot in shared memory
+    without locks and /metrics sums the slots. The generation loop only
+    does array arithmetic; all formatting happens on the server thread.
+    """
+
+    SCALARS = {
+        'encode_seconds': ('counter', 'Seconds spent encoding events and handing them to the sink.'),
+        'write_blocked_seconds': ('counter', 'Seconds spent blocked writing batches to the output.'),
+        'schedule_lag_seconds': ('gauge', 'How late the last batch of events was against its schedule.'),
+        'missed_events': ('counter', 'Events skipped after falling more than BURST_SECONDS behind schedule.'),
+        'shed_events': ('counter', 'Events dropped by SHED_POLICY while behind schedule.'),
+        'target_rate': ('gauge', 'Requested events per second.'),
+        'achieved_rate': ('gauge', 'Events per second generated over the last report interval.'),
+    }
+    MAXIMA = {'schedule_lag_seconds'}  # gauges shown as the maximum over slots instead of the sum
+    HISTOGRAMS = {
+        'batch_events': ((1, 10, 100, 1000, 10000, 100000), 'Events generated per scheduler tick.'),
+        'write_bytes': ((4096, 16384, 65536, 262144, 1048576, 4194304), 'Bytes per output write.'),
+    }
+
+    def __init__(self, slots=1, memory=False, sinks=()):
+        classes = list(TRAFFIC_CLASSES)
+        self.event_index = {}
+        for tenant in TENANTS:
+            for traffic_class in classes:
+                for success in (False, True):
+                    self.event_index[(tenant, traffic_class, success)] = len(self.event_index)
+        self.offsets = {}
+        width = len(self.event_index)
+        for name in self.SCALARS:
+            self.offsets[name] = width
+            width += 1
+        for name, (bounds, _) in self.HISTOGRAMS.items():
+            self.offsets[name] = width
+            width += len(bounds) + 2  # buckets, +Inf bucket, sum
+        self.memory = memory  # soak mode: RSS and per-subsystem growth (see SoakMonitor)
+        self.offsets['rss_bytes'] = width
+        width += 1
+        for subsystem in MEMORY_SUBSYSTEMS:
+            self.offsets[f'memory_growth_bytes:{subsystem}'] = width
+            width += 1
+        self.sinks = list(sinks)  # AsyncFanout sink labels, in SINKS order
+        for index in range(len(self.sinks)):
+            self.offsets[f'sink_queue_depth:{index}'] = width
+            self.offsets[f'sink_dropped_lines:{index}'] = width + 1
+            width += 2
+        self.width = width
+        self.slots = slots
+        if slots > 1:
+            self.values = multiprocessing.Array('d', width * slots, lock=False)  # shared with forked workers
+        else:
+            self.values = array('d', [0.0]) * width
+        self.base = 0
+
+    def bind(self, slot):
+        """Direct this process's updates to `slot`."""
+        self.base = slot * self.width
+
+    def count(self, events, classes):
+        """Count events by (tenant, class, outcome); classes[i] is the class of events[i]."""
+        counts = collections.Counter(zip(map(itemgetter(0), events), classes, map(itemgetter(3), events)))
+        values, base, index = self.values, self.base, self.event_index
+        for key, count in counts.items():
+            values[base + index[key]] += count
+
+    def add(self, name, value):
+        self.values[self.base + self.offsets[name]] += value
+
+    def set(self, name, value):
+        self.values[self.base + self.offsets[name]] = value
+
+    def observe(self, name, value):
+        bounds = self.HISTOGRAMS[name][0]
+        offset = self.base + self.offsets[name]
+        self.values[offset + bisect.bisect_left(bounds, value)] += 1
+        self.values[offset + len(bounds) + 1] += value
+
+    def _total(self, offset):
+        values, width = self.values, self.width
+        return sum(values[slot * width + offset] for slot in range(self.slots))
+
+    def _max(self, offset):
+        values, width = self.values, self.width
+        return max(values[slot * width + offset] for slot in range(self.slots))
+
+    def render(self):
+        """Return all metrics, summed over slots, in the Prometheus text exposition format."""
+        lines = [
+            '# HELP auth_log_generator_events_total Authentication events generated.',
+            '# TYPE auth_log_generator_events_total counter',
+        ]
+        for (tenant, traffic_class, success), offset in self.event_index.items():
+            total = self._total(offset)
+            if not total:
+                continue  # a long tail of idle tenant/class/outcome series costs nothing
+            lines.append(f'auth_log_generator_events_total{{tenant="{_prometheus_label(tenant)}",'
+                         f'class="{traffic_class}",outcome="{"success" if success else "failure"}"}} '
+                         f'{_prometheus_value(total)}')
+        for name, (kind, help_text) in self.SCALARS.items():
+            metric = f'auth_log_generator_{name}' + ('_total' if kind == 'counter' else '')
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            aggregate = self._max if name in self.MAXIMA else self._total
+            lines.append(f'{metric} {_prometheus_value(aggregate(self.offsets[name]))}')
+        for name, (bounds, help_text) in self.HISTOGRAMS.items():
+            metric = f'auth_log_generator_{name}'
+            offset = self.offsets[name]
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            cumulative = 0.0
+            for number, bound in enumerate(bounds + ('+Inf',)):
+                cumulative += self._total(offset + number)
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {_prometheus_value(cumulative)}')
+            lines.append(f'{metric}_sum {_prometheus_value(self._total(offset + len(bounds) + 1))}')
+            lines.append(f'{metric}_count {_prometheus_value(cumulative)}')
+        if self.memory:
+            lines.append('# HELP auth_log_generator_rss_bytes Resident set size, summed over processes.')
+            lines.append('# TYPE auth_log_generator_rss_bytes gauge')
+            lines.append(f"auth_log_generator_rss_bytes {_prometheus_value(self._total(self.offsets['rss_bytes']))}")
+            lines.append('# HELP auth_log_generator_memory_growth_bytes Traced memory growth since the soak '
+                         'baseline, by subsystem.')
+            lines.append('# TYPE auth_log_generator_memory_growth_bytes gauge')
+            for subsystem in MEMORY_SUBSYSTEMS:
+                total = self._total(self.offsets[f'memory_growth_bytes:{subsystem}'])
+                lines.append(f'auth_log_generator_memory_growth_bytes{{subsystem="{subsystem}"}} '
+                             f'{_prometheus_value(total)}')
+        sink_series = (('sink_queue_depth', 'gauge', "Batches waiting in each sink's delivery queue."),
+                       ('sink_dropped_lines', 'counter', "Lines dropped by each sink's full-queue policy."))
+        for name, kind, help_text in sink_series if self.sinks else ():
+            metric = f'auth_log_generator_{name}' + ('_total' if kind == 'counter' else '')
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for index, label in enumerate(self.sinks):
+                total = self._total(self.offsets[f'{name}:{index}'])
+                lines.append(f'{metric}{{sink="{_prometheus_label(label)}"}} {_prometheus_value(total)}')
+        return '\n'.join(lines) + '\n'
+
+# Code (classes and functions of this file) whose allocations count towards each subsystem
+MEMORY_SUBSYSTEM_CODE = {
+    'populations': ('IPPopulation', 'CidrPopulation', 'build_population', 'UsernameList', 'AliasTable',
+                    'tenant_samplers', 'load_tenants'),
+    'traffic': ('generate_event_batch', 'generate_log_batch', 'VectorSampler', 'BatchSource', 'TrafficStream',
+                'Scenario', 'make_source', 'LoadShedder', 'TokenBucket'),
+    'encoding': ('_JsonLiteralCache', 'generate_auth_event', 'encode_auth_event', 'encode_ztac_line',
+                 'encode_ztac_body', 'TimestampProvider'),
+    'sinks': ('BatchWriter', 'StreamTarget', 'RotatingFileTarget', 'FifoTarget', 'SyslogTarget', 'LineSink',
+              'SyslogSink', 'AsyncExporter', 'OtlpExporter', 'LokiPusher', 'DeliveryStream', '_SinkThread',
+              'SinkChannel', 'AsyncFanout', 'PipeStream', 'make_sink', 'log_record'),
+    'oracle': ('BlockOracle',),
+    'metrics': ('GeneratorMetrics', '_MetricsHandler', 'Controller'),
+}
+# ... plus 'generator' for the rest of this file and 'other' for allocations it does not reach
+MEMORY_SUBSYSTEMS = tuple(MEMORY_SUBSYSTEM_CODE) + ('generator', 'other')
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:  # not Linux: peak RSS is the best available
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+class SoakMonitor:
+    """Soak mode: periodic tracemalloc and RSS snapshots, with growth reported per subsystem.
+
+    Traced allocations are attributed to the innermost frame in this file
+    and from there to a subsystem (MEMORY_SUBSYSTEM_CODE), so a sink queue
+    filling up shows as 'sinks' growth even though queue.py made the
+    allocation. Growth is measured from a baseline taken `warmup` seconds
+    in, once caches and queues have filled. When RSS growth exceeds
+    `budget_mb`, or at the end of `duration` (standalone or parent process
+    only), poll() raises SystemExit: 1 over budget, 0 otherwise.
+
+    Snapshots are grouped on a background thread, so generation slows down
+    for a moment instead of stalling; still, tracing makes every allocation
+    dearer, so soak runs measure memory, not peak throughput.
+    """
+
+    _lines = None  # (first line, last line, subsystem) of this file's classes and functions
+
+    def __init__(self, interval=SOAK_INTERVAL, warmup=SOAK_WARMUP, budget_mb=SOAK_BUDGET_MB,
+                 duration=SOAK_DURATION, worker=None):
+        self.interval = interval
+        self.budget_mb = budget_mb
+        self.duration = duration if worker is None else 0  # the parent ends a sharded run
+        self.worker = worker
+        self.started = time.monotonic()
+        self.warmup_end = self.started + warmup
+        self.due = self.started + min(interval, warmup) if warmup else self.started
+        self.baseline = None  # (rss, {subsystem: bytes})
+        self._thread = None  # snapshot in progress
+        self._result = None  # (time, rss, usage) of the last finished snapshot
+        self.filename = os.path.abspath(__file__)
+        if SoakMonitor._lines is None:  # parsed once, before tracing starts; forked workers inherit it
+            subsystems = {name: subsystem for subsystem, names in MEMORY_SUBSYSTEM_CODE.items() for name in names}
+            with open(self.filename) as f:
+                tree = ast.parse(f.read())
+            SoakMonitor._lines = sorted((node.lineno, node.end_lineno, subsystems[node.name]) for node in tree.body
+                                        if getattr(node, 'name', None) in subsystems)
+        self._starts = [first for first, last, subsystem in self._lines]
+        self._sites = {}  # (filename, lineno) -> subsystem
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(SOAK_TRACE_FRAMES)
+
+    def _subsystem(self, traceback):
+        for frame in reversed(traceback):  # innermost first
+            key = (frame.filename, frame.lineno)
+            subsystem = self._sites.get(key)
+            if subsystem is None:
+                subsystem = 'other'
+                if os.path.abspath(frame.filename) == self.filename:
+                    subsystem = 'generator'
+                    index = bisect.bisect_right(self._starts, frame.lineno) - 1
+                    if index >= 0 and frame.lineno <= self._lines[index][1]:
+                        subsystem = self._lines[index][2]
+                self._sites[key] = subsystem
+            if subsystem != 'other':
+                return subsystem
+        return 'other'
+
+    def snapshot(self):
+        """Return (rss bytes, {subsystem: traced bytes})."""
+        usage = dict.fromkeys(MEMORY_SUBSYSTEMS, 0)
+        for stat in tracemalloc.take_snapshot().statistics('traceback'):
+            usage[self._subsystem(stat.traceback)] += stat.size
+        return _rss_bytes(), usage
+
+    def _take(self):
+        self._result = (time.monotonic(),) + self.snapshot()
+
+    def poll(self, writer, metrics=None):
+        """Start a snapshot when one is due; log growth, update metrics and enforce the budget once it is done."""
+        if self._thread is None:
+            if time.monotonic() >= self.due:
+                self._thread = threading.Thread(target=self._take, name='soak-snapshot', daemon=True)
+                self._thread.start()
+            return
+        if self._thread.is_alive():
+            return
+        self._thread = None
+        now, rss, usage = self._result
+        self.due = now + self.interval
+        if metrics is not None:
+            metrics.set('rss_bytes', rss)
+        if self.baseline is None:
+            if now < self.warmup_end:
+                return
+            self.baseline = (rss, usage)
+            log_record(writer, 'INFO', f'Soak baseline: RSS {rss / 2 ** 20:.1f} MB, '
+                                       f'{sum(usage.values()) / 2 ** 20:.1f} MB traced',
+                       rss_mb=round(rss / 2 ** 20, 1), **self._worker_field())
+            return
+        base_rss, base_usage = self.baseline
+        growth = {subsystem: usage[subsystem] - base_usage[subsystem] for subsystem in MEMORY_SUBSYSTEMS}
+        if metrics is not None:
+            for subsystem, size in growth.items():
+                metrics.set(f'memory_growth_bytes:{subsystem}', size)
+        rss_growth = (rss - base_rss) / 2 ** 20
+        over_budget = self.budget_mb and rss_growth > self.budget_mb
+        finished = self.duration and now - self.started >= self.duration
+        top = sorted(growth.items(), key=lambda item: -abs(item[1]))[:3]
+        message = (f"Memory: RSS {rss / 2 ** 20:.1f} MB ({rss_growth:+.1f} MB since baseline); "
+                   + ', '.join(f'{subsystem} {size / 2 ** 20:+.2f} MB' for subsystem, size in top))
+        if over_budget:
+            message += f'; over the {self.budget_mb:g} MB budget'
+        elif finished:
+            message += '; soak finished within budget' if self.budget_mb else '; soak finished'
+        log_record(writer, 'ERROR' if over_budget else 'INFO', message,
+                   rss_mb=round(rss / 2 ** 20, 1), rss_growth_mb=round(rss_growth, 2),
+                   growth_mb={subsystem: round(size / 2 ** 20, 3) for subsystem, size in growth.items()},
+                   soak_seconds=round(now - self.started), **self._worker_field())
+        if over_budget or finished:
+            raise SystemExit(1 if over_budget else 0)
+
+    def _worker_field(self):
+        return {} if self.worker is None else {'worker': self.worker}
+
+def make_soak(worker=None):
+    """Build the soak monitor when SOAK_INTERVAL is set."""
+    return SoakMonitor(worker=worker) if SOAK_INTERVAL > 0 else None
+
+CONTROL_KEYS = ('rate', 'mix', 'scenario', 'tenants')
+CONTROL_TIMEOUT = 2  # seconds a POST /control waits for the generation loop to apply it
+
+def _control_weight(value, name):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value < math.inf:
+        raise ValueError(f'{name} must be a non-negative number')
+    return float(value)
+
+def merge_control(settings, change):
+    """Validate a /control `change` against the current `settings` and return the merged settings.
+
+    `rate` sets the default traffic's events/s, `mix` the relative weight of
+    each traffic class ({"attacker": 1, ...}, null for the default mix),
+    `scenario` a scenario file path or inline scenario object (null for the
+    default traffic) and `tenants` per-tenant {"volume": w, "attack": w}
+    weight overrides (null for the weights loaded at startup). Tenant
+    overrides merge into the current ones key by key. Raises ValueError for
+    anything else.
+    """
+    if not isinstance(change, dict):
+        raise ValueError('expected a JSON object')
+    unknown = set(change) - set(CONTROL_KEYS)
+    if unknown:
+        raise ValueError(f"unknown keys {', '.join(sorted(unknown))} (expected {', '.join(CONTROL_KEYS)})")
+    merged = dict(settings)
+    if 'scenario' in change:
+        scenario = change['scenario']
+        if scenario is not None and not isinstance(scenario, (str, dict)):
+            raise ValueError('scenario must be a file path, a scenario object or null')
+        merged['scenario'] = scenario
+    if merged['scenario'] is not None and ('rate' in change or 'mix' in change):
+        raise ValueError('rate and mix apply to the default traffic; set scenario to null first')
+    if 'rate' in change:
+        merged['rate'] = _control_weight(change['rate'], 'rate')
+    if 'mix' in change:
+        mix = change['mix']
+        if mix is not None:
+            if not isinstance(mix, dict) or not mix or set(mix) - set(DEFAULT_MIX_SHARES):
+                raise ValueError(f"mix must map traffic classes ({', '.join(DEFAULT_MIX_SHARES)}) to weights")
+            mix = {traffic_class: _control_weight(weight, f'mix.{traffic_class}')
+                   for traffic_class, weight in mix.items()}
+            if not sum(mix.values()):
+                raise ValueError('mix needs at least one positive weight')
+        merged['mix'] = mix
+    if 'tenants' in change:
+        overrides = change['tenants']
+        if overrides is not None:
+            if not isinstance(overrides, dict):
+                raise ValueError('tenants must map tenant names to {"volume": w, "attack": w}')
+            known = set(TENANTS)
+            for tenant, weights in overrides.items():
+                if tenant not in known:
+                    raise ValueError(f'unknown tenant {tenant!r}')
+                if not isinstance(weights, dict) or not weights or set(weights) - {'volume', 'attack'}:
+                    raise ValueError(f'tenants.{tenant} must be {{"volume": w, "attack": w}}')
+                for kind, weight in weights.items():
+                    _control_weight(weight, f'tenants.{tenant}.{kind}')
+            previous = settings['tenants'] or {}
+            overrides = {**previous, **{tenant: {**previous.get(tenant, {}), **weights}
+                                        for tenant, weights in overrides.items()}}
+        merged['tenants'] = overrides
+    return merged
+
+class Controller:
+    """Runtime traffic settings changed through POST /control on the metrics port.
+
+    The HTTP thread validates a change and builds the new traffic source
+    and tenant tables; the generation loop installs them all together at
+    the start of its next tick (apply()), so a step-load experiment never
+    sees half a change. Changes posted before the loop applies the last
+    one are folded into it. With `shard` = (index, shards) the controller
+    belongs to a worker process and builds that shard of the source;
+    `listeners` get every accepted settings dict (run_sharded() forwards
+    them to its workers).
+    """
+
+    def __init__(self, settings=None, shard=None):
+        self.settings = settings or initial_settings()
+        self.shard = shard
+        self.listeners = []
+        self._submit = threading.Lock()  # one change at a time, each merged onto the last
+        self._applied = threading.Condition()
+        self._pending = None  # (settings, change, source, restart, tenants, version)
+        self._version = self._applied_version = 0
+        self._latest = self.settings
+
+    @property
+    def pending(self):
+        return self._pending is not None
+
+    def submit(self, change, wait=CONTROL_TIMEOUT, merged=False):
+        """Queue `change` for the next tick; returns (settings, applied within `wait` seconds).
+
+        With `merged` the change is already a complete settings dict.
+        Raises ValueError for an invalid change, including a scenario or
+        tenant weights that fail to build.
+        """
+        with self._submit:
+            previous = self._latest
+            settings = change if merged else merge_control(previous, change)
+            source = None
+            restart = settings['scenario'] != previous['scenario']
+            if restart or settings['rate'] != previous['rate'] or settings['mix'] != previous['mix']:
+                try:
+                    source = make_source(settings)
+                except (OSError, KeyError, TypeError, ValueError) as e:
+                    raise ValueError(f'cannot build traffic source: {e!r}') from None
+                if self.shard is not None:
+                    source = source.shard(*self.shard)
+            tenants = None
+            if settings['tenants'] != previous['tenants']:
+                overrides = settings['tenants'] or {}
+                volume = [overrides.get(tenant, {}).get('volume', weight)
+                          for tenant, weight in zip(TENANTS, TENANT_VOLUME_WEIGHTS)]
+                attack = [overrides.get(tenant, {}).get('attack', weight)
+                          for tenant, weight in zip(TENANTS, TENANT_ATTACK_WEIGHTS)]
+                tenants = tenant_samplers(volume, attack)  # raises ValueError when all weights are zero
+            for listener in self.listeners:
+                listener(settings)
+            with self._applied:
+                if self._pending is not None:  # fold in the change the loop has not applied yet
+                    _, earlier, earlier_source, earlier_restart, earlier_tenants, _ = self._pending
+                    change = {**earlier, **change}
+                    restart = restart or earlier_restart
+                    source = earlier_source if source is None else source
+                    tenants = earlier_tenants if tenants is None else tenants
+                self._version += 1
+                version = self._version
+                self._pending = (settings, change, source, restart, tenants, version)
+            self._latest = settings
+        with self._applied:
+            applied = self._applied.wait_for(lambda: self._applied_version >= version, wait)
+        return settings, applied
+
+    def follow(self, conn):
+        """Apply every settings dict received on `conn` (a worker's end of run_sharded()'s control pipe)."""
+        while True:
+            try:
+                settings = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                self.submit(settings, wait=0, merged=True)
+            except ValueError:
+                pass  # the parent built the same change successfully; keep the current settings
+
+    def apply(self, source):
+        """Install the pending change, if any; returns (source, change, restart).
+
+        Called by the generation loop at the start of a tick. `restart` is
+        set when the scenario changed, so its timeline starts from zero;
+        otherwise the new source keeps the old one's profile origin.
+        """
+        with self._applied:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return source, None, False
+        settings, change, new_source, restart, tenants, version = pending
+        if tenants is not None:
+            TENANT_SAMPLERS.update(tenants)
+        if new_source is not None:
+            if not restart:
+                new_source.origin = source.origin
+            source = new_source
+        with self._applied:
+            self.settings = settings
+            self._applied_version = version
+            self._applied.notify_all()
+        return source, change, restart
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/control' and self.server.controller is not None:
+            self._send_json(200, self.server.controller.settings)
+            return
+        if path != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.split('?')[0] != '/control' or self.server.controller is None:
+            self.send_error(404)
+            return
+        try:
+            change = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            settings, applied = self.server.controller.submit(change)
+        except ValueError as e:  # includes malformed JSON
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(200 if applied else 202, {'applied': applied, 'settings': settings})
+
+    def _send_json(self, status, payload):
+        body = (json.dumps(payload) + '\n').encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # stdout carries the event stream
+
+def start_metrics_server(metrics, port=METRICS_PORT, controller=None):
+    """Serve metrics.render() on http://0.0.0.0:<port>/metrics, and `controller` on /control, from a daemon thread."""
+    server = ThreadingHTTPServer(('', port), _MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    server.controller = controller
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+def run_scheduler(writer, source, sink, counters=None, slot=0, oracle=None, metrics=None, controller=None,
+                  soak=None):
+    """Emit events from `source` at its current rate into `sink` until interrupted.
+
+    The source's rate is re-read every tick, so scenario phase changes and
+    ramps take effect without pausing output. Standalone, the loop logs its
+    own achieved-rate reports. As a shard worker it instead publishes running
+    totals into the shared `counters` array (events at 2*slot, failures at
+    2*slot+1) for the parent to report. Status records always go to writer.
+    Events are also fed to `oracle` and counted in `metrics`, when given.
+
+    Every report also accounts for backpressure: the worst schedule lag,
+    time blocked writing to stdout and the sinks, and events missed or shed
+    (see LoadShedder). A shard worker reports these itself when it misses
+    or sheds events.
+
+    Changes posted to `controller` are installed at the start of the next
+    tick; a new scenario starts from its first phase. `soak` takes its
+    memory snapshots between ticks.
+    """
+    start = time.monotonic()
+    bucket = TokenBucket(source.rate(0), arrivals=source.arrivals)
+    shedder = LoadShedder()
+    if metrics is not None:
+        metrics.set('target_rate', bucket.rate)
+    phase = None
+    total_events = 0
+    total_failures = 0
+    window_events = 0
+    window_failures = 0
+    window_writes = 0
+    window_lag = 0.0
+    window_blocked = 0.0
+    window_missed = 0
+    window_shed = 0
+    metered = (0, 0, 0.0)  # missed, shed and sink blocked time already added to metrics
+    window_start = time.monotonic()
+
+    while True:
+        try:
+            if controller is not None and controller.pending:
+                source, change, restart = controller.apply(source)
+                if restart:
+                    start = time.monotonic()
+                    phase = None
+                if source.arrivals != ('poisson' if bucket.poisson else 'uniform'):
+                    bucket = TokenBucket(source.rate(time.monotonic() - start), arrivals=source.arrivals)
+                if change is not None and counters is None:
+                    log_record(writer, 'INFO', f"Control change applied: {', '.join(sorted(change))}",
+                               change=change)
+            rate = source.rate(time.monotonic() - start)
+            if rate != bucket.rate:
+                bucket.set_rate(rate)
+                if metrics is not None:
+                    metrics.set('target_rate', rate)
+            if source.phase != phase and counters is None:
+                phase = source.phase
+                log_record(writer, 'INFO', f"Entering scenario phase '{phase}'", phase=phase, target_rate=rate)
+            events = source.events(bucket.take())
+            classes = source.classes
+            if bucket.lag > window_lag:
+                window_lag = bucket.lag
+            if events and shedder.policy != 'block':
+                events, classes = shedder.apply(events, classes, bucket.lag)
+            if metrics is None:
+                sink.emit(events)
+            else:
+                if events:
+                    started = time.perf_counter()
+                    sink.emit(events)
+                    metrics.add('encode_seconds', time.perf_counter() - started)
+                    metrics.count(events, classes)
+                    metrics.observe('batch_events', len(events))
+                metrics.set('schedule_lag_seconds', bucket.lag)
+                totals = (int(bucket.missed), shedder.shed, sink.blocked_seconds)
+                if totals != metered:
+                    metrics.add('missed_events', totals[0] - metered[0])
+                    metrics.add('shed_events', totals[1] - metered[1])
+                    metrics.add('write_blocked_seconds', totals[2] - metered[2])
+                    metered = totals
+            if oracle is not None:
+                oracle.observe(events, timestamps.clock.now_ns())
             for event in events:
-                print(json.dumps(event), flush=True)
+                if not event[3]:
+                    total_failures += 1
+            total_events += len(events)
+            sink.flush_if_due()
+            writer.flush_if_due()
 
-            if iteration % 10 == 0:  # Status update every 10 iterations
-                failures = sum(1 for e in events if not e['auth']['success'])
-                print(json.dumps({
-                    'timestamp': datetime.utcnow().isoformat() + 'Z',
-                    'level': 'INFO',
-                    'service': 'auth-log-generator',
-                    'message': f'Generated {len(events)} events ({failures} failures)',
-                    'iteration': iteration
-                }), flush=True)
+            if counters is not None:
+                counters[2 * slot] = total_events
+                counters[2 * slot + 1] = total_failures
+            now = time.monotonic()
+            if now - window_start >= RATE_REPORT_INTERVAL:
+                sink_report = sink.report()
+                if sink_report:
+                    message, fields = sink_report
+                    if counters is not None:
+                        fields['worker'] = slot
+                    log_record(writer, 'INFO', message, **fields)
+                if oracle is not None:
+                    message, fields = oracle.report()
+                    if counters is not None:
+                        fields['worker'] = slot
+                    log_record(writer, 'INFO', message, **fields)
+                achieved = (total_events - window_events) / (now - window_start)
+                if metrics is not None:
+                    metrics.set('achieved_rate', achieved)
+                blocked = writer.blocked_seconds + sink.blocked_seconds
+                missed = int(bucket.missed)
+                backpressure = {
+                    'schedule_lag_max_s': round(window_lag, 4),
+                    'write_blocked_s': round(blocked - window_blocked, 3),
+                    'missed_events': missed - window_missed,
+                    'shed_events': shedder.shed - window_shed,
+                }
+                behind = window_lag > SHED_LAG or backpressure['missed_events'] or backpressure['shed_events']
+                detail = ''
+                if behind:
+                    # Mostly blocked on writes: the output side is slow; otherwise generation is
+                    backpressure['bottleneck'] = 'output' if blocked - window_blocked > (now - window_start) / 2 \
+                        else 'generator'
+                    detail = (f"; behind schedule by up to {window_lag:.3f}s, {blocked - window_blocked:.2f}s "
+                              f"blocked on writes, {backpressure['missed_events']} missed, "
+                              f"{backpressure['shed_events']} shed ({backpressure['bottleneck']} bottleneck)")
+                if counters is None:  # Achieved vs requested rate
+                    log_record(
+                        writer, 'WARN' if behind else 'INFO',
+                        f'Achieved {achieved:.1f} events/s (target {bucket.rate:g} events/s, '
+                        f'{total_failures - window_failures} failures){detail}',
+                        target_rate=bucket.rate,
+                        achieved_rate=round(achieved, 1),
+                        events_total=total_events,
+                        writes=writer.writes + sink.writes - window_writes,
+                        **backpressure,
+                    )
+                elif backpressure['missed_events'] or backpressure['shed_events']:
+                    log_record(writer, 'WARN', f'Worker {slot} {detail[2:]}', worker=slot, **backpressure)
+                window_events = total_events
+                window_failures = total_failures
+                window_writes = writer.writes + sink.writes
+                window_lag = 0.0
+                window_blocked = blocked
+                window_missed = missed
+                window_shed = shedder.shed
+                window_start = now
+            if soak is not None:
+                soak.poll(writer, metrics)
 
-            time.sleep(LOG_INTERVAL)
+            wait = bucket.time_until_next()
+            if wait > 0:
+                time.sleep(min(max(wait, SCHEDULER_TICK), writer.time_until_due(), sink.time_until_due()))
 
         except Exception as e:
-            print(json.dumps({
-                'timestamp': datetime.utcnow().isoformat() + 'Z',
-                'level': 'ERROR',
-                'service': 'auth-log-generator',
-                'message': f'Error generating logs: {str(e)}'
-            }), flush=True)
-            time.sleep(LOG_INTERVAL)
+            log_record(writer, 'ERROR', f'Error generating logs: {str(e)}')
+            writer.flush()
+            time.sleep(ERROR_BACKOFF)
+
+class PipeStream:
+    """Binary stream adapter that sends each write as one message on a Connection.
+
+    BatchWriter only ever writes whole lines, so every message the parent
+    receives is a run of complete lines it can forward without splitting.
+    Writes are serialized, since an AsyncFanout's stdout sink writes from
+    its own thread next to the worker's status records.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        with self.lock:
+            self.conn.send_bytes(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+def _shard_worker(index, shards, conn, counters, source, metrics=None, control=None):
+    # Forked workers would otherwise share the parent's random state
+    random.seed(None if SEED is None else SEED + 1 + index)
+    writer = BatchWriter(PipeStream(conn))
+    controller = None
+    soak = make_soak(worker=index)
+    if control is not None:
+        controller = Controller(shard=(index, shards))
+        threading.Thread(target=controller.follow, args=(control,), name='control', daemon=True).start()
+    sink = None
+    oracle = make_oracle()  # IPs are sharded, so each worker's oracle sees all events of its IPs
+    if metrics is not None:
+        metrics.bind(index)
+    try:
+        sink = make_sink(writer, worker=index, metrics=metrics)  # after fork: gRPC channels must not cross fork()
+        run_scheduler(writer, source.shard(index, shards), sink, counters, index, oracle, metrics, controller, soak)
+    finally:
+        if oracle is not None:
+            oracle.close()
+        if sink is not None:
+            close_sink(writer, sink, worker=index)
+        writer.close()
+        conn.close()
+
+def run_sharded(writer, source, shards=WORKERS, metrics=None, controller=None, soak=None):
+    """Fan generation out to `shards` worker processes and merge their output.
+
+    Each worker's batches arrive in order on its own pipe, so output is
+    ordered per shard. The parent aggregates per-worker rates from shared
+    memory counters and reports them every RATE_REPORT_INTERVAL seconds.
+    Changes accepted by `controller` are sent to every worker, which builds
+    its own shard of them and installs it at its next tick. In soak mode
+    (`soak` set) every process tracks its own memory, and a worker that
+    exceeds the budget fails the whole run.
+    """
+    counters = multiprocessing.Array('Q', 2 * shards, lock=False)
+    workers = []
+    controls = []
+    for index in range(shards):
+        reader, sender = multiprocessing.Pipe(duplex=False)
+        control_reader, control_sender = multiprocessing.Pipe(duplex=False) if controller else (None, None)
+        proc = multiprocessing.Process(
+            target=_shard_worker, args=(index, shards, sender, counters, source, metrics, control_reader),
+            name=f'auth-log-shard-{index}', daemon=True)
+        proc.start()
+        sender.close()
+        if controller:
+            control_reader.close()
+            controls.append(control_sender)
+        workers.append((proc, reader))
+    if controller:
+        def broadcast(settings):
+            for control in controls:
+                try:
+                    control.send(settings)
+                except OSError:
+                    pass  # worker exited; reported by forward()
+        controller.listeners.append(broadcast)
+
+    open_readers = {reader: index for index, (proc, reader) in enumerate(workers)}
+    window_counts = [0] * (2 * shards)
+    window_writes = 0
+    start = window_start = time.monotonic()
+    phase = None
+    stopping = False
+
+    def forward(timeout):
+        for reader in multiprocessing.connection.wait(list(open_readers), timeout):
+            try:
+                writer.write(reader.recv_bytes())
+            except EOFError:
+                index = open_readers.pop(reader)
+                if not stopping:
+                    log_record(writer, 'WARN', f'Worker {index} exited', worker=index)
+                    proc = workers[index][0]
+                    proc.join(timeout=1)
+                    if soak is not None and proc.exitcode == 1:
+                        raise SystemExit(1)  # over its soak budget
+
+    try:
+        while open_readers:
+            forward(min(SCHEDULER_TICK, writer.time_until_due()))
+            writer.flush_if_due()
+
+            if controller is not None and controller.pending:
+                source, change, restart = controller.apply(source)
+                if restart:
+                    start = time.monotonic()
+                    phase = None
+                log_record(writer, 'INFO', f"Control change applied: {', '.join(sorted(change))}", change=change)
+            now = time.monotonic()
+            target = source.rate(now - start)
+            if source.phase != phase:
+                phase = source.phase
+                log_record(writer, 'INFO', f"Entering scenario phase '{phase}'", phase=phase, target_rate=target)
+            if now - window_start >= RATE_REPORT_INTERVAL:  # Aggregate per-worker rates
+                elapsed = now - window_start
+                counts = counters[:]
+                worker_rates = [
+                    round((counts[2 * index] - window_counts[2 * index]) / elapsed, 1)
+                    for index in range(shards)
+                ]
+                achieved = sum(worker_rates)
+                failures = sum(counts[1::2]) - sum(window_counts[1::2])
+                log_record(
+                    writer, 'INFO',
+                    f'Achieved {achieved:.1f} events/s (target {target:g} events/s across '
+                    f'{shards} workers, {failures} failures)',
+                    target_rate=target,
+                    achieved_rate=round(achieved, 1),
+                    events_total=sum(counts[0::2]),
+                    worker_rates=worker_rates,
+                    writes=writer.writes - window_writes,
+                )
+                window_counts = counts
+                window_writes = writer.writes
+                window_start = now
+            if soak is not None:
+                soak.poll(writer, metrics)
+    finally:
+        # Ask workers to flush and exit, then drain what they send back
+        stopping = True
+        for proc, reader in workers:
+            if proc.is_alive():
+                proc.terminate()
+        deadline = time.monotonic() + 5
+        while open_readers and time.monotonic() < deadline:
+            forward(0.1)
+        for proc, reader in workers:
+            proc.join(timeout=1)
+
+def simulate(source, duration, tick=SCHEDULER_TICK):
+    """Yield (offset_ns, step_ns, events) per tick for `duration` seconds of traffic, as fast as possible.
+
+    Time is simulated in ticks: each tick draws the events due at the
+    source's rate, to be spaced `step_ns` apart from `offset_ns` on.
+    """
+    tick_ns = int(tick * 1_000_000_000)
+    duration_ns = int(duration * 1_000_000_000)
+    t = 0
+    # Simulated time drives the bucket and never stalls, so nothing may be clipped: with a few ticks of
+    # capacity, rates below one event per tick would lose the fraction carried over. Burst the whole run.
+    bucket = TokenBucket(source.rate(0), duration + tick, lambda: t / 1_000_000_000, source.arrivals)
+    while t < duration_ns:
+        rate = source.rate(t / 1_000_000_000)
+        if rate != bucket.rate:
+            bucket.set_rate(rate)
+        t += tick_ns
+        events = source.events(bucket.take())
+        if events:
+            yield t - tick_ns, tick_ns // len(events), events
+
+# Corpus file layout (little-endian):
+#   header  magic, version, format, seed, count, index offset, start time (ns)
+#   body    encoded lines, back to back, exactly as they are written to stdout
+#   index   count + 1 body offsets (u64, last one is the end of the body),
+#           then count relative timestamps in ns (u64)
+CORPUS_MAGIC = b'AUTHLOG1'
+CORPUS_VERSION = 1
+CORPUS_HEADER = struct.Struct('<8sIIQQQQ')
+CORPUS_FORMATS = ('json', 'ztac')
+_TIMESTAMP_PREFIX = b'{"timestamp": "'
+
+def record_corpus(path, source, duration, seed, output_format=OUTPUT_FORMAT, start_ns=None):
+    """Generate `duration` seconds of traffic into a replayable corpus file. Returns the event count."""
+    encode = LINE_ENCODERS[output_format]
+    provider = TimestampProvider(WallClock())
+    start_ns = timestamps.clock.now_ns() if start_ns is None else start_ns  # CLOCK/SIM_START pick the start
+    source.origin = start_ns / 1_000_000_000
+    offsets = array('Q')
+    relative = array('Q')
+    position = 0
+    with open(path, 'wb', buffering=1 << 20) as f:
+        f.write(bytes(CORPUS_HEADER.size))
+        for tick_ns, step_ns, events in simulate(source, duration):
+            for i, event in enumerate(events):
+                offset_ns = tick_ns + i * step_ns
+                line = encode(*event, timestamp=provider.format(start_ns + offset_ns))
+                f.write(line)
+                offsets.append(position)
+                relative.append(offset_ns)
+                position += len(line)
+        offsets.append(position)
+        index_offset = CORPUS_HEADER.size + position
+        f.write(offsets.tobytes())
+        f.write(relative.tobytes())
+        f.seek(0)
+        f.write(CORPUS_HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION, CORPUS_FORMATS.index(output_format),
+                                   seed, len(relative), index_offset, start_ns))
+    return len(relative)
+
+class Corpus:
+    """Memory-mapped corpus written by record_corpus().
+
+    Lines, offsets and relative timestamps are read straight from the
+    mapping, so replay never decodes or re-encodes events.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, fmt, self.seed, self.count, index_offset, self.start_ns = CORPUS_HEADER.unpack_from(self.map)
+        if magic != CORPUS_MAGIC or version != CORPUS_VERSION:
+            raise ValueError(f'{path} is not a version {CORPUS_VERSION} auth log corpus')
+        self.format = CORPUS_FORMATS[fmt]
+        self._view = memoryview(self.map)
+        self.body = self._view[CORPUS_HEADER.size:index_offset]
+        index_end = index_offset + 8 * (self.count + 1)
+        self.offsets = self._view[index_offset:index_end].cast('Q')
+        self.relative = self._view[index_end:index_end + 8 * self.count].cast('Q')
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        for view in (self.body, self.offsets, self.relative, self._view):
+            view.release()
+        self.map.close()
+        self._file.close()
+
+def replay_corpus(writer, corpus, speed=REPLAY_SPEED, rewrite_timestamps=(REPLAY_TIMESTAMPS == 'now'),
+                  loop=REPLAY_LOOP):
+    """Stream a corpus at `speed` times its original pace (0 = as fast as possible).
+
+    With original timestamps (or the ztac format, which has none) each due
+    run of lines is one contiguous slice of the mapping. Otherwise only the
+    timestamp is spliced in front of each recorded line.
+    """
+    body, offsets, relative, count = corpus.body, corpus.offsets, corpus.relative, len(corpus)
+    splice = rewrite_timestamps and corpus.format == 'json'
+    prefix_length = len(_TIMESTAMP_PREFIX)
+    find, base = corpus.map.find, CORPUS_HEADER.size
+    window_start = time.monotonic()
+    window_events = 0
+
+    while True:
+        origin = time.monotonic_ns()
+        i = 0
+        while i < count:
+            if speed > 0:
+                due_until = (time.monotonic_ns() - origin) * speed
+                j = bisect.bisect_right(relative, due_until, i)
+            else:
+                j = min(count, i + 10000)
+
+            if j > i:
+                if splice:
+                    write = writer.write
+                    for k in range(i, j):
+                        start = offsets[k]
+                        end = offsets[k + 1]
+                        # Closing quote of the recorded timestamp, found in place in the mapping
+                        timestamp_end = find(b'"', base + start + prefix_length, base + end) - base
+                        write(_TIMESTAMP_PREFIX + timestamps.now().encode('ascii'))
+                        write(body[timestamp_end:end])
+                else:
+                    writer.write(body[offsets[i]:offsets[j]])
+                window_events += j - i
+                i = j
+                writer.flush_if_due()
+            else:
+                wait = (relative[i] / speed - (time.monotonic_ns() - origin)) / 1_000_000_000
+                time.sleep(min(max(wait, SCHEDULER_TICK), writer.time_until_due(), RATE_REPORT_INTERVAL))
+                writer.flush_if_due()
+
+            now = time.monotonic()
+            if now - window_start >= RATE_REPORT_INTERVAL:
+                achieved = window_events / (now - window_start)
+                log_record(writer, 'INFO', f'Replayed {achieved:.1f} events/s ({i}/{count})',
+                           achieved_rate=round(achieved, 1), position=i, events=count)
+                window_events = 0
+                window_start = now
+
+        log_record(writer, 'INFO', f'Replayed {count} events from {corpus.path}', events=count)
+        if not loop:
+            return
+
+def run_backfill(writer, source, sink, clock, start_ns, days=BACKFILL_DAYS, tick=BACKFILL_TICK):
+    """Generate `days` of history from start_ns into sink as fast as the CPU (or the sink) allows.
+
+    Events of each tick are stamped evenly across it through `clock`, a
+    SteppedClock read by the sink. Progress records, and reports of sinks
+    that drop or fail to deliver lines, go to writer with real timestamps.
+    Returns the number of events generated.
+    """
+    source.origin = start_ns / 1_000_000_000
+    total = 0
+    window_start = time.monotonic()
+    window_events = 0
+    duration = days * 86400
+    for offset_ns, step_ns, events in simulate(source, duration, tick):
+        clock.set(start_ns + offset_ns, step_ns)
+        sink.emit(events)
+        total += len(events)
+        sink.flush_if_due()
+
+        now = time.monotonic()
+        if now - window_start >= RATE_REPORT_INTERVAL:
+            sink_report = sink.report()
+            if sink_report:
+                message, fields = sink_report
+                log_record(writer, 'INFO', message, **fields)
+            achieved = (total - window_events) / (now - window_start)
+            progress = offset_ns / 1_000_000_000 / duration
+            log_record(writer, 'INFO',
+                       f'Backfilled up to {timestamps.format(start_ns + offset_ns)} ({progress:.1%}) '
+                       f'at {achieved:.0f} events/s',
+                       simulated_time=timestamps.format(start_ns + offset_ns), progress=round(progress, 4),
+                       achieved_rate=round(achieved, 1), events_total=total)
+            writer.flush()
+            window_events = total
+            window_start = now
+    return total
+
+def main():
+    if MODE not in ('live', 'backfill', 'record', 'replay'):
+        raise ValueError(f"Unknown MODE '{MODE}' (expected 'live', 'backfill', 'record' or 'replay')")
+    specs = parse_sinks()
+    seed = SEED
+    if MODE in ('backfill', 'record') and seed is None:
+        seed = random.randrange(2 ** 63)  # always report the seed, so the run can be repeated
+    if seed is not None:
+        random.seed(seed)
+
+    print("=" * 80)
+    print("Mock Authentication Log Generator")
+    print("=" * 80)
+    if MODE == 'replay':
+        corpus = Corpus(CORPUS_FILE)
+        pace = f"{REPLAY_SPEED:g}x original speed" if REPLAY_SPEED > 0 else "full speed"
+        print(f"Replaying {len(corpus):,} {corpus.format} events from {CORPUS_FILE} (seed {corpus.seed}) at {pace}")
+    else:
+        source = make_source()
+        if MODE == 'record':
+            print(f"Recording {RECORD_DURATION:g}s of traffic to {CORPUS_FILE} (seed {seed}, format {OUTPUT_FORMAT})")
+        if MODE == 'backfill':
+            # History ends now unless SIM_START pins its start
+            if SIM_START:
+                backfill_start = make_clock('simulated', SIM_START, 0).now_ns()
+            else:
+                backfill_start = time.time_ns() - int(BACKFILL_DAYS * 86400) * 1_000_000_000
+            print(f"Backfilling {BACKFILL_DAYS:g} days from {timestamps.format(backfill_start)} (seed {seed})")
+        if SCENARIO_FILE:
+            print(f"Scenario: {source.name} ({len(source.phases)} phases, "
+                  f"{source.total_duration:g}s{', looping' if source.loop else ''})")
+        else:
+            print(f"Generating authentication logs at {TARGET_RATE:g} events/s")
+            profiled = sorted(class_profiles())
+            if profiled:
+                print(f"Rate profiles: {', '.join(profiled)}")
+        if source.arrivals != 'uniform':
+            print(f"Arrivals: {source.arrivals}")
+        if isinstance(source, BatchSource):
+            print(f"Sampler: {'NumPy, vectorized' if source.vectorized else 'pure Python'}")
+        if WORKERS > 1 and MODE == 'live':
+            print(f"Workers: {WORKERS} (sharded by source IP)")
+        if TENANTS_FILE:
+            print(f"Tenants: {len(TENANTS):,} weighted from {TENANTS_FILE}")
+        else:
+            print(f"Tenants: {', '.join(TENANTS)}")
+        for label, usernames in (('Attacker', USERNAMES_ATTACKER), ('Legitimate', USERNAMES_LEGITIMATE)):
+            if isinstance(usernames, UsernameList):
+                print(f"{label} usernames: {usernames.description}")
+        print(f"Attacker IPs (high failure rate): {ATTACKER_POOL.description}")
+        print(f"Legitimate IPs (high success rate): {LEGITIMATE_POOL.description}")
+        print(f"Corporate IPs (always allowed): {CORPORATE_POOL.description}")
+        if ORACLE_FILE and MODE == 'live':
+            print(f"Oracle: {ORACLE_THRESHOLD} failures in {ORACLE_WINDOW:g}s blocks an IP, written to {ORACLE_FILE}")
+        for kind, target, options in specs if MODE in ('live', 'backfill') else ():
+            if kind == 'stdout' and MODE == 'backfill' and BACKFILL_FILE:
+                print(f"Output: {BACKFILL_FILE} (instead of stdout)")
+            else:
+                print(f"Output: {describe_sink(kind, target, options)}")
+    if METRICS_PORT and MODE in ('live', 'replay'):
+        print(f"Metrics: http://0.0.0.0:{METRICS_PORT}/metrics")
+    if METRICS_PORT and MODE == 'live':
+        print(f"Control: http://0.0.0.0:{METRICS_PORT}/control")
+    if SOAK_INTERVAL > 0 and MODE == 'live':
+        budget = f", fail above {SOAK_BUDGET_MB:g} MB RSS growth" if SOAK_BUDGET_MB else ''
+        length = f", for {SOAK_DURATION:g}s" if SOAK_DURATION else ''
+        print(f"Soak: memory snapshot every {SOAK_INTERVAL:g}s after {SOAK_WARMUP:g}s warmup{budget}{length}")
+    print("=" * 80)
+    print(flush=True)
+
+    if ORACLE_FILE and MODE == 'live':
+        start_oracle_file()  # one run per oracle file; workers append to it
+    metrics = None
+    controller = None
+    if METRICS_PORT and MODE in ('live', 'replay'):
+        sharded = MODE == 'live' and WORKERS > 1
+        metrics = GeneratorMetrics(WORKERS + 1 if sharded else 1, memory=SOAK_INTERVAL > 0 and MODE == 'live',
+                                   sinks=[sink_label(kind, target) for kind, target, _ in specs] if MODE == 'live' else ())
+        metrics.bind(WORKERS if sharded else 0)  # the parent's slot holds stdout write metrics
+        if MODE == 'live':
+            controller = Controller()
+        start_metrics_server(metrics, controller=controller)
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    writer = make_stdout_writer(metrics)
+    try:
+        if MODE == 'replay':
+            try:
+                replay_corpus(writer, corpus)
+            finally:
+                writer.flush()  # buffered lines are slices of the mapping
+                corpus.close()
+        elif MODE == 'backfill':
+            clock = SteppedClock(backfill_start)
+            output = open(BACKFILL_FILE, 'wb') if BACKFILL_FILE else None
+            events_writer = BatchWriter(output) if output else writer
+            sink = make_sink(events_writer, clock, specs=specs)
+            started = time.monotonic()
+            try:
+                count = run_backfill(writer, source, sink, clock, backfill_start)
+            finally:
+                delivered = close_sink(writer, sink)
+                if output:
+                    events_writer.close()
+                    output.close()
+            elapsed = time.monotonic() - started
+            log_record(writer, 'INFO' if delivered else 'ERROR',
+                       f'Backfilled {count} events over {BACKFILL_DAYS:g} days in {elapsed:.1f}s'
+                       + ('' if delivered else ', but not every sink received them all'),
+                       events=count, seed=seed, elapsed_seconds=round(elapsed, 1),
+                       achieved_rate=round(count / elapsed, 1) if elapsed else None)
+            if not delivered:
+                raise SystemExit(1)
+        elif MODE == 'record':
+            started = time.monotonic()
+            count = record_corpus(CORPUS_FILE, source, RECORD_DURATION, seed)
+            elapsed = time.monotonic() - started
+            log_record(writer, 'INFO', f'Recorded {count} events to {CORPUS_FILE} in {elapsed:.1f}s',
+                       events=count, seed=seed, elapsed_seconds=round(elapsed, 1))
+        elif WORKERS > 1:
+            run_sharded(writer, source, metrics=metrics, controller=controller, soak=make_soak())
+        else:
+            sink = make_sink(writer, specs=specs, metrics=metrics)
+            oracle = make_oracle()
+            try:
+                run_scheduler(writer, source, sink, oracle=oracle, metrics=metrics, controller=controller,
+                              soak=make_soak())
+            finally:
+                if oracle is not None:
+                    oracle.close()
+                close_sink(writer, sink)
+    finally:
+        writer.close()
 
 if __name__ == '__main__':
     main()
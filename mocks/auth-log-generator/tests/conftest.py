@@ -0,0 +1,7 @@
+import os
+import sys
+
+# generate_auth_logs reads its configuration from the environment on import
+os.environ.setdefault('TENANTS', 'patmon,perimara,demo-tenant')
+os.environ.setdefault('METRICS_PORT', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,100 @@
+import math
+import os
+import threading
+
+import pytest
+
+import generate_auth_logs as gen
+
+SHOWCASE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scenarios', 'attack-showcase.json')
+
+@pytest.fixture
+def settings():
+    return {'rate': 7.0, 'mix': None, 'scenario': None, 'tenants': None}
+
+def test_changes_are_merged_without_touching_the_current_settings(settings):
+    merged = gen.merge_control(settings, {'rate': 50, 'mix': {'attacker': 3, 'legitimate': 1}})
+    assert merged == {'rate': 50.0, 'mix': {'attacker': 3.0, 'legitimate': 1.0}, 'scenario': None, 'tenants': None}
+    assert settings['rate'] == 7.0 and settings['mix'] is None
+    assert gen.merge_control(merged, {'mix': None})['mix'] is None
+
+@pytest.mark.parametrize('change, message', [
+    ([1, 2], 'expected a JSON object'),
+    ({'speed': 2}, 'unknown keys speed'),
+    ({'rate': -1}, 'rate must be a non-negative number'),
+    ({'rate': math.inf}, 'rate must be a non-negative number'),
+    ({'rate': True}, 'rate must be a non-negative number'),
+    ({'rate': '10'}, 'rate must be a non-negative number'),
+    ({'mix': {}}, 'mix must map traffic classes'),
+    ({'mix': {'bots': 1}}, 'mix must map traffic classes'),
+    ({'mix': {'attacker': 0, 'legitimate': 0}}, 'at least one positive weight'),
+    ({'mix': {'attacker': -2}}, 'mix.attacker must be a non-negative number'),
+    ({'scenario': 42}, 'scenario must be a file path'),
+    ({'tenants': ['patmon']}, 'tenants must map tenant names'),
+    ({'tenants': {'nobody': {'volume': 1}}}, "unknown tenant 'nobody'"),
+    ({'tenants': {'patmon': {'weight': 1}}}, 'tenants.patmon must be'),
+    ({'tenants': {'patmon': {'attack': -1}}}, 'tenants.patmon.attack must be a non-negative number'),
+])
+def test_invalid_changes_are_rejected(settings, change, message):
+    with pytest.raises(ValueError, match=message):
+        gen.merge_control(settings, change)
+
+def test_rate_and_mix_need_the_default_traffic(settings):
+    with_scenario = gen.merge_control(settings, {'scenario': 'scenarios/attack-showcase.json'})
+    with pytest.raises(ValueError, match='set scenario to null first'):
+        gen.merge_control(with_scenario, {'rate': 10})
+    with pytest.raises(ValueError, match='set scenario to null first'):
+        gen.merge_control(settings, {'scenario': {'phases': []}, 'mix': {'attacker': 1}})
+    merged = gen.merge_control(with_scenario, {'scenario': None, 'rate': 10})
+    assert merged['scenario'] is None and merged['rate'] == 10.0
+
+def test_tenant_overrides_accumulate_until_reset(settings):
+    merged = gen.merge_control(settings, {'tenants': {'patmon': {'attack': 5}}})
+    merged = gen.merge_control(merged, {'tenants': {'perimara': {'volume': 2}}})
+    assert merged['tenants'] == {'patmon': {'attack': 5}, 'perimara': {'volume': 2}}
+    assert gen.merge_control(merged, {'tenants': None})['tenants'] is None
+
+@pytest.fixture
+def controller(monkeypatch, settings):
+    monkeypatch.setattr(gen, 'TENANT_SAMPLERS', dict(gen.TENANT_SAMPLERS))
+    return gen.Controller(settings)
+
+def attack_only(tenant):
+    return {name: {'attack': 1 if name == tenant else 0} for name in gen.TENANTS}
+
+def test_changes_posted_before_the_loop_applies_are_folded_together(controller):
+    source = gen.make_source(controller.settings)
+    assert controller.submit({'rate': 900}, wait=0) == (dict(controller.settings, rate=900.0), False)
+    controller.submit({'tenants': attack_only('perimara')}, wait=0)
+    source, change, restart = controller.apply(source)
+    assert source.rate(0) == 900
+    assert {gen.TENANT_SAMPLERS['attacker'].sample() for _ in range(100)} == {'perimara'}
+    assert set(change) == {'rate', 'tenants'} and not restart
+    assert controller.settings['rate'] == 900.0 and not controller.pending
+
+def test_later_source_change_keeps_earlier_tenant_tables(controller):
+    source = gen.make_source(controller.settings)
+    controller.submit({'tenants': attack_only('demo-tenant')}, wait=0)
+    controller.submit({'rate': 40}, wait=0)
+    source, _, _ = controller.apply(source)
+    assert source.rate(0) == 40
+    assert {gen.TENANT_SAMPLERS['attacker'].sample() for _ in range(100)} == {'demo-tenant'}
+
+def test_folded_scenario_change_still_restarts_the_timeline(controller):
+    source = gen.make_source(controller.settings)
+    controller.submit({'scenario': SHOWCASE}, wait=0)
+    controller.submit({'tenants': attack_only('patmon')}, wait=0)
+    source, _, restart = controller.apply(source)
+    assert isinstance(source, gen.Scenario) and restart
+
+def test_submit_waits_until_the_loop_applies(controller):
+    source = gen.make_source(controller.settings)
+    applier = threading.Timer(0.05, controller.apply, (source,))
+    applier.start()
+    assert controller.submit({'rate': 12}, wait=2) == (dict(controller.settings, rate=12.0), True)
+    applier.join()
+
+def test_tenant_override_keys_merge_per_tenant(settings):
+    merged = gen.merge_control(settings, {'tenants': {'patmon': {'volume': 2}}})
+    merged = gen.merge_control(merged, {'tenants': {'patmon': {'attack': 5}}})
+    assert merged['tenants'] == {'patmon': {'volume': 2, 'attack': 5}}
@@ -0,0 +1,68 @@
+import io
+import json
+import random
+
+import pytest
+
+import generate_auth_logs as gen
+
+START_NS = 1_772_368_496_000_000_000  # 2026-03-01T12:34:56Z
+
+def record(path, output_format='json', seed=9, duration=20):
+    random.seed(seed)
+    return gen.record_corpus(str(path), gen.BatchSource(50), duration, seed, output_format, START_NS)
+
+def replay(corpus, **options):
+    stream = io.BytesIO()
+    writer = gen.BatchWriter(stream)
+    gen.replay_corpus(writer, corpus, speed=0, loop=False, **options)
+    writer.flush()
+    lines = stream.getvalue().splitlines(keepends=True)
+    assert json.loads(lines[-1])['message'].startswith(f'Replayed {len(corpus)} events')
+    return lines[:-1]
+
+@pytest.mark.parametrize('output_format', ['json', 'ztac'])
+def test_replay_writes_the_recorded_lines(tmp_path, output_format):
+    count = record(tmp_path / 'corpus.bin', output_format)
+    corpus = gen.Corpus(str(tmp_path / 'corpus.bin'))
+    try:
+        assert (len(corpus), corpus.format, corpus.seed, corpus.start_ns) == (count, output_format, 9, START_NS)
+        assert count == pytest.approx(50 * 20, rel=0.1)
+        lines = replay(corpus, rewrite_timestamps=False)
+        assert b''.join(lines) == bytes(corpus.body)
+        assert len(lines) == count
+        assert list(corpus.relative) == sorted(corpus.relative)
+        if output_format == 'json':
+            provider = gen.TimestampProvider(gen.WallClock())
+            for line, offset_ns in zip(lines, corpus.relative):
+                assert json.loads(line)['timestamp'] == provider.format(START_NS + offset_ns)
+    finally:
+        corpus.close()
+
+def test_replay_rewrites_only_the_timestamp(tmp_path):
+    record(tmp_path / 'corpus.bin')
+    corpus = gen.Corpus(str(tmp_path / 'corpus.bin'))
+    try:
+        original = replay(corpus, rewrite_timestamps=False)
+        rewritten = replay(corpus, rewrite_timestamps=True)
+    finally:
+        corpus.close()
+    assert len(rewritten) == len(original)
+    for before, after in zip(original, rewritten):
+        before, after = json.loads(before), json.loads(after)
+        assert after.pop('timestamp') != before.pop('timestamp')
+        assert after == before
+
+def test_recording_is_reproducible_from_its_seed(tmp_path):
+    record(tmp_path / 'a.bin', seed=4)
+    record(tmp_path / 'b.bin', seed=4)
+    record(tmp_path / 'c.bin', seed=5)
+    a, b, c = ((tmp_path / name).read_bytes() for name in ('a.bin', 'b.bin', 'c.bin'))
+    assert a == b
+    assert a != c
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / 'not-a-corpus.bin'
+    path.write_bytes(b'{"timestamp": "x"}\n' * 10)
+    with pytest.raises(ValueError, match='not a version 1 auth log corpus'):
+        gen.Corpus(str(path))
@@ -0,0 +1,52 @@
+import json
+import random
+
+import pytest
+
+import generate_auth_logs as gen
+
+TIMESTAMP = '2026-03-01T12:34:56.789012Z'
+
+EVENTS = [
+    ('patmon', '203.0.113.5', 'admin', False, 'invalid_credentials'),
+    ('perimara', '192.168.1.100', 'jane.smith@example.com', True, None),
+    ('demo-tenant', '2001:db8::1', 'root', False, None),
+    ('patmon', '10.0.0.1', 'René "the admin" O\'Brien\\', False, 'user_not_found'),
+    ('patmon', '10.0.0.2', '管理员\t%s', True, None),
+]
+
+@pytest.mark.parametrize('event', EVENTS)
+@pytest.mark.parametrize('seed', range(4))  # covers both user agents
+def test_template_encoder_matches_json_dumps(event, seed):
+    random.seed(seed)
+    expected = gen.generate_auth_event(*event)
+    expected['timestamp'] = TIMESTAMP
+    random.seed(seed)
+    assert gen.encode_auth_event(*event, timestamp=TIMESTAMP) == (json.dumps(expected) + '\n').encode('ascii')
+
+@pytest.mark.parametrize('event', EVENTS)
+def test_ztac_encoder_matches_json_dumps(event):
+    _, ip, username, success, _ = event
+    body = {'UserName': username, 'Status': 'SUCCESS' if success else 'FAILURE', 'SourceIP': ip}
+    expected = json.dumps(body, separators=(',', ':')).encode('ascii')
+    assert gen.encode_ztac_body(ip, username, success) == expected
+    assert gen.encode_ztac_line(*event, timestamp=TIMESTAMP) == expected + b'\n'
+
+def test_generated_batches_encode_like_json_dumps():
+    random.seed(11)
+    for _ in range(200):
+        for event in gen.generate_event_batch():
+            state = random.getstate()
+            expected = gen.generate_auth_event(*event)
+            expected['timestamp'] = TIMESTAMP
+            random.setstate(state)
+            line = gen.encode_auth_event(*event, timestamp=TIMESTAMP)
+            assert line == (json.dumps(expected) + '\n').encode('ascii')
+
+def test_generate_log_batch_returns_event_dicts():
+    random.seed(2)
+    batch = gen.generate_log_batch()
+    assert batch
+    for event in batch:
+        assert set(event) == {'timestamp', 'level', 'service', 'tenant', 'event_type', 'auth'}
+        assert event['level'] == ('INFO' if event['auth']['success'] else 'WARN')
@@ -0,0 +1,45 @@
+import json
+
+import generate_auth_logs as gen
+
+SECOND = 1_000_000_000
+
+def failures(ip, count=1):
+    return [('demo', ip, 'root', False, 'invalid_credentials')] * count
+
+def test_ip_crosses_once_threshold_failures_fall_within_window():
+    oracle = gen.BlockOracle(threshold=3, window=10)
+    assert oracle.observe(failures('10.0.0.1', 2), 0) == []
+    assert oracle.observe(failures('10.0.0.1'), 5 * SECOND) == ['10.0.0.1']
+    assert oracle.is_blocked('10.0.0.1')
+    assert oracle.observe(failures('10.0.0.1', 5), 6 * SECOND) == []
+
+def test_crossed_ips_are_forgotten_after_retention():
+    oracle = gen.BlockOracle(threshold=1, window=10, retention=60)
+    for second in range(600):
+        oracle.observe(failures(f'10.0.{second // 256}.{second % 256}'), second * SECOND)
+    assert oracle.crossed_total == 600
+    assert len(oracle.crossed) <= 60 + 10  # pruned at most every window
+    assert not oracle.is_blocked('10.0.0.0')
+    assert oracle.is_blocked('10.0.2.87')  # crossed at second 599
+    assert oracle.report()[1]['oracle_crossed_total'] == 600
+
+def test_forgotten_ip_crosses_again():
+    oracle = gen.BlockOracle(threshold=1, window=10, retention=60)
+    assert oracle.observe(failures('10.0.0.1'), 0) == ['10.0.0.1']
+    assert oracle.observe(failures('10.0.0.1'), 30 * SECOND) == []
+    oracle.observe([], 70 * SECOND)
+    assert oracle.observe(failures('10.0.0.1'), 71 * SECOND) == ['10.0.0.1']
+
+def test_start_record_is_written_once_by_the_parent(tmp_path):
+    path = str(tmp_path / 'oracle.jsonl')
+    gen.start_oracle_file(path)
+    workers = [gen.BlockOracle(path, threshold=1) for _ in range(3)]
+    for index, oracle in enumerate(workers):
+        oracle.observe(failures(f'10.0.0.{index}'), index * SECOND)
+        oracle.close()
+    records = [json.loads(line) for line in open(path)]
+    assert [record['event'] for record in records].count('start') == 1
+    assert records[0]['event'] == 'start'
+    assert sorted(record['ip'] for record in records if record['event'] == 'crossed') == [
+        '10.0.0.0', '10.0.0.1', '10.0.0.2']
@@ -0,0 +1,43 @@
+import ipaddress
+import tracemalloc
+
+import pytest
+
+import generate_auth_logs as gen
+
+def test_cidr_population_rejects_mixed_address_families():
+    with pytest.raises(ValueError, match='mixes IPv4 and IPv6'):
+        gen.CidrPopulation('100.64.0.0/10,2001:db8::/32', size=1000)
+    with pytest.raises(ValueError, match='mixes IPv4 and IPv6'):
+        gen.build_population(1000, '10.0.0.0/8,2001:db8::/32', [])
+
+@pytest.mark.parametrize('networks', ['100.64.0.0/24,192.168.0.0/24', '2001:db8::/120,2001:db8:1::/120'])
+def test_cidr_population_spreads_over_every_block(networks):
+    pool = gen.CidrPopulation(networks, density=0.5, skew=0)
+    nets = [ipaddress.ip_network(net) for net in networks.split(',')]
+    ips = {pool.ip(rank) for rank in range(len(pool))}
+    assert len(ips) == len(pool) == 256
+    per_block = [sum(ipaddress.ip_address(ip) in net for ip in ips) for net in nets]
+    assert sum(per_block) == len(ips)
+    assert min(per_block) > 64
+
+def test_synthetic_population_is_distinct_and_inside_its_networks():
+    networks = '10.0.0.0/15,192.168.0.0/24,172.16.0.0/30'
+    size = gen.POPULATION_CHUNK + 1000  # crosses a chunk boundary
+    pool = gen.IPPopulation.synthetic(size, networks)
+    nets = [ipaddress.ip_network(net) for net in networks.split(',')]
+    ips = [ipaddress.ip_address(pool.ip(rank)) for rank in range(size)]
+    assert len(set(ips)) == size
+    assert all(any(ip in net for net in nets) for ip in ips)
+
+@pytest.mark.skipif(gen.np is None, reason='NumPy builds the population in chunks')
+def test_synthetic_population_builds_without_large_temporaries():
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        pool = gen.IPPopulation.synthetic(1_000_000, '100.64.0.0/10')
+        peak = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    assert pool.addresses.dtype == gen.np.uint32
+    assert peak < pool.addresses.nbytes + 16 * gen.POPULATION_CHUNK * 8
@@ -0,0 +1,78 @@
+import collections
+import os
+import random
+
+import pytest
+
+import generate_auth_logs as gen
+
+SCENARIOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scenarios')
+
+def two_phases(loop=False):
+    return {
+        'name': 'two-phases',
+        'loop': loop,
+        'phases': [
+            {'name': 'ramp', 'duration': 100, 'streams': [{'class': 'attacker', 'rate': [10, 30]}]},
+            {'name': 'steady', 'duration': 50, 'streams': [
+                {'class': 'legitimate', 'rate': 30},
+                {'class': 'attacker', 'rate': 10, 'population': {'ips': ['198.51.100.7']}},
+            ]},
+        ],
+    }
+
+@pytest.mark.parametrize('name', sorted(name for name in os.listdir(SCENARIOS) if name.endswith('.json')))
+def test_bundled_scenarios_load(name):
+    scenario = gen.Scenario.load(os.path.join(SCENARIOS, name))
+    assert scenario.phases
+    assert scenario.rate(0) > 0
+
+def test_rates_ramp_within_a_phase_and_switch_between_phases():
+    scenario = gen.Scenario.from_spec(two_phases())
+    assert scenario.name == 'two-phases'
+    assert scenario.total_duration == 150
+    assert scenario.rate(0) == pytest.approx(10)
+    assert scenario.rate(50) == pytest.approx(20)
+    assert scenario.phase == 'ramp'
+    assert scenario.rate(120) == pytest.approx(40)
+    assert scenario.phase == 'steady'
+
+def test_last_phase_keeps_running_unless_the_timeline_loops():
+    assert gen.Scenario.from_spec(two_phases()).rate(1000) == pytest.approx(40)
+    looping = gen.Scenario.from_spec(two_phases(loop=True))
+    assert looping.rate(150 + 50) == pytest.approx(20)
+    assert looping.phase == 'ramp'
+
+def test_events_follow_stream_rates():
+    random.seed(3)
+    scenario = gen.Scenario.from_spec(two_phases())
+    scenario.rate(120)
+    events = scenario.events(20_000)
+    assert len(events) == len(scenario.classes) == 20_000
+    counts = collections.Counter(scenario.classes)
+    assert counts['legitimate'] / len(events) == pytest.approx(0.75, abs=0.02)
+    assert {event[1] for event, cls in zip(events, scenario.classes) if cls == 'attacker'} == {'198.51.100.7'}
+
+def test_identical_populations_are_shared_between_phases():
+    population = {'size': 100, 'networks': '100.64.0.0/16', 'seed': 1}
+    spec = {'phases': [
+        {'duration': 10, 'streams': [{'class': 'attacker', 'rate': 1, 'population': dict(population)}]},
+        {'duration': 10, 'streams': [{'class': 'attacker', 'rate': 1, 'population': dict(population)}]},
+    ]}
+    scenario = gen.Scenario.from_spec(spec)
+    first, second = (phase['streams'][0].pool for phase in scenario.phases)
+    assert first is second
+    assert scenario.phases[1]['name'] == 'phase-1'
+
+@pytest.mark.parametrize('spec, message', [
+    ({'phases': [{'duration': 1, 'streams': [], 'rate': 5}]}, 'unknown keys'),
+    ({'phases': [{'duration': 1, 'streams': [{'class': 'attacker', 'rate': 1, 'burst': 2}]}]}, 'unknown keys'),
+    ({'phases': [{'duration': 1, 'streams': [{'class': 'bots', 'rate': 1}]}]}, "unknown class 'bots'"),
+    ({'phases': [{'duration': 1, 'streams': [{'class': 'attacker', 'rate': 1, 'ip_order': 'sorted'}]}]},
+     "unknown ip_order 'sorted'"),
+    ({'arrivals': 'bursty', 'phases': [{'duration': 1, 'streams': [{'class': 'attacker', 'rate': 1}]}]},
+     "Unknown arrivals 'bursty'"),
+])
+def test_invalid_scenarios_are_rejected(spec, message):
+    with pytest.raises(ValueError, match=message):
+        gen.Scenario.from_spec(spec)
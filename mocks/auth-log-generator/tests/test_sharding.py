@@ -0,0 +1,81 @@
+import collections
+import random
+
+import pytest
+
+import generate_auth_logs as gen
+
+@pytest.fixture
+def full_pools(monkeypatch):
+    """Undo restrict_to_shard()'s changes to the module's pools after each test."""
+    for name in ('ATTACKER_POOL', 'LEGITIMATE_POOL', 'CORPORATE_POOL', 'SHARD_CLASS_KEEP'):
+        monkeypatch.setattr(gen, name, getattr(gen, name))
+
+def owner(ip, shards):
+    """Shard that owns an IPv4 address of a packed population."""
+    return gen._shard_key(gen._pack_ipv4(ip)) % shards
+
+def class_rates(source, count=200_000):
+    """Events per second of each traffic class, from `count` events drawn at the source's rate."""
+    events = source.events(count)
+    seconds = count / source.rate(0) if source.rate(0) else 0
+    return {cls: n / seconds for cls, n in collections.Counter(source.classes).items()}, events
+
+@pytest.mark.parametrize('shards', [2, 3, 5, 8])
+def test_every_default_ip_is_owned_by_exactly_one_shard(full_pools, shards):
+    pools = (gen.ATTACKER_POOL, gen.LEGITIMATE_POOL, gen.CORPORATE_POOL)
+    for pool in pools:
+        owned = [set(pool.shard(index, shards).ip(rank) for rank in range(len(pool.shard(index, shards))))
+                 for index in range(shards)]
+        assert sum(map(len, owned)) == len(pool)
+        assert set().union(*owned) == {pool.ip(rank) for rank in range(len(pool))}
+        for index, ips in enumerate(owned):
+            assert all(owner(ip, shards) == index for ip in ips)
+
+@pytest.mark.parametrize('vectorized', [False, True] if gen.np is not None else [False])
+@pytest.mark.parametrize('shards', [2, 5])
+def test_sharded_batch_source_keeps_total_and_class_rates(full_pools, shards, vectorized):
+    random.seed(5)
+    source = gen.BatchSource(1000, vectorized=vectorized)
+    expected, _ = class_rates(source)
+    totals = collections.Counter()
+    rate_sum = 0.0
+    for index in range(shards):
+        shard = source.shard(index, shards)
+        rate_sum += shard.rate(0)
+        if shard.rate(0):
+            rates, events = class_rates(shard)
+            totals.update(rates)
+            assert all(owner(event[1], shards) == index for event in events)
+    assert rate_sum == pytest.approx(1000)
+    for traffic_class, rate in expected.items():
+        assert totals[traffic_class] == pytest.approx(rate, rel=0.1)
+
+def test_shard_without_ips_gets_no_rate_and_never_spins(full_pools):
+    # The 10 default IPs leave shard 4 of 5 empty
+    shards = 5
+    empty = [index for index in range(shards)
+             if not any(pool.shard(index, shards) for pool in
+                        (gen.ATTACKER_POOL, gen.LEGITIMATE_POOL, gen.CORPORATE_POOL))]
+    assert empty
+    source = gen.BatchSource(100, vectorized=False).shard(empty[0], shards)
+    assert source.rate(0) == 0
+    assert source.events(0) == []
+    with pytest.raises(ValueError):
+        source.events(1)
+
+def test_sharded_scenario_streams_scale_with_owned_ips(full_pools):
+    scenario = gen.Scenario.default_mix(1000, {})
+    total = 0.0
+    for index in range(5):
+        shard = scenario.shard(index, 5)
+        total += shard.rate(0)
+    assert total == pytest.approx(1000)
+
+def test_synthetic_population_shards_partition_it():
+    pool = gen.CidrPopulation('2001:db8::/120,2001:db8:1::/120', size=300, skew=0)
+    shards = [pool.shard(index, 3) for index in range(3)]
+    assert sum(map(len, shards)) == 300
+    assert shards[0].shard(0, 3) is shards[0]
+    seen = {shard.ip(rank) for shard in shards for rank in range(len(shard))}
+    assert seen == {pool.ip(rank) for rank in range(300)}
@@ -0,0 +1,95 @@
+import io
+import threading
+
+import pytest
+
+import generate_auth_logs as gen
+
+EVENTS = [('patmon', '203.0.113.5', 'admin', False, 'invalid_credentials')] * 100
+
+def test_stdout_sink_writes_are_recorded_with_the_stdout_writer():
+    out = io.BytesIO()
+    metrics = gen.GeneratorMetrics(sinks=['stdout'])
+    writer = gen.BatchWriter(gen.StreamTarget(out), metrics=metrics)
+    sink = gen.make_sink(writer, specs=gen.parse_sinks('stdout'), metrics=metrics)
+    sink.emit(EVENTS)
+    sink.close()
+    bounds = gen.GeneratorMetrics.HISTOGRAMS['write_bytes'][0]
+    offset = metrics.offsets['write_bytes']
+    assert out.getvalue().count(b'\n') == len(EVENTS)
+    assert sink.writes == sum(metrics.values[offset:offset + len(bounds) + 1]) >= 1
+    assert metrics.values[offset + len(bounds) + 1] == len(out.getvalue())
+    assert sink.blocked_seconds > 0
+
+def test_stdout_sink_of_an_unmetered_writer_records_nothing():
+    metrics = gen.GeneratorMetrics(sinks=['stdout'])
+    writer = gen.BatchWriter(gen.StreamTarget(io.BytesIO()))
+    sink = gen.make_sink(writer, specs=gen.parse_sinks('stdout'), metrics=metrics)
+    sink.emit(EVENTS)
+    sink.close()
+    assert sink.writes == 1 and sink.stdout.sizes is None
+
+class FailingTarget:
+    def write(self, data):
+        raise OSError('disk full')
+
+    def close(self):
+        pass
+
+class StuckTarget:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def write(self, data):
+        self.release.wait()
+        return len(data)
+
+    def close(self):
+        pass
+
+def fanout(target, policy='block', size=gen.SINK_QUEUE, flush_bytes=gen.FLUSH_BYTES):
+    sink = gen.LineSink(gen.BatchWriter(gen.DeliveryStream(target), flush_bytes), owned=True)
+    return gen.AsyncFanout([gen.SinkChannel(sink, 'file:test', 0, size, policy)])
+
+def test_summary_counts_lines_lost_to_errors():
+    sink = fanout(FailingTarget())
+    sink.emit(EVENTS)
+    sink.close()
+    message, fields = sink.summary()
+    assert '100 lost to errors' in message
+    assert fields['sinks'] == [{'sink': 'file:test', 'dropped_lines': 0, 'failed_lines': 100, 'closed': True,
+                                'abandoned_lines': 0}]
+
+def test_summary_reports_drops_and_a_sink_stuck_at_close():
+    target = StuckTarget()
+    sink = fanout(target, policy='drop', size=1, flush_bytes=1)
+    for _ in range(20):
+        sink.emit(EVENTS)
+    sink.close(timeout=0.2)
+    target.release.set()
+    dropped, failed, abandoned = sink.channels[0].totals()
+    assert dropped + abandoned == 20 * len(EVENTS) - sink.channels[0].handled_lines
+    assert dropped and abandoned and not failed
+    message, fields = sink.summary()
+    assert f'still delivering at shutdown with {abandoned} lines queued' in message
+    assert fields['sinks'][0]['closed'] is False
+
+def test_summary_is_empty_when_every_line_arrived():
+    sink = fanout(gen.StreamTarget(io.BytesIO()))
+    sink.emit(EVENTS)
+    sink.close()
+    assert sink.summary() is None
+
+@pytest.mark.parametrize('uri', [
+    'loki+http://127.0.0.1:9/loki/api/v1/push?batch=50&flush=2&concurrency=3&queue=8',
+    pytest.param('otlp://127.0.0.1:9?batch=50&flush=2&concurrency=3&queue=8',
+                 marks=pytest.mark.skipif(gen.grpc is None, reason='needs grpcio')),
+])
+def test_exporter_batch_flush_and_concurrency_are_separate_options(uri):
+    sink = gen.make_sink(gen.BatchWriter(io.BytesIO()), specs=gen.parse_sinks(uri))
+    exporter = sink.channels[0].sink
+    try:
+        assert (exporter.batch_size, exporter.flush_interval, exporter._concurrency) == (50, 2.0, 3)
+        assert 'batch 50, flush 2s, concurrency 3' in gen.describe_sink(*gen.parse_sinks(uri)[0])
+    finally:
+        sink.close()
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+import generate_auth_logs as gen
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def run(bucket, clock, seconds, tick=gen.SCHEDULER_TICK):
+    """Advance the clock tick by tick; return events taken per whole second."""
+    per_second = [0] * int(seconds)
+    for step in range(int(seconds / tick)):
+        clock.now += tick
+        per_second[min(int(clock.now), len(per_second) - 1)] += bucket.take()
+    return per_second
+
+@pytest.mark.parametrize('rate', [0.5, 7, 1000])
+def test_uniform_arrivals_keep_the_rate(rate):
+    clock = FakeClock()
+    bucket = gen.TokenBucket(rate, clock=clock)
+    total = sum(run(bucket, clock, 60))
+    assert abs(total - rate * 60) <= 1
+    assert bucket.missed < 1  # at most a fraction of a token past the capacity
+
+@pytest.mark.parametrize('rate', [1, 7])
+@pytest.mark.parametrize('seed', range(10))
+def test_poisson_arrivals_at_low_rates_never_stall(rate, seed):
+    # A cost drawn above the capacity used to be clipped away for good
+    random.seed(seed)
+    clock = FakeClock()
+    bucket = gen.TokenBucket(rate, clock=clock, arrivals='poisson')
+    per_second = run(bucket, clock, 600)
+    assert abs(sum(per_second) - rate * 600) < 0.2 * rate * 600
+    assert sum(per_second[-60:]) > 0
+
+def test_poisson_arrivals_keep_the_mean_rate():
+    random.seed(1)
+    clock = FakeClock()
+    bucket = gen.TokenBucket(500, clock=clock, arrivals='poisson')
+    assert abs(sum(run(bucket, clock, 60)) - 500 * 60) < 0.05 * 500 * 60
+
+def test_stall_is_clipped_to_burst_and_counted_as_missed():
+    clock = FakeClock()
+    bucket = gen.TokenBucket(100, clock=clock)
+    clock.now = 10.0
+    assert bucket.take() == int(100 * gen.BURST_SECONDS)
+    assert bucket.missed == pytest.approx(100 * (10 - gen.BURST_SECONDS))
+
+def test_set_rate_keeps_earned_tokens():
+    clock = FakeClock()
+    bucket = gen.TokenBucket(100, clock=clock)
+    clock.now = 0.1
+    bucket.set_rate(200)
+    assert bucket.take() == 10
+
+def test_simulated_poisson_traffic_does_not_stall():
+    random.seed(3)
+    source = gen.BatchSource(1, arrivals='poisson')
+    ticks = list(gen.simulate(source, 600))
+    count = sum(len(events) for _, _, events in ticks)
+    assert 450 < count < 750
+    assert ticks[-1][0] > 540 * 1_000_000_000
+
+@pytest.mark.parametrize('tick', [gen.SCHEDULER_TICK, 1.0])
+@pytest.mark.parametrize('rate', [0.5, 7, 50, 500])
+def test_simulated_uniform_traffic_keeps_its_rate(rate, tick):
+    random.seed(4)
+    count = sum(len(events) for _, _, events in gen.simulate(gen.BatchSource(rate, arrivals='uniform'), 100, tick))
+    assert count == pytest.approx(rate * 100, abs=1)
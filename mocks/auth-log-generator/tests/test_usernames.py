@@ -0,0 +1,26 @@
+import random
+
+import pytest
+
+import generate_auth_logs as gen
+
+def test_usernames_load_into_a_packed_list(tmp_path):
+    path = tmp_path / 'users.txt'
+    path.write_bytes('alice\n\nbob  \r\nrené\n'.encode('utf-8'))
+    usernames = gen.UsernameList.load(str(path))
+    assert len(usernames) == 3
+    assert list(usernames) == ['alice', 'bob', 'rené']
+    assert usernames[-1] == 'rené'
+    assert random.choice(usernames) in {'alice', 'bob', 'rené'}
+
+def test_invalid_utf8_fails_at_load_with_the_line(tmp_path):
+    path = tmp_path / 'users.txt'
+    path.write_bytes(b'alice\n\nren\xe9\n')
+    with pytest.raises(ValueError, match=r'users\.txt:3: username is not valid UTF-8'):
+        gen.UsernameList.load(str(path))
+
+def test_empty_file_is_rejected(tmp_path):
+    path = tmp_path / 'users.txt'
+    path.write_bytes(b'\n  \n')
+    with pytest.raises(ValueError, match='no usernames'):
+        gen.UsernameList.load(str(path))